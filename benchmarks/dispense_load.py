@@ -0,0 +1,186 @@
+"""
+Synthetic load for the pharmacy dispensing queue (pharmacy_queue.py).
+
+Producer threads save prescriptions through the portal's own save path (so the
+outbox trigger and line items are exercised) while workstation threads claim,
+read and complete them. Reports dispenses per second, claim latency and the
+time from save to dispensed, and checks that no prescription was handed out twice.
+
+    python benchmarks/dispense_load.py [--portal doctor_portal1] [--workstations 8]
+                                       [--producers 2] [--seconds 10] [--batch 1] [--mysql]
+
+Without --mysql it runs against the SQLite stand-in, which has no row locks and
+serializes every claim on the database write lock: those numbers check that the
+queue works, not how fast it is. Throughput needs --mysql (8.0+, for SKIP LOCKED),
+which saves "BENCH-" prescriptions into the portal's DB_CONFIG database.
+"""
+import argparse
+import importlib
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from portal_bench import percentiles  # noqa: E402
+
+PORTALS = ["doctor_portal", "doctor_portal1"]
+DRAIN_TIMEOUT = 60  # seconds the workstations get to empty the queue once producers stop
+PRESCRIPTION = "Amoxicillin 500 mg 3x daily for 7 days\nParacetamol 1 g every 6 hours for 3 days"
+
+
+def setup(portal, use_mysql, pool_size):
+    import db_pool
+    import sqlite_standin
+    from pharmacy_queue import initialize_queue
+
+    if use_mysql:
+        db_pool.get_pool(portal.DB_CONFIG, pool_size=pool_size, idle_timeout=portal.POOL_IDLE_TIMEOUT)
+        portal.initialize_db()
+        conn = portal.get_connection()
+        if not conn:
+            raise ConnectionError("Could not connect to MySQL.")
+        try:
+            initialize_queue(conn, portal.__name__)
+        finally:
+            conn.close()
+        return
+    path = os.path.join(tempfile.mkdtemp(prefix="imhotep-dispense-"), f"{portal.__name__}.sqlite")
+    db_pool.get_pool(portal.DB_CONFIG, connect=lambda: sqlite_standin.connect(path),
+                     pool_size=pool_size, idle_timeout=portal.POOL_IDLE_TIMEOUT)
+    conn = sqlite_standin.connect(path)
+    sqlite_standin.create_schema(conn, portal.__name__)
+    conn.close()
+
+
+def run(portal_name, workstations, producers, seconds, batch, rate, use_mysql):
+    from pharmacy_queue import QUEUES, DispenseQueue
+
+    portal = importlib.import_module(portal_name)
+    spec = QUEUES[portal_name]
+    setup(portal, use_mysql, workstations + producers + 1)
+    run_tag = datetime.now().strftime("%H%M%S")
+
+    saved = {}            # prescription id -> perf_counter() when its save returned
+    dispensed = []        # (prescription id, workstation) per completed claim
+    claim_ms, lag_ms, errors = [], [], []
+    lock = threading.Lock()
+    stop = threading.Event()
+    producing = threading.Event()
+    producing.set()
+
+    def produce(n):
+        uid = f"BENCH-{run_tag}-{n}"
+        interval = 1.0 / rate if rate else 0
+        i = 0
+        while not stop.is_set():
+            try:
+                record = portal.save_prescription_record(uid, f"dispense load #{i}", PRESCRIPTION, "Dr. Load")
+                record_id = record.get("prescription_id") or record.get("Pr_ID")
+                saved[record_id] = time.perf_counter()
+            except Exception as e:
+                errors.append(f"save: {e}")
+            i += 1
+            if interval:
+                time.sleep(interval)
+
+    def work(n):
+        queue = DispenseQueue(portal.get_connection, spec.queue, f"bench-{n}", spec.items)
+        while True:
+            start = time.perf_counter()
+            try:
+                tasks = queue.claim(batch)
+            except Exception as e:
+                errors.append(f"claim: {e}")
+                continue
+            if not tasks:
+                if not producing.is_set():
+                    return
+                time.sleep(0.005)
+                continue
+            claimed = time.perf_counter()
+            done = queue.complete([task.queue_id for task in tasks])
+            finished = time.perf_counter()
+            with lock:
+                claim_ms.append((claimed - start) * 1000)
+                for task in tasks:
+                    dispensed.append((task.prescription_id, n))
+                    if task.prescription_id in saved:
+                        lag_ms.append((finished - saved[task.prescription_id]) * 1000)
+                if done != len(tasks):
+                    errors.append(f"complete: {len(tasks) - done} claim(s) lost")
+
+    producer_threads = [threading.Thread(target=produce, args=(n,), daemon=True) for n in range(producers)]
+    worker_threads = [threading.Thread(target=work, args=(n,), daemon=True) for n in range(workstations)]
+    started = time.perf_counter()
+    for t in producer_threads + worker_threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in producer_threads:
+        t.join()
+    producing.clear()
+    for t in worker_threads:
+        t.join(DRAIN_TIMEOUT)
+    elapsed = time.perf_counter() - started
+
+    ids = [record_id for record_id, _ in dispensed]
+    per_workstation = {}
+    for _, n in dispensed:
+        per_workstation[f"bench-{n}"] = per_workstation.get(f"bench-{n}", 0) + 1
+    return {
+        "saved": len(saved),
+        "dispensed": len(ids),
+        "double_dispensed": len(ids) - len(set(ids)),
+        "not_dispensed": len(set(saved) - set(ids)),
+        "dispenses_per_s": round(len(ids) / elapsed, 1),
+        "elapsed_s": round(elapsed, 2),
+        "claim": percentiles(claim_ms),
+        "save_to_dispensed": percentiles(lag_ms),
+        "per_workstation": per_workstation,
+        "errors": len(errors),
+        "first_errors": errors[:5],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dispensing queue throughput under a synthetic load.")
+    parser.add_argument("--portal", choices=PORTALS, default="doctor_portal")
+    parser.add_argument("--workstations", type=int, default=4, help="claiming threads")
+    parser.add_argument("--producers", type=int, default=2, help="threads saving prescriptions")
+    parser.add_argument("--seconds", type=float, default=10, help="how long the producers run")
+    parser.add_argument("--batch", type=int, default=1, help="prescriptions claimed per transaction")
+    parser.add_argument("--rate", type=float, default=0, help="saves per second per producer (0 = flat out)")
+    parser.add_argument("--mysql", action="store_true", help="use the portal's DB_CONFIG instead of SQLite")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    report = {
+        "meta": {
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+            "backend": "mysql" if args.mysql else "sqlite-standin",
+            "portal": args.portal,
+            "workstations": args.workstations,
+            "producers": args.producers,
+            "batch": args.batch,
+            "rate": args.rate,
+        },
+        "results": run(args.portal, args.workstations, args.producers, args.seconds,
+                       args.batch, args.rate, args.mysql),
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
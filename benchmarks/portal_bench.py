@@ -0,0 +1,207 @@
+"""
+Headless benchmark for the Doctor Portal hot paths: Load Patient, Save and
+history rendering, for every portal variant.
+
+Each variant runs in its own subprocess (so peak RSS and module-level pools and
+caches are not shared) against a SQLite stand-in seeded with one synthetic
+patient per history size. Pass --mysql to use each variant's DB_CONFIG
+instead; it seeds "BENCH-" patients into that database.
+
+    python benchmarks/portal_bench.py [--variants doctor_portal doctor_p2]
+                                      [--sizes 1 100 5000] [--rounds 20] [--output bench.json]
+
+The report is JSON: p50/p95/p99 milliseconds per operation and history size,
+plus peak RSS per variant, so runs can be diffed between variants and commits.
+"""
+import argparse
+import importlib
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+VARIANTS = ["doctor_portal", "doctor_portal1", "doctor_p2"]
+DEFAULT_SIZES = [1, 10, 100, 1000, 5000]
+DEFAULT_ROUNDS = 20
+WAIT_TIMEOUT = 30  # seconds for one load or save to finish
+
+
+def percentiles(samples):
+    ordered = sorted(samples)
+    if not ordered:
+        return {}
+
+    def rank(p):
+        return round(ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))], 3)
+
+    return {"n": len(ordered), "p50_ms": rank(50), "p95_ms": rank(95), "p99_ms": rank(99),
+            "max_ms": round(ordered[-1], 3)}
+
+
+def peak_rss_kb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak  # macOS reports bytes
+
+
+# -------------------- WORKER (one variant per process) --------------------
+class Driver:
+    """Drives one DoctorPortalUI through the same calls its buttons make."""
+
+    def __init__(self, app, module):
+        self.app = app
+        self.module = module
+        self.window = module.DoctorPortalUI()
+        self.window.resize(980, 700)
+        self.window.show()
+        app.processEvents()
+
+    def wait_until(self, done):
+        deadline = time.monotonic() + WAIT_TIMEOUT
+        while not done():
+            if time.monotonic() > deadline:
+                raise TimeoutError("Timed out waiting for the portal")
+            self.app.processEvents()
+            time.sleep(0.0002)  # let the worker thread have the GIL
+        self.app.processEvents()
+
+    def load(self, uid, cold=True):
+        if cold:
+            self.module.HISTORY_CACHE.invalidate()
+        start = time.perf_counter()
+        self.window.uid_input.setText(uid)
+        self.window.on_load_patient()
+        self.wait_until(lambda: not self.window.query_executor.is_pending("load"))
+        self.window.history_view.viewport().repaint()
+        return (time.perf_counter() - start) * 1000
+
+    def render(self):
+        model = self.window.history_view.history_model
+        records, has_more = list(model.records()), model.has_more
+        start = time.perf_counter()
+        self.window.populate_history(records, has_more)
+        self.window.history_view.viewport().repaint()
+        return (time.perf_counter() - start) * 1000
+
+    def save(self, uid, text):
+        """Save through the UI and wait until the button is back and the history is refreshed."""
+        self.window.uid_input.setText(uid)
+        self.window.notes_edit.setPlainText(text)
+        self.window.prescription_edit.setPlainText("Paracetamol 500 mg as needed")
+        start = time.perf_counter()
+        self.window.on_save_prescription()
+        self.wait_until(lambda: self.window.save_btn.isEnabled()
+                        and not self.window.query_executor.is_pending("load"))
+        return (time.perf_counter() - start) * 1000
+
+
+def run_variant(variant, sizes, rounds, use_mysql):
+    from PyQt5.QtWidgets import QApplication
+    import db_pool
+    import sqlite_standin
+
+    module = importlib.import_module(variant)
+    run_tag = datetime.now().strftime("%H%M%S")
+
+    if use_mysql:
+        module.initialize_db()
+        seed_conn = module.get_connection()
+        if not seed_conn:
+            raise ConnectionError("Could not connect to MySQL.")
+    else:
+        path = os.path.join(tempfile.mkdtemp(prefix="imhotep-bench-"), f"{variant}.sqlite")
+        db_pool.get_pool(module.DB_CONFIG, connect=lambda: sqlite_standin.connect(path),
+                         pool_size=module.POOL_SIZE)
+        seed_conn = sqlite_standin.connect(path)
+        sqlite_standin.create_schema(seed_conn, variant)
+
+    uids = {}
+    seed_start = time.perf_counter()
+    for size in sizes:
+        uids[size] = f"BENCH-{run_tag}-{size}"
+        sqlite_standin.seed_patient(seed_conn, variant, uids[size], size)
+    seed_conn.close()
+    seed_ms = (time.perf_counter() - seed_start) * 1000
+
+    app = QApplication.instance() or QApplication([])
+    driver = Driver(app, module)
+    results = {}
+    for size in sizes:
+        uid = uids[size]
+        driver.load(uid)  # warm-up: imports, pool connections, first paint
+        load = [driver.load(uid) for _ in range(rounds)]
+        load_cached = [driver.load(uid, cold=False) for _ in range(rounds)]
+        render = [driver.render() for _ in range(rounds)]
+        save = [driver.save(uid, f"bench save {size} #{i}") for i in range(rounds)]
+        results[str(size)] = {
+            "load": percentiles(load),
+            "load_cached": percentiles(load_cached),
+            "render": percentiles(render),
+            "save": percentiles(save),
+        }
+    driver.window.close()
+    return {"seed_ms": round(seed_ms, 1), "sizes": results, "peak_rss_kb": peak_rss_kb()}
+
+
+# -------------------- PARENT --------------------
+def run_in_subprocess(variant, args):
+    cmd = [sys.executable, os.path.abspath(__file__), "--worker", variant,
+           "--rounds", str(args.rounds), "--sizes", *map(str, args.sizes)]
+    if args.mysql:
+        cmd.append("--mysql")
+    proc = subprocess.run(cmd, capture_output=True, text=True, cwd=REPO_ROOT)
+    if proc.returncode != 0:
+        return {"error": proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "worker failed"}
+    # The portals print progress; the report is the last line
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless Doctor Portal load/save/render benchmark.")
+    parser.add_argument("--variants", nargs="+", default=VARIANTS, choices=VARIANTS)
+    parser.add_argument("--sizes", nargs="+", type=int, default=DEFAULT_SIZES,
+                        help="prescriptions per synthetic patient")
+    parser.add_argument("--rounds", type=int, default=DEFAULT_ROUNDS)
+    parser.add_argument("--mysql", action="store_true", help="use each variant's DB_CONFIG instead of SQLite")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_variant(args.worker, args.sizes, args.rounds, args.mysql)))
+        return
+
+    report = {
+        "meta": {
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "backend": "mysql" if args.mysql else "sqlite-standin",
+            "rounds": args.rounds,
+            "sizes": args.sizes,
+        },
+        "variants": {},
+    }
+    for variant in args.variants:
+        print(f"Benchmarking {variant}…", file=sys.stderr)
+        report["variants"][variant] = run_in_subprocess(variant, args)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
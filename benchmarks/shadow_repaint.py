@@ -0,0 +1,117 @@
+"""
+Repaint cost of the cached 9-slice shadows (shadows.py) versus the
+QGraphicsDropShadowEffect they replaced.
+
+Builds the Doctor Portal window once per shadow implementation and times what
+the doctor actually does: typing into the notes box, scrolling a long
+history list, and resizing the window. Runs headless (offscreen Qt platform).
+
+    python benchmarks/shadow_repaint.py [--rounds 200] [--json]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PyQt5.QtGui import QColor
+from PyQt5.QtWidgets import QApplication, QGraphicsDropShadowEffect
+
+import doctor_portal
+import shadows
+
+
+def effect_shadow(widget, blur_radius=20, x_offset=0, y_offset=4, color=QColor(0, 0, 0, 60)):
+    """The previous apply_shadow(): a live QGraphicsDropShadowEffect."""
+    shadow = QGraphicsDropShadowEffect()
+    shadow.setBlurRadius(blur_radius)
+    shadow.setOffset(x_offset, y_offset)
+    shadow.setColor(color)
+    widget.setGraphicsEffect(shadow)
+
+
+IMPLEMENTATIONS = {
+    "effect": effect_shadow,
+    "cached": shadows.apply_shadow,
+}
+
+
+def fake_history(n):
+    return [{
+        "prescription_id": n - i, "patient_uid": "P001", "created_at": f"2025-01-01 {i % 24:02d}:00:00",
+        "condition_notes": f"note {i} " * 12, "prescription": f"amoxicillin {i} mg",
+    } for i in range(n)]
+
+
+def timed(app, rounds, step):
+    """Milliseconds per round for step(i) followed by the paint it triggers."""
+    samples = []
+    for i in range(rounds):
+        start = time.perf_counter()
+        step(i)
+        app.processEvents()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def run(app, name, rounds):
+    doctor_portal.apply_shadow = IMPLEMENTATIONS[name]
+    window = doctor_portal.DoctorPortalUI()
+    window.resize(980, 700)
+    window.show()
+    app.processEvents()
+
+    window.populate_history(fake_history(300))
+    bar = window.history_view.verticalScrollBar()
+    app.processEvents()
+
+    results = {
+        "full_repaint": timed(app, rounds, lambda i: window.repaint()),
+        "typing": timed(app, rounds, lambda i: window.notes_edit.insertPlainText("x")),
+        "history_scroll": timed(app, rounds, lambda i: bar.setValue((i * 37) % max(1, bar.maximum()))),
+        "resize": timed(app, rounds, lambda i: window.resize(980 + (i % 2) * 40, 700 + (i % 2) * 20)),
+    }
+    window.close()
+    window.deleteLater()
+    app.processEvents()
+    return results
+
+
+def summarize(samples):
+    ordered = sorted(samples)
+    return {
+        "mean_ms": round(statistics.mean(ordered), 3),
+        "p50_ms": round(ordered[len(ordered) // 2], 3),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=200)
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    report = {}
+    for name in IMPLEMENTATIONS:
+        report[name] = {scenario: summarize(samples) for scenario, samples in run(app, name, args.rounds).items()}
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"{'scenario':<16}{'effect p50':>12}{'cached p50':>12}{'speed-up':>10}")
+    for scenario in report["effect"]:
+        before = report["effect"][scenario]["p50_ms"]
+        after = report["cached"][scenario]["p50_ms"]
+        speedup = f"{before / after:.1f}x" if after else "-"
+        print(f"{scenario:<16}{before:>10.2f}ms{after:>10.2f}ms{speedup:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+"""
+SQLite stand-in for the portals' MySQL database, used by the benchmarks.
+
+Speaks just enough of the mysql.connector API for the portal queries
+(cursor(dictionary=True), %s placeholders, lastrowid, LEFT(), FOR UPDATE) and knows each
+variant's schema, so a benchmark can run without a MySQL server. It is not a
+general MySQL emulator.
+"""
+import re
+import sqlite3
+from datetime import datetime, timedelta
+
+SCHEMAS = {
+    "doctor_portal": [
+        """CREATE TABLE IF NOT EXISTS prescriptions (
+            prescription_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            patient_uid VARCHAR(50),
+            condition_notes TEXT,
+            prescription TEXT,
+            doctor_name VARCHAR(100),
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            idempotency_key CHAR(36) UNIQUE,
+            version INT NOT NULL DEFAULT 1
+        )""",
+        """CREATE INDEX IF NOT EXISTS idx_prescriptions_patient_created
+            ON prescriptions (patient_uid, created_at DESC, prescription_id DESC)""",
+        """CREATE TABLE IF NOT EXISTS prescription_items (
+            prescription_id INT NOT NULL,
+            line_no SMALLINT NOT NULL,
+            drug VARCHAR(200) NOT NULL,
+            dose VARCHAR(64),
+            frequency VARCHAR(64),
+            duration VARCHAR(64),
+            PRIMARY KEY (prescription_id, line_no)
+        )""",
+        """CREATE TABLE IF NOT EXISTS prescription_changes (
+            change_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            patient_uid VARCHAR(50),
+            prescription_id INT NOT NULL,
+            op VARCHAR(10) NOT NULL,
+            changed_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )""",
+        """CREATE TRIGGER IF NOT EXISTS trg_prescriptions_log_insert AFTER INSERT ON prescriptions BEGIN
+            INSERT INTO prescription_changes (patient_uid, prescription_id, op)
+            VALUES (NEW.patient_uid, NEW.prescription_id, 'insert');
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_prescriptions_log_update AFTER UPDATE ON prescriptions BEGIN
+            INSERT INTO prescription_changes (patient_uid, prescription_id, op)
+            VALUES (NEW.patient_uid, NEW.prescription_id, 'update');
+        END""",
+        """CREATE TABLE IF NOT EXISTS dispense_queue (
+            queue_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            prescription_id INT NOT NULL UNIQUE,
+            patient_uid VARCHAR(50),
+            created_at DATETIME NOT NULL,
+            status VARCHAR(10) NOT NULL DEFAULT 'pending',
+            claimed_by VARCHAR(100),
+            claimed_at DATETIME,
+            dispensed_at DATETIME
+        )""",
+        """CREATE INDEX IF NOT EXISTS idx_dispense_queue_status_created
+            ON dispense_queue (status, created_at, queue_id)""",
+        """CREATE TRIGGER IF NOT EXISTS trg_prescriptions_queue_dispense AFTER INSERT ON prescriptions BEGIN
+            INSERT INTO dispense_queue (prescription_id, patient_uid, created_at)
+            VALUES (NEW.prescription_id, NEW.patient_uid, NEW.created_at);
+        END""",
+    ],
+    "doctor_portal1": [
+        """CREATE TABLE IF NOT EXISTS Prescription (
+            Pr_ID INTEGER PRIMARY KEY AUTOINCREMENT,
+            Patient_UID VARCHAR(50),
+            Condition_Notes TEXT,
+            Prescription TEXT,
+            Doctor_Name VARCHAR(100),
+            Created_At DATETIME DEFAULT CURRENT_TIMESTAMP,
+            Idempotency_Key CHAR(36) UNIQUE,
+            Version INT NOT NULL DEFAULT 1
+        )""",
+        """CREATE INDEX IF NOT EXISTS idx_prescription_patient_created
+            ON Prescription (Patient_UID, Created_At DESC, Pr_ID DESC)""",
+        """CREATE TABLE IF NOT EXISTS Prescription_Item (
+            Pr_ID INT NOT NULL,
+            Line_No SMALLINT NOT NULL,
+            Drug VARCHAR(200) NOT NULL,
+            Dose VARCHAR(64),
+            Frequency VARCHAR(64),
+            Duration VARCHAR(64),
+            PRIMARY KEY (Pr_ID, Line_No)
+        )""",
+        """CREATE TABLE IF NOT EXISTS Prescription_Change (
+            Change_ID INTEGER PRIMARY KEY AUTOINCREMENT,
+            Patient_UID VARCHAR(50),
+            Pr_ID INT NOT NULL,
+            Op VARCHAR(10) NOT NULL,
+            Changed_At DATETIME DEFAULT CURRENT_TIMESTAMP
+        )""",
+        """CREATE TRIGGER IF NOT EXISTS trg_prescription_log_insert AFTER INSERT ON Prescription BEGIN
+            INSERT INTO Prescription_Change (Patient_UID, Pr_ID, Op) VALUES (NEW.Patient_UID, NEW.Pr_ID, 'insert');
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_prescription_log_update AFTER UPDATE ON Prescription BEGIN
+            INSERT INTO Prescription_Change (Patient_UID, Pr_ID, Op) VALUES (NEW.Patient_UID, NEW.Pr_ID, 'update');
+        END""",
+        """CREATE TABLE IF NOT EXISTS Dispense_Queue (
+            Queue_ID INTEGER PRIMARY KEY AUTOINCREMENT,
+            Pr_ID INT NOT NULL UNIQUE,
+            Patient_UID VARCHAR(50),
+            Created_At DATETIME NOT NULL,
+            Status VARCHAR(10) NOT NULL DEFAULT 'pending',
+            Claimed_By VARCHAR(100),
+            Claimed_At DATETIME,
+            Dispensed_At DATETIME
+        )""",
+        """CREATE INDEX IF NOT EXISTS idx_dispense_queue_status_created
+            ON Dispense_Queue (Status, Created_At, Queue_ID)""",
+        """CREATE TRIGGER IF NOT EXISTS trg_prescription_queue_dispense AFTER INSERT ON Prescription BEGIN
+            INSERT INTO Dispense_Queue (Pr_ID, Patient_UID, Created_At) VALUES (NEW.Pr_ID, NEW.Patient_UID, NEW.Created_At);
+        END""",
+    ],
+    "doctor_p2": [
+        """CREATE TABLE IF NOT EXISTS patient_portal (
+            Patient_ID INTEGER PRIMARY KEY AUTOINCREMENT,
+            Patient_UID VARCHAR(50) UNIQUE
+        )""",
+        """CREATE TABLE IF NOT EXISTS prescription (
+            Pr_ID INTEGER PRIMARY KEY AUTOINCREMENT,
+            Patient_ID INT,
+            Condition_Notes TEXT,
+            Prescription TEXT,
+            Version INT NOT NULL DEFAULT 1
+        )""",
+        """CREATE INDEX IF NOT EXISTS idx_prescription_patient_pr
+            ON prescription (Patient_ID, Pr_ID DESC)""",
+    ],
+}
+
+
+def translate(sql):
+    """MySQL dialect -> SQLite for the handful of constructs the portals use."""
+    sql = sql.replace("%s", "?").replace("@@auto_increment_increment", "1")
+    sql = re.sub(r"\s+FOR UPDATE(?: SKIP LOCKED)?\s*$", "", sql)
+    return re.sub(r"\bLEFT\(", "left_(", sql)
+
+
+def _left(text, n):
+    return text if text is None else text[:n]
+
+
+class StandinCursor:
+    def __init__(self, cursor, dictionary=False):
+        self._cur = cursor
+        self._dictionary = dictionary
+        self.lastrowid = None
+        self.rowcount = -1
+
+    def execute(self, sql, params=()):
+        if sql.lstrip().upper().startswith("SET @"):
+            return  # no session variables; the stand-in's triggers do not read them
+        if "FOR UPDATE" in sql and not self._cur.connection.in_transaction:
+            # No row locks in SQLite: take the database write lock instead, which
+            # serializes claims like FOR UPDATE (without SKIP LOCKED's concurrency)
+            self._cur.execute("BEGIN IMMEDIATE")
+        self._cur.execute(translate(sql), tuple(params or ()))
+        self.lastrowid = self._cur.lastrowid
+        self.rowcount = self._cur.rowcount
+        if self.rowcount > 1 and self.lastrowid and sql.lstrip().upper().startswith("INSERT"):
+            # SQLite reports the last id of a multi-row INSERT, MySQL the first
+            self.lastrowid -= self.rowcount - 1
+
+    def executemany(self, sql, seq_of_params):
+        self._cur.executemany(translate(sql), [tuple(p) for p in seq_of_params])
+        self.rowcount = self._cur.rowcount
+
+    @property
+    def description(self):
+        return self._cur.description
+
+    def _row(self, row):
+        if row is None or not self._dictionary:
+            return row
+        return dict(zip((d[0] for d in self._cur.description), row))
+
+    def fetchone(self):
+        return self._row(self._cur.fetchone())
+
+    def fetchmany(self, size=1):
+        return [self._row(r) for r in self._cur.fetchmany(size)]
+
+    def fetchall(self):
+        return [self._row(r) for r in self._cur.fetchall()]
+
+    def __iter__(self):
+        for row in self._cur:
+            yield self._row(row)
+
+    def close(self):
+        self._cur.close()
+
+
+class StandinConnection:
+    """One SQLite connection per pooled "MySQL" connection; safe to hand between threads."""
+
+    def __init__(self, path):
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.create_function("left_", 2, _left)
+
+    def cursor(self, dictionary=False, **kwargs):
+        return StandinCursor(self._db.cursor(), dictionary)
+
+    @property
+    def in_transaction(self):
+        return self._db.in_transaction
+
+    def commit(self):
+        self._db.commit()
+
+    def rollback(self):
+        self._db.rollback()
+
+    def ping(self, **kwargs):
+        pass
+
+    def is_connected(self):
+        return True
+
+    def close(self):
+        self._db.close()
+
+
+def connect(path):
+    return StandinConnection(path)
+
+
+def create_schema(conn, variant):
+    cur = conn.cursor()
+    for sql in SCHEMAS[variant]:
+        cur.execute(sql)
+    conn.commit()
+    cur.close()
+
+
+# -------------------- SYNTHETIC DATA --------------------
+def _rows(n):
+    start = datetime(2024, 1, 1)
+    for i in range(n):
+        notes = f"Visit {i}: " + "persistent cough, mild fever, advised rest and fluids. " * 3
+        presc = f"Amoxicillin {250 + (i % 4) * 125} mg, 3x daily for 7 days"
+        yield notes, presc, (start + timedelta(hours=i)).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def seed_patient(conn, variant, uid, n):
+    """
+    Insert n prescriptions for uid using plain %s SQL, so the same function seeds
+    the SQLite stand-in or a real MySQL database.
+    """
+    cur = conn.cursor()
+    if variant == "doctor_portal":
+        cur.executemany(
+            "INSERT INTO prescriptions (patient_uid, condition_notes, prescription, doctor_name, created_at) "
+            "VALUES (%s, %s, %s, %s, %s)",
+            [(uid, notes, presc, "Dr. Bench", created) for notes, presc, created in _rows(n)]
+        )
+    elif variant == "doctor_portal1":
+        cur.executemany(
+            "INSERT INTO Prescription (Patient_UID, Condition_Notes, Prescription, Doctor_Name, Created_At) "
+            "VALUES (%s, %s, %s, %s, %s)",
+            [(uid, notes, presc, "Dr. Bench", created) for notes, presc, created in _rows(n)]
+        )
+    else:
+        cur.execute("INSERT INTO patient_portal (Patient_UID) VALUES (%s)", (uid,))
+        patient_id = cur.lastrowid
+        cur.executemany(
+            "INSERT INTO prescription (Patient_ID, Condition_Notes, Prescription) VALUES (%s, %s, %s)",
+            [(patient_id, notes, presc) for notes, presc, _ in _rows(n)]
+        )
+    conn.commit()
+    cur.close()
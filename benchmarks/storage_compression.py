@@ -0,0 +1,267 @@
+"""
+Storage cost of the prescription text with and without InnoDB table compression
+(COMPRESSED_STORAGE in the portals).
+
+Against a MySQL server it builds two scratch copies of the doctor_portal
+prescriptions table, one ROW_FORMAT=DYNAMIC and one ROW_FORMAT=COMPRESSED, fills
+both with the same synthetic rows and reports for each:
+
+  - on-disk size: data + indexes from information_schema, after ANALYZE TABLE
+  - history-load latency: p50/p95 of the portal's first history page plus the
+    full latest record, for random patients
+  - buffer-pool hit rate during those loads (server-wide counters, so run it on
+    an otherwise idle server; make --rows large against innodb_buffer_pool_size
+    to see the difference)
+
+This is the evidence COMPRESSED_STORAGE needs before it is turned on: the
+portals keep it off until these numbers have been taken on the target server.
+
+--estimate needs no server: it packs the same rows into 16 KB pages and zlib-
+compresses each page the way InnoDB does, and compares that with compressing
+each body on its own (what an application-side column codec would get).
+
+    python benchmarks/storage_compression.py [--rows 200000] [--patients 2000] [--loads 500] [--json]
+    python benchmarks/storage_compression.py --estimate [--rows 50000]
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import zlib
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PAGE_BYTES = 16 * 1024
+KEY_BLOCK_SIZE = 8          # KB, as COMPRESSED_KEY_BLOCK_SIZE
+ZLIB_LEVEL = 6              # innodb_compression_level default
+PREVIEW_CHARS = 120
+HISTORY_PAGE_SIZE = 30
+
+TABLES = {
+    "dynamic": ("bench_prescriptions_dynamic", "ROW_FORMAT=DYNAMIC"),
+    "compressed": ("bench_prescriptions_compressed", f"ROW_FORMAT=COMPRESSED KEY_BLOCK_SIZE={KEY_BLOCK_SIZE}"),
+}
+
+# -------------------- SYNTHETIC ROWS --------------------
+SYMPTOMS = ["persistent cough", "mild fever", "sore throat", "lower back pain", "headache", "fatigue",
+            "shortness of breath on exertion", "nausea after meals", "skin rash on forearms", "joint stiffness",
+            "elevated blood pressure", "seasonal allergies", "insomnia", "dizziness when standing"]
+FINDINGS = ["chest clear on auscultation", "temperature 38.2 C", "BP 142/91", "SpO2 97%", "no lymphadenopathy",
+            "tenderness over L4-L5", "pharynx erythematous", "HbA1c 7.1%", "pulse 88 regular", "weight stable"]
+PLANS = ["advised rest and fluids", "review in two weeks", "refer to physiotherapy", "repeat bloods in 3 months",
+         "lifestyle advice given", "return if symptoms worsen", "continue current medication"]
+DRUGS = ["Amoxicillin", "Paracetamol", "Ibuprofen", "Metformin", "Amlodipine", "Cetirizine", "Omeprazole",
+         "Salbutamol inhaler", "Atorvastatin", "Azithromycin", "Prednisolone", "Losartan"]
+DOSES = ["250 mg", "500 mg", "5 mg", "10 mg", "20 mg", "40 mg", "100 mcg/dose"]
+SCHEDULES = ["once daily", "twice daily", "three times daily", "every 6 hours as needed", "at night"]
+DOCTORS = [f"Dr. {name}" for name in ("Rahman", "Chowdhury", "Hossain", "Sarker", "Ahmed", "Islam", "Karim",
+                                      "Begum", "Das", "Roy", "Sen", "Khan")]
+
+
+def synthetic_rows(n, patients, seed=7):
+    """(patient_uid, condition_notes, prescription, doctor_name, created_at) tuples."""
+    rnd = random.Random(seed)
+    start = datetime(2023, 1, 1)
+    for i in range(n):
+        doctor = rnd.choice(DOCTORS)
+        notes = (f"Presented with {rnd.choice(SYMPTOMS)} for {rnd.randint(2, 30)} days"
+                 f" and {rnd.choice(SYMPTOMS)}. On examination {rnd.choice(FINDINGS)}, {rnd.choice(FINDINGS)}."
+                 f" Plan: {rnd.choice(PLANS)}; {rnd.choice(PLANS)}.")
+        lines = [f"{rnd.choice(DRUGS)} {rnd.choice(DOSES)}, {rnd.choice(SCHEDULES)} for {rnd.randint(3, 30)} days"
+                 for _ in range(rnd.randint(1, 4))]
+        prescription = "\n".join(lines)
+        created = start + timedelta(minutes=7 * i)
+        yield (f"P{rnd.randrange(patients):05d}", notes, prescription, doctor,
+               created.strftime("%Y-%m-%d %H:%M:%S"))
+
+
+# -------------------- ESTIMATE (no server) --------------------
+def estimate(rows, patients):
+    """Page-level zlib as InnoDB does it vs. compressing each text body on its own."""
+    raw = page_compressed = fitting = 0
+    per_body = per_body_raw = 0
+    pages = 0
+    page = bytearray()
+
+    def close_page():
+        nonlocal page_compressed, fitting, pages
+        if not page:
+            return
+        size = len(zlib.compress(bytes(page), ZLIB_LEVEL))
+        pages += 1
+        page_compressed += size
+        # A page that does not fit the key block is split by InnoDB, costing two blocks
+        fitting += size <= KEY_BLOCK_SIZE * 1024
+
+    for uid, notes, presc, doctor, created in synthetic_rows(rows, patients):
+        record = "\x00".join((uid, notes, presc, doctor, created)).encode("utf-8") + b"\x00" * 20  # ~row header
+        raw += len(record)
+        for body in (notes, presc):
+            encoded = body.encode("utf-8")
+            per_body_raw += len(encoded)
+            per_body += len(zlib.compress(encoded, ZLIB_LEVEL))
+        if len(page) + len(record) > PAGE_BYTES * 15 // 16:   # InnoDB leaves 1/16 of a page free
+            close_page()
+            page = bytearray()
+        page += record
+    close_page()
+
+    on_disk_dynamic = pages * PAGE_BYTES
+    on_disk_compressed = (fitting + 2 * (pages - fitting)) * KEY_BLOCK_SIZE * 1024
+    return {
+        "rows": rows,
+        "raw_bytes": raw,
+        "pages": pages,
+        "page_zlib_ratio": round(raw / page_compressed, 2),
+        "pages_fitting_key_block": round(fitting / pages, 3),
+        "est_bytes_dynamic": on_disk_dynamic,
+        "est_bytes_compressed": on_disk_compressed,
+        "est_saving": round(1 - on_disk_compressed / on_disk_dynamic, 3),
+        "per_body_zlib_ratio": round(per_body_raw / per_body, 2),
+    }
+
+
+# -------------------- MEASURE (MySQL) --------------------
+def _status(cur, names):
+    cur.execute("SHOW GLOBAL STATUS WHERE Variable_name IN (%s)" % ", ".join(["%s"] * len(names)), names)
+    return {name: int(value) for name, value in cur.fetchall()}
+
+
+def build_table(conn, table, options, rows, patients, batch=1000):
+    cur = conn.cursor()
+    cur.execute(f"DROP TABLE IF EXISTS {table}")
+    cur.execute(f"""
+        CREATE TABLE {table} (
+            prescription_id INT AUTO_INCREMENT PRIMARY KEY,
+            patient_uid VARCHAR(50),
+            condition_notes TEXT,
+            prescription TEXT,
+            doctor_name VARCHAR(100),
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            INDEX idx_patient_created (patient_uid, created_at DESC, prescription_id DESC)
+        ) {options}
+    """)
+    sql = (f"INSERT INTO {table} (patient_uid, condition_notes, prescription, doctor_name, created_at) "
+           f"VALUES (%s, %s, %s, %s, %s)")
+    chunk = []
+    for row in synthetic_rows(rows, patients):
+        chunk.append(row)
+        if len(chunk) >= batch:
+            cur.executemany(sql, chunk)
+            conn.commit()
+            chunk = []
+    if chunk:
+        cur.executemany(sql, chunk)
+        conn.commit()
+    cur.execute(f"ANALYZE TABLE {table}")
+    cur.fetchall()
+    cur.execute("""
+        SELECT DATA_LENGTH, INDEX_LENGTH FROM information_schema.TABLES
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+    """, (table,))
+    data, index = cur.fetchone()
+    cur.close()
+    return data, index
+
+
+def history_loads(conn, table, patients, loads, seed=11):
+    """Latencies (ms) of the portal's first-page history load, and buffer-pool counters around them."""
+    rnd = random.Random(seed)
+    cur = conn.cursor()
+    counters = ["Innodb_buffer_pool_read_requests", "Innodb_buffer_pool_reads"]
+    before = _status(cur, counters)
+    samples = []
+    for _ in range(loads):
+        uid = f"P{rnd.randrange(patients):05d}"
+        start = time.perf_counter()
+        cur.execute(f"""
+            SELECT prescription_id, patient_uid, created_at,
+                   LEFT(condition_notes, %s) AS condition_notes, LEFT(prescription, %s) AS prescription
+            FROM {table} WHERE patient_uid = %s
+            ORDER BY created_at DESC, prescription_id DESC LIMIT %s
+        """, (PREVIEW_CHARS, PREVIEW_CHARS, uid, HISTORY_PAGE_SIZE + 1))
+        page = cur.fetchall()
+        if page:
+            cur.execute(f"SELECT * FROM {table} WHERE prescription_id = %s", (page[0][0],))
+            cur.fetchall()
+        samples.append((time.perf_counter() - start) * 1000)
+    after = _status(cur, counters)
+    cur.close()
+    requests = after[counters[0]] - before[counters[0]]
+    misses = after[counters[1]] - before[counters[1]]
+    ordered = sorted(samples)
+    return {
+        "p50_ms": round(ordered[len(ordered) // 2], 3),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3),
+        "mean_ms": round(statistics.mean(ordered), 3),
+        "buffer_pool_hit_rate": round(1 - misses / requests, 5) if requests else None,
+    }
+
+
+def measure(args):
+    import mysql.connector
+    import doctor_portal
+
+    conn = mysql.connector.connect(**doctor_portal.DB_CONFIG)
+    report = {}
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT @@innodb_buffer_pool_size")
+        report["innodb_buffer_pool_size"] = int(cur.fetchone()[0])
+        cur.close()
+        for name, (table, options) in TABLES.items():
+            data, index = build_table(conn, table, options, args.rows, args.patients)
+            report[name] = {"data_bytes": data, "index_bytes": index}
+        # Loads run after both tables exist, so neither has the other's build still cached
+        for name, (table, _) in TABLES.items():
+            report[name].update(history_loads(conn, table, args.patients, args.loads))
+    finally:
+        if not args.keep:
+            cur = conn.cursor()
+            for table, _ in TABLES.values():
+                cur.execute(f"DROP TABLE IF EXISTS {table}")
+            cur.close()
+        conn.close()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--patients", type=int, default=2000)
+    parser.add_argument("--loads", type=int, default=500, help="history loads timed per table")
+    parser.add_argument("--estimate", action="store_true", help="no server: estimate the compression ratio only")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch tables for inspection")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    report = estimate(args.rows, args.patients) if args.estimate else measure(args)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    if args.estimate:
+        print(f"{report['rows']:,} rows in {report['pages']:,} pages of 16 KB")
+        print(f"page-level zlib ratio      {report['page_zlib_ratio']:.2f}x "
+              f"({report['pages_fitting_key_block']:.0%} of pages fit KEY_BLOCK_SIZE={KEY_BLOCK_SIZE})")
+        print(f"per-body zlib ratio        {report['per_body_zlib_ratio']:.2f}x")
+        print(f"estimated table size       {report['est_bytes_dynamic'] / 2**20:.1f} MiB -> "
+              f"{report['est_bytes_compressed'] / 2**20:.1f} MiB ({report['est_saving']:.0%} smaller)")
+        print("estimate only: run without --estimate against MySQL for size, latency and buffer-pool hit rate")
+        return
+
+    print(f"innodb_buffer_pool_size {report['innodb_buffer_pool_size'] / 2**20:.0f} MiB")
+    print(f"{'table':<12}{'data MiB':>10}{'index MiB':>11}{'p50':>9}{'p95':>9}{'bp hit':>9}")
+    for name in TABLES:
+        r = report[name]
+        hit = f"{r['buffer_pool_hit_rate']:.2%}" if r["buffer_pool_hit_rate"] is not None else "-"
+        print(f"{name:<12}{r['data_bytes'] / 2**20:>10.1f}{r['index_bytes'] / 2**20:>11.1f}"
+              f"{r['p50_ms']:>7.2f}ms{r['p95_ms']:>7.2f}ms{hit:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Widget creation cost of per-widget inline stylesheets versus the single
+application stylesheet from theme.py.
+
+Builds a panel of history-card-like widgets (a card frame with three labels and
+an Edit button, as the old per-prescription history cards were) both ways and
+times creation through the first paint. Also times building the whole Doctor
+Portal window under the theme and switching between themes at runtime. Runs
+headless (offscreen Qt platform).
+
+    python benchmarks/stylesheet_build.py [--cards 200] [--rounds 10] [--json]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PyQt5.QtCore import QEvent
+from PyQt5.QtWidgets import QApplication, QFrame, QLabel, QPushButton, QVBoxLayout, QWidget
+
+import doctor_portal
+import theme
+
+INLINE_CARD = "QFrame { border: 1px solid #ddd; border-radius: 8px; background: #fff; }"
+INLINE_LABEL = "color: #222; border: none;"
+INLINE_BUTTON = """
+    QPushButton {
+        background-color: #2b78f6; color: white; border: 1px solid #1f5fd6;
+        border-radius: 8px; padding: 8px 12px; font-weight: 600;
+    }
+    QPushButton:hover { background-color: #1a63d9; }
+    QPushButton:pressed { background-color: #144fb8; }
+"""
+
+
+def discard(app, window):
+    """Really delete a window: outside app.exec_(), deleteLater() alone never runs."""
+    window.close()
+    window.deleteLater()
+    app.sendPostedEvents(None, QEvent.DeferredDelete)
+
+
+def build_cards(app, count, inline):
+    """A shown window holding count cards; returns the milliseconds it took."""
+    start = time.perf_counter()
+    window = QWidget()
+    window.setObjectName("portal")
+    layout = QVBoxLayout(window)
+    for i in range(count):
+        card = QFrame()
+        card_layout = QVBoxLayout(card)
+        if inline:
+            card.setStyleSheet(INLINE_CARD)
+        else:
+            card.setObjectName("editorFrame")
+        for text in (f"ID: {i} | Date: 2025-01-01", "Notes: persistent cough", "Prescription: amoxicillin"):
+            label = QLabel(text)
+            if inline:
+                label.setStyleSheet(INLINE_LABEL)
+            card_layout.addWidget(label)
+        button = QPushButton("✏ Edit")
+        if inline:
+            button.setStyleSheet(INLINE_BUTTON)
+        else:
+            theme.set_role(button, "primary")
+        card_layout.addWidget(button)
+        layout.addWidget(card)
+    window.show()
+    app.processEvents()
+    elapsed = (time.perf_counter() - start) * 1000
+    discard(app, window)
+    return elapsed
+
+
+def build_window(app):
+    start = time.perf_counter()
+    window = doctor_portal.DoctorPortalUI()
+    window.show()
+    app.processEvents()
+    elapsed = (time.perf_counter() - start) * 1000
+    return window, elapsed
+
+
+def summarize(samples):
+    ordered = sorted(samples)
+    return {
+        "mean_ms": round(statistics.mean(ordered), 3),
+        "p50_ms": round(ordered[len(ordered) // 2], 3),
+        "max_ms": round(ordered[-1], 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--cards", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    report = {}
+
+    app.setStyleSheet("")
+    report["cards_inline"] = summarize([build_cards(app, args.cards, True) for _ in range(args.rounds)])
+    theme.apply_theme("light", app)
+    report["cards_theme"] = summarize([build_cards(app, args.cards, False) for _ in range(args.rounds)])
+
+    samples = []
+    for _ in range(args.rounds):
+        window, elapsed = build_window(app)
+        discard(app, window)
+        samples.append(elapsed)
+    report["portal_window"] = summarize(samples)
+
+    window, _ = build_window(app)   # the window a theme switch re-polishes
+
+    switches = []
+    for i in range(args.rounds):
+        start = time.perf_counter()
+        theme.apply_theme("dark" if i % 2 == 0 else "light", app)
+        app.processEvents()
+        switches.append((time.perf_counter() - start) * 1000)
+    report["theme_switch"] = summarize(switches)
+    discard(app, window)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"{'scenario':<16}{'p50':>10}{'max':>10}")
+    for scenario, stats in report.items():
+        print(f"{scenario:<16}{stats['p50_ms']:>8.2f}ms{stats['max_ms']:>8.2f}ms")
+    before, after = report["cards_inline"]["p50_ms"], report["cards_theme"]["p50_ms"]
+    if after:
+        print(f"{args.cards} cards: {before / after:.1f}x faster with the application stylesheet")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,433 @@
+"""
+Bulk import / export of prescriptions (CSV or JSON lines) from the command line.
+
+    python bulk_io.py import legacy.csv --portal doctor_portal1
+    python bulk_io.py export audit.jsonl --portal doctor_portal
+
+Both directions stream: memory use depends on the batch size, not on the file
+or table size.
+
+Import reads the file in batches of --batch rows and writes each batch with one
+multi-row INSERT, plus one for the batch's line items (see prescription_items.py),
+and one COMMIT. The byte offset reached is stored in the bulk_import_progress
+table in the same transaction as the batch, so after a failure (a bad row, a dropped connection, Ctrl+C) running
+the same command again resumes right after the last committed batch without
+duplicating rows. The file's column names are the table's own (as written by
+export); other columns, such as the id, are ignored. A legacy doctor signature
+at the end of an imported prescription is dropped (unless --keep-signatures),
+as the portals' migration does for rows already in the database. The import's session sets
+@imhotep_bulk_import, so triggers can tell old records from new prescriptions
+(the pharmacy's dispense queue skips them; see pharmacy_queue.py).
+
+Export reads through an unbuffered cursor, so rows stream from the server as
+they are written out, and the output only replaces the target file once complete.
+"""
+import argparse
+import csv
+import hashlib
+import importlib
+import json
+import os
+import sys
+import time
+from collections import namedtuple
+
+from db_pool import consecutive_insert_ids
+from portal_config import BULK_IMPORT_VARIABLE, ITEM_TABLES
+from prescription_items import insert_items, item_rows, strip_signature
+
+DEFAULT_BATCH_ROWS = 1000
+PROGRESS_TABLE = "bulk_import_progress"
+PROGRESS_EVERY = 1.0         # seconds between progress lines
+FINGERPRINT_BYTES = 64 * 1024
+
+# columns: what import writes, in file order; the third is the prescription text and
+# the last one is the creation time, which defaults to now when the file leaves it empty.
+# items: the portal's ItemTable (portal_config.ITEM_TABLES), filled in by main()
+# strip_signatures: drop a legacy "— <doctor>" signature from imported text (--keep-signatures turns it off)
+TableSpec = namedtuple("TableSpec", ["table", "id_column", "columns", "items", "strip_signatures"],
+                       defaults=(None, True))
+TEXT_COLUMN = 2
+
+TABLES = {
+    "doctor_portal": TableSpec("prescriptions", "prescription_id",
+                               ["patient_uid", "condition_notes", "prescription", "doctor_name", "created_at"]),
+    "doctor_portal1": TableSpec("Prescription", "Pr_ID",
+                                ["Patient_UID", "Condition_Notes", "Prescription", "Doctor_Name", "Created_At"]),
+}
+
+FORMATS = ("csv", "jsonl")
+
+
+class BulkIOError(RuntimeError):
+    """Raised for unusable input files and for batches the database rejected."""
+
+
+def detect_format(path, fmt=None):
+    if fmt:
+        return fmt
+    ext = os.path.splitext(path)[1].lower().lstrip(".")
+    if ext in ("json", "ndjson"):
+        ext = "jsonl"
+    if ext not in FORMATS:
+        raise BulkIOError(f"Cannot tell the format of {path!r}; pass --format csv or --format jsonl.")
+    return ext
+
+
+# -------------------- PROGRESS --------------------
+class Progress:
+    """One self-overwriting status line on stderr, refreshed at most every PROGRESS_EVERY seconds."""
+
+    def __init__(self, verb, total=None, stream=None):
+        self.verb = verb
+        self.total = total
+        self.stream = stream or sys.stderr
+        self.started = time.monotonic()
+        self._shown = 0.0
+
+    def update(self, rows, done=None, force=False):
+        now = time.monotonic()
+        if not force and now - self._shown < PROGRESS_EVERY:
+            return
+        self._shown = now
+        line = f"{self.verb} {rows:,} rows"
+        if self.total and done is not None:
+            line += f" ({min(done / self.total, 1):.0%})"
+        elapsed = now - self.started
+        if elapsed > 0:
+            line += f", {rows / elapsed:,.0f} rows/s"
+        self.stream.write("\r" + line)
+        self.stream.flush()
+
+    def finish(self, rows, done=None):
+        self.update(rows, done, force=True)
+        self.stream.write("\n")
+
+
+# -------------------- READING --------------------
+class _LineSource:
+    """Text lines of a UTF-8 file read in binary, so the byte offset after every line is known."""
+
+    def __init__(self, f, offset):
+        self.f = f
+        self.offset = offset
+        f.seek(offset)
+
+    def __iter__(self):
+        for raw in self.f:
+            start = self.offset
+            self.offset += len(raw)
+            line = raw.decode("utf-8")
+            yield line.lstrip("\ufeff") if start == 0 else line
+
+
+def _csv_header(f, columns):
+    """Read the header line; returns ({column: position in the row}, byte offset of the first row)."""
+    source = _LineSource(f, 0)
+    header = next(csv.reader(source), None)
+    if not header:
+        raise BulkIOError("The CSV file is empty.")
+    names = {name.strip().lower(): i for i, name in enumerate(header)}
+    return {c: names[c.lower()] for c in columns if c.lower() in names}, source.offset
+
+
+def _csv_records(f, offset, positions, columns):
+    """(row tuple in column order, byte offset after the record) for each CSV record."""
+    source = _LineSource(f, offset)
+    reader = csv.reader(source)
+    for values in reader:
+        if not values:
+            continue
+        row = []
+        for c in columns:
+            i = positions.get(c)
+            value = values[i] if i is not None and i < len(values) else ""
+            row.append(value if value != "" else None)
+        yield tuple(row), source.offset
+
+
+def _jsonl_records(f, offset, columns):
+    source = _LineSource(f, offset)
+    for line in source:
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            raise BulkIOError(f"The line ending at byte {source.offset:,} is not valid JSON: {e}")
+        if not isinstance(record, dict):
+            raise BulkIOError(f"The line ending at byte {source.offset:,} is not a JSON object.")
+        values = {k.lower(): v for k, v in record.items()}
+        row = []
+        for c in columns:
+            value = values.get(c.lower())
+            row.append(value if value != "" else None)
+        yield tuple(row), source.offset
+
+
+def _fingerprint(spec, path):
+    """Identifies an import: target table, file name and its first FINGERPRINT_BYTES."""
+    digest = hashlib.sha1(f"{spec.table}|{os.path.basename(path)}|".encode("utf-8"))
+    with open(path, "rb") as f:
+        digest.update(f.read(FINGERPRINT_BYTES))
+    return digest.hexdigest()
+
+
+# -------------------- IMPORT --------------------
+def _ensure_progress_table(conn):
+    cur = conn.cursor()
+    try:
+        cur.execute(f"""
+            CREATE TABLE IF NOT EXISTS {PROGRESS_TABLE} (
+                source_key CHAR(40) NOT NULL PRIMARY KEY,
+                source_name VARCHAR(255),
+                target_table VARCHAR(64),
+                byte_offset BIGINT NOT NULL DEFAULT 0,
+                rows_done BIGINT NOT NULL DEFAULT 0,
+                finished TINYINT NOT NULL DEFAULT 0,
+                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        conn.commit()
+    finally:
+        cur.close()
+
+
+def _start_progress(conn, key, spec, path, data_start, restart):
+    """Byte offset and row count to continue from, after registering (or resetting) the import."""
+    cur = conn.cursor()
+    try:
+        cur.execute(f"SELECT byte_offset, rows_done, finished FROM {PROGRESS_TABLE} WHERE source_key = %s",
+                    (key,))
+        row = cur.fetchone()
+        if row and not restart:
+            offset, rows_done, finished = row
+            if finished:
+                raise BulkIOError(f"{os.path.basename(path)} was already imported ({rows_done:,} rows); "
+                                  f"pass --restart to import it again.")
+            if offset > os.path.getsize(path):
+                raise BulkIOError("The file is shorter than when the import stopped; pass --restart.")
+            return max(offset, data_start), rows_done
+        if row:
+            cur.execute(f"""
+                UPDATE {PROGRESS_TABLE} SET byte_offset = %s, rows_done = 0, finished = 0,
+                    updated_at = CURRENT_TIMESTAMP WHERE source_key = %s
+            """, (data_start, key))
+        else:
+            cur.execute(f"""
+                INSERT INTO {PROGRESS_TABLE} (source_key, source_name, target_table, byte_offset)
+                VALUES (%s, %s, %s, %s)
+            """, (key, os.path.basename(path)[:255], spec.table, data_start))
+        conn.commit()
+        return data_start, 0
+    finally:
+        cur.close()
+
+
+def _mark_import_session(conn, importing):
+    """Set or clear BULK_IMPORT_VARIABLE (pooled connections keep session variables)."""
+    cur = conn.cursor()
+    try:
+        cur.execute(f"SET {BULK_IMPORT_VARIABLE} = %s", (1 if importing else None,))
+    finally:
+        cur.close()
+
+
+def _insert_sql(spec, n_rows):
+    values = "(" + ", ".join(["%s"] * (len(spec.columns) - 1) + ["COALESCE(%s, CURRENT_TIMESTAMP)"]) + ")"
+    return f"INSERT INTO {spec.table} ({', '.join(spec.columns)}) VALUES " + ", ".join([values] * n_rows)
+
+
+def _write_batch(conn, spec, key, rows, offset, rows_done, finished=False):
+    """Insert one batch (and its line items) and move the import's checkpoint past it, in one transaction."""
+    cur = conn.cursor()
+    try:
+        if rows:
+            if spec.strip_signatures:
+                rows = [row[:TEXT_COLUMN] + (strip_signature(row[TEXT_COLUMN]),) + row[TEXT_COLUMN + 1:]
+                        for row in rows]
+            if spec.items is None or consecutive_insert_ids(conn):
+                cur.execute(_insert_sql(spec, len(rows)), [v for row in rows for v in row])
+                # MySQL reports the first id of a multi-row INSERT, and the rest follow it
+                first_id = cur.lastrowid
+                ids = [first_id + i for i in range(len(rows))]
+            else:
+                # The server spaces out auto-increment ids: insert one row at a time to learn each
+                ids = []
+                for row in rows:
+                    cur.execute(_insert_sql(spec, 1), row)
+                    ids.append(cur.lastrowid)
+            if spec.items is not None:
+                insert_items(cur, spec.items, [item for record_id, row in zip(ids, rows)
+                                               for item in item_rows(record_id, row[TEXT_COLUMN])])
+        cur.execute(f"""
+            UPDATE {PROGRESS_TABLE} SET byte_offset = %s, rows_done = %s, finished = %s,
+                updated_at = CURRENT_TIMESTAMP WHERE source_key = %s
+        """, (offset, rows_done, 1 if finished else 0, key))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+
+def import_file(conn, spec, path, fmt=None, batch_rows=DEFAULT_BATCH_ROWS, restart=False, progress=None):
+    """
+    Stream path into spec.table. Returns {"rows": rows imported now, "total": rows
+    imported by this file so far, "resumed": True when it continued an earlier run}.
+    """
+    fmt = detect_format(path, fmt)
+    key = _fingerprint(spec, path)
+    _ensure_progress_table(conn)
+
+    _mark_import_session(conn, True)
+    try:
+        with open(path, "rb") as f:
+            if fmt == "csv":
+                positions, data_start = _csv_header(f, spec.columns)
+                if spec.columns[0] not in positions:
+                    raise BulkIOError(f"The CSV header has no {spec.columns[0]} column.")
+            else:
+                data_start = 0
+            offset, rows_done = _start_progress(conn, key, spec, path, data_start, restart)
+            resumed = rows_done > 0 or offset > data_start
+            if progress and resumed:
+                progress.stream.write(f"Resuming after row {rows_done:,}\n")
+
+            if fmt == "csv":
+                records = _csv_records(f, offset, positions, spec.columns)
+            else:
+                records = _jsonl_records(f, offset, spec.columns)
+
+            imported = 0
+            batch, end = [], offset
+            for row, end in records:
+                if row[0] is None:
+                    raise BulkIOError(f"Row {rows_done + len(batch) + 1:,} has no {spec.columns[0]}.")
+                batch.append(row)
+                if len(batch) >= batch_rows:
+                    _commit_batch(conn, spec, key, batch, end, rows_done)
+                    rows_done += len(batch)
+                    imported += len(batch)
+                    batch = []
+                    if progress:
+                        progress.update(rows_done, end)
+            _commit_batch(conn, spec, key, batch, end, rows_done, finished=True)
+            rows_done += len(batch)
+            imported += len(batch)
+    finally:
+        try:
+            _mark_import_session(conn, False)
+        except Exception:
+            pass  # only a broken connection refuses a SET, and it takes the variable with it
+    if progress:
+        progress.finish(rows_done, progress.total)
+    return {"rows": imported, "total": rows_done, "resumed": resumed}
+
+
+def _commit_batch(conn, spec, key, batch, offset, rows_before, finished=False):
+    try:
+        _write_batch(conn, spec, key, batch, offset, rows_before + len(batch), finished)
+    except Exception as e:
+        raise BulkIOError(f"The database rejected rows {rows_before + 1:,}-{rows_before + len(batch):,}: {e}. "
+                          f"Fix the file and run the same command again to resume.") from e
+
+
+# -------------------- EXPORT --------------------
+def _text(value):
+    return "" if value is None else str(value)
+
+
+def export_table(conn, spec, path, fmt=None, batch_rows=DEFAULT_BATCH_ROWS, progress=None):
+    """Stream spec.table (oldest first) into path. Returns the number of rows written."""
+    fmt = detect_format(path, fmt)
+    columns = [spec.id_column] + spec.columns
+    partial = path + ".part"
+    written = 0
+
+    cur = conn.cursor()
+    try:
+        if progress:
+            cur.execute(f"SELECT COUNT(*) FROM {spec.table}")
+            progress.total = cur.fetchone()[0]
+    finally:
+        cur.close()
+
+    # Unbuffered: the server streams the result as fetchmany() asks for it
+    cur = conn.cursor(buffered=False)
+    try:
+        cur.execute(f"SELECT {', '.join(columns)} FROM {spec.table} ORDER BY {spec.id_column}")
+        with open(partial, "w", encoding="utf-8", newline="") as out:
+            writer = csv.writer(out) if fmt == "csv" else None
+            if writer:
+                writer.writerow(columns)
+            while True:
+                rows = cur.fetchmany(batch_rows)
+                if not rows:
+                    break
+                for row in rows:
+                    if writer:
+                        writer.writerow([_text(v) for v in row])
+                    else:
+                        record = {c: (v if v is None or isinstance(v, (int, float)) else str(v))
+                                  for c, v in zip(columns, row)}
+                        out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                written += len(rows)
+                if progress:
+                    progress.update(written, written)
+        os.replace(partial, path)
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+    finally:
+        cur.close()
+    if progress:
+        progress.finish(written, written)
+    return written
+
+
+# -------------------- COMMAND LINE --------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("action", choices=["import", "export"])
+    parser.add_argument("path", help="CSV or JSON-lines file (format taken from the extension)")
+    parser.add_argument("--portal", choices=sorted(TABLES), default="doctor_portal",
+                        help="which portal's database and table to use")
+    parser.add_argument("--format", choices=FORMATS)
+    parser.add_argument("--batch", type=int, default=DEFAULT_BATCH_ROWS, help="rows per INSERT / fetch")
+    parser.add_argument("--restart", action="store_true", help="import: ignore an earlier partial run")
+    parser.add_argument("--keep-signatures", action="store_true",
+                        help="import: keep a trailing doctor signature in the prescription text")
+    args = parser.parse_args(argv)
+
+    portal = importlib.import_module(args.portal)
+    spec = TABLES[args.portal]._replace(items=ITEM_TABLES[args.portal],
+                                        strip_signatures=not args.keep_signatures)
+    portal.initialize_db()   # the import target must exist and be migrated
+    conn = portal.get_connection()
+    if not conn:
+        return 1
+    try:
+        if args.action == "import":
+            progress = Progress("Imported", total=os.path.getsize(args.path))
+            result = import_file(conn, spec, args.path, args.format, args.batch, args.restart, progress)
+            print(f"Imported {result['rows']:,} rows into {spec.table}"
+                  + (f" ({result['total']:,} in total for this file)" if result["resumed"] else ""))
+        else:
+            rows = export_table(conn, spec, args.path, args.format, args.batch, Progress("Exported"))
+            print(f"Exported {rows:,} rows from {spec.table} to {args.path}")
+    except BulkIOError as e:
+        print(f"\nError: {e}", file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        print("\nInterrupted; run the same command again to resume.", file=sys.stderr)
+        return 130
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
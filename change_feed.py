@@ -0,0 +1,178 @@
+"""
+Change feed: tells open portals about prescriptions saved elsewhere.
+
+A prescription added by a pharmacist or another doctor used to stay invisible
+until someone clicked Load Patient and re-ran the whole history query. Now
+database triggers append one row per INSERT / UPDATE of a prescription,
+(patient uid, prescription id, op), to a small change table. A ChangeTableFeed
+thread tails it with an indexed "change_id > last seen" range query and
+publishes each change on a Broker; portals subscribe and patch just the
+affected card.
+
+Triggers catch every writer, including ones that know nothing about the feed
+(the pharmacy side, bulk_io, a manual UPDATE). Reading the binlog instead would
+need replication privileges and another driver for the same information.
+Portals create the triggers while their CHANGE_FEED setting is on and drop
+them at the next start once it is off, and prune old change rows at every
+start, feed or not (prune_changes).
+
+Broker is a plain in-process pub/sub hub, so it doubles as the stand-in for
+tests and demos: publish ChangeEvents to it directly and no database is needed.
+"""
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+DEFAULT_INTERVAL = 1.0        # seconds between tail queries
+DEFAULT_RETENTION = 86400     # seconds a change row is kept before pruning
+PRUNE_INTERVAL = 3600         # seconds between prune passes
+BATCH = 500                   # change rows read per tail query
+GAP_TIMEOUT = 5.0             # seconds to wait for a change id still in an uncommitted transaction
+
+ChangeEvent = namedtuple("ChangeEvent", ["change_id", "patient_uid", "prescription_id", "op"])
+
+
+class Broker:
+    """In-process publish / subscribe of ChangeEvents. Callbacks run on the publishing thread."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = []
+        self.published = 0
+
+    def subscribe(self, callback):
+        with self._lock:
+            self._subscribers.append(callback)
+        return callback
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+    def publish(self, event):
+        with self._lock:
+            subscribers = list(self._subscribers)
+            self.published += 1
+        for callback in subscribers:
+            try:
+                callback(event)
+            except Exception as e:
+                print(f"Change feed subscriber failed: {e}")
+
+
+def prune_changes(table, changed_column, retention=DEFAULT_RETENTION):
+    """Step: delete change rows older than retention seconds."""
+    def step(cur):
+        cutoff = datetime.now() - timedelta(seconds=retention)
+        cur.execute(f"DELETE FROM {table} WHERE {changed_column} < %s", (cutoff,))
+    step.__doc__ = f"prune {table} rows older than {retention}s"
+    return step
+
+
+class ChangeTableFeed(threading.Thread):
+    """
+    Background thread publishing the rows triggers append to a change table.
+
+    columns -- the table's (change id, patient uid, prescription id, op) columns, in that order
+    changed_column -- its timestamp column, used to prune rows older than retention
+
+    The feed starts at the newest change present, so only changes made after a
+    portal opened are published. A change id can become visible after a higher
+    one (its transaction committed later), so the read position only moves past
+    a missing id once it shows up or GAP_TIMEOUT has passed (a rolled-back id
+    never does). Events are published at most once either way.
+    """
+
+    def __init__(self, get_connection, broker, table, columns, changed_column,
+                 interval=DEFAULT_INTERVAL, retention=DEFAULT_RETENTION):
+        super().__init__(name="change-feed", daemon=True)
+        self.get_connection = get_connection
+        self.broker = broker
+        self.table = table
+        self.columns = list(columns)
+        self.changed_column = changed_column
+        self.interval = interval
+        self.retention = retention
+        self.last_id = None       # every change id up to here is published or given up on
+        self._seen = set()        # published ids above last_id (waiting behind a gap)
+        self._gap_since = None
+        self._pruned_at = time.monotonic()
+        self._wake = threading.Event()
+        self._stopped = False
+
+    def poke(self):
+        """Tail the change table now rather than at the next interval."""
+        self._wake.set()
+
+    def stop(self):
+        self._stopped = True
+        self._wake.set()
+
+    def run(self):
+        while not self._stopped:
+            try:
+                if self.poll_once() >= BATCH:
+                    continue  # a burst (e.g. a bulk import): keep reading without waiting
+            except Exception as e:
+                print(f"Change feed poll failed: {e}")
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def poll_once(self):
+        """Publish the changes committed since the last poll. Returns how many were published."""
+        conn = self.get_connection()
+        if not conn:
+            return 0  # offline; the next poll picks up where this one stopped
+        try:
+            cur = conn.cursor()
+            try:
+                if self.last_id is None:
+                    cur.execute(f"SELECT COALESCE(MAX({self.columns[0]}), 0) FROM {self.table}")
+                    self.last_id = cur.fetchone()[0]
+                    return 0
+                cur.execute(
+                    f"SELECT {', '.join(self.columns)} FROM {self.table} "
+                    f"WHERE {self.columns[0]} > %s ORDER BY {self.columns[0]} LIMIT {BATCH}",
+                    (self.last_id,)
+                )
+                rows = cur.fetchall()
+                if time.monotonic() - self._pruned_at >= PRUNE_INTERVAL:
+                    self._prune(conn, cur)
+            finally:
+                cur.close()
+        finally:
+            conn.close()
+
+        published = 0
+        for row in rows:
+            if row[0] in self._seen:
+                continue
+            self._seen.add(row[0])
+            self.broker.publish(ChangeEvent(*row))
+            published += 1
+        self._advance()
+        return published
+
+    def _advance(self):
+        """Move last_id over the published ids, waiting a while at each gap."""
+        while self._seen:
+            following = self.last_id + 1
+            if following in self._seen:
+                self._seen.discard(following)
+                self.last_id = following
+                self._gap_since = None
+                continue
+            now = time.monotonic()
+            if self._gap_since is None:
+                self._gap_since = now
+            if now - self._gap_since < GAP_TIMEOUT:
+                return
+            self.last_id = min(self._seen) - 1   # the missing ids were rolled back
+            self._gap_since = None
+
+    def _prune(self, conn, cur):
+        self._pruned_at = time.monotonic()
+        prune_changes(self.table, self.changed_column, self.retention)(cur)
+        conn.commit()
@@ -0,0 +1,41 @@
+"""
+Optimistic concurrency for prescription edits.
+
+Every prescription row carries a version number that each UPDATE bumps. An edit
+remembers the version it was loaded at and saves with one compare-and-set:
+
+    UPDATE prescriptions SET ..., version = version + 1
+    WHERE prescription_id = %s AND version = %s
+
+Nothing is locked while a doctor types, and the common case costs no extra
+round trip: one affected row means nobody saved in between. No affected row
+means someone did (or the row is gone), and the save raises EditConflictError
+instead of silently overwriting their change. Because the version always
+changes, MySQL's affected-row count is reliable even when the text does not.
+"""
+
+INITIAL_VERSION = 1  # the version column's default: a row that has never been edited
+
+
+class EditConflictError(RuntimeError):
+    """
+    An edit was based on an outdated version of a prescription. current is the
+    row as it is now (None when it has been deleted), read after the conflict.
+    """
+
+    def __init__(self, record_id, current=None):
+        self.record_id = record_id
+        self.current = current
+        what = "was deleted" if current is None else "was changed by someone else"
+        super().__init__(f"Prescription {record_id} {what} since it was loaded.")
+
+
+def require_applied(conn, cur, record_id, read_current):
+    """
+    Check the compare-and-set UPDATE just run on cur. When it matched no row, roll
+    back and raise EditConflictError with read_current() -> the row now, or None.
+    """
+    if cur.rowcount != 0:
+        return
+    conn.rollback()
+    raise EditConflictError(record_id, read_current())
@@ -0,0 +1,305 @@
+"""
+Process-wide database connection pool shared by the Doctor Portal variants.
+
+Connections are opened once and handed out again on every Load / Save
+instead of paying the TCP + auth + database-select handshake per click.
+Each connection also keeps its prepared statements (see statement_cache.py).
+"""
+import threading
+import time
+import weakref
+
+from statement_cache import PreparedCursor, StatementCache
+from tracing import TRACER, TracedCursor
+
+
+# -------------------- POOL DEFAULTS --------------------
+DEFAULT_POOL_SIZE = 5
+DEFAULT_IDLE_TIMEOUT = 300      # seconds an unused connection may sit in the pool
+DEFAULT_PING_INTERVAL = 30      # skip the liveness ping for connections used more recently than this
+DEFAULT_ACQUIRE_TIMEOUT = 10    # seconds to wait for a free connection when the pool is exhausted
+
+
+class PoolExhaustedError(RuntimeError):
+    """Raised when no pooled connection becomes free within the acquire timeout."""
+
+
+class PooledConnection:
+    """Proxy around a pooled connection. close() hands it back to the pool instead of closing it."""
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def cursor(self, *args, **kwargs):
+        """Driver cursor; wrapped in a TracedCursor while tracing is on (see tracing.py)."""
+        cur = self._conn.cursor(*args, **kwargs)
+        return TracedCursor(cur) if TRACER.enabled else cur
+
+    def prepared_cursor(self, dictionary=False):
+        """Cursor running server-side prepared statements cached on this connection."""
+        return PreparedCursor(self._pool.statements(self._conn), dictionary)
+
+    @property
+    def raw(self):
+        """The underlying driver connection."""
+        return self._conn
+
+    def close(self):
+        """Return the connection to the pool (safe to call more than once)."""
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool.release(conn)
+
+    def discard(self):
+        """Drop a broken connection instead of returning it to the pool."""
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool.discard(conn)
+
+
+class ConnectionPool:
+    """
+    Bounded pool of reusable connections.
+
+    connect      -- zero-argument factory that opens a new driver connection
+    pool_size    -- maximum number of connections open at once (idle + borrowed)
+    idle_timeout -- idle connections older than this are closed by the reaper
+    ping_interval -- connections idle longer than this are pinged (and reconnected) before hand-out
+    """
+
+    def __init__(self, connect, pool_size=DEFAULT_POOL_SIZE, idle_timeout=DEFAULT_IDLE_TIMEOUT,
+                 ping_interval=DEFAULT_PING_INTERVAL, acquire_timeout=DEFAULT_ACQUIRE_TIMEOUT):
+        if pool_size < 1:
+            raise ValueError("pool_size must be at least 1")
+        self._connect = connect
+        self.pool_size = pool_size
+        self.idle_timeout = idle_timeout
+        self.ping_interval = ping_interval
+        self.acquire_timeout = acquire_timeout
+
+        self._idle = []          # stack of (conn, last_used) — most recently used on top
+        self._statements = {}    # id(conn) -> StatementCache
+        self._in_use = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._reaper = None
+        if idle_timeout:
+            self._start_reaper()
+
+    # -------------------- BORROW / RETURN --------------------
+    def acquire(self, timeout=None):
+        """Borrow a live connection, opening a new one if the pool has room."""
+        timeout = self.acquire_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise PoolExhaustedError("Connection pool is closed.")
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    self._in_use += 1
+                    break
+                if self._total() < self.pool_size:
+                    conn, last_used = None, None
+                    self._in_use += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolExhaustedError(
+                        f"No free database connection after {timeout}s (pool_size={self.pool_size})."
+                    )
+                self._cond.wait(remaining)
+
+        # Network work happens outside the lock so other threads are not blocked on it.
+        try:
+            if conn is not None and not self._check_alive(conn, last_used):
+                self._close_quietly(conn)
+                conn = None
+            if conn is None:
+                conn = self._open()
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        return PooledConnection(self, conn)
+
+    def release(self, conn):
+        """Put a borrowed connection back on the idle stack."""
+        try:
+            if getattr(conn, "in_transaction", False):
+                conn.rollback()
+        except Exception:
+            self.discard(conn)
+            return
+        with self._cond:
+            self._in_use -= 1
+            if self._closed:
+                self._close_quietly(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def discard(self, conn):
+        """Close a borrowed connection and free its slot."""
+        self._close_quietly(conn)
+        with self._cond:
+            self._in_use -= 1
+            self._cond.notify()
+
+    # -------------------- MAINTENANCE --------------------
+    def evict_idle(self):
+        """Close idle connections that have not been used within idle_timeout."""
+        cutoff = time.monotonic() - self.idle_timeout
+        with self._cond:
+            stale = [c for c, used in self._idle if used < cutoff]
+            self._idle = [(c, used) for c, used in self._idle if used >= cutoff]
+        for conn in stale:
+            self._close_quietly(conn)
+        return len(stale)
+
+    def close_all(self):
+        """Close every idle connection and refuse further borrows."""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all()
+        for conn, _ in idle:
+            self._close_quietly(conn)
+
+    def statements(self, conn):
+        """The StatementCache of a borrowed connection, created on first use."""
+        cache = self._statements.get(id(conn))
+        if cache is None or cache.conn is not conn:
+            cache = self._statements[id(conn)] = StatementCache(conn)
+        return cache
+
+    def stats(self):
+        """Snapshot of pool occupancy."""
+        with self._cond:
+            return {"pool_size": self.pool_size, "idle": len(self._idle), "in_use": self._in_use}
+
+    # -------------------- INTERNALS --------------------
+    def _total(self):
+        return len(self._idle) + self._in_use
+
+    def _open(self):
+        """Open a new connection, retrying once on a transient failure."""
+        try:
+            return self._connect()
+        except Exception:
+            time.sleep(0.2)
+            return self._connect()
+
+    def _check_alive(self, conn, last_used):
+        """Ping connections that have been idle a while; reconnect in place when the driver supports it."""
+        if last_used is not None and time.monotonic() - last_used < self.ping_interval:
+            return True
+        try:
+            ping = getattr(conn, "ping", None)
+            if ping is not None:
+                try:
+                    ping(reconnect=True, attempts=1, delay=0)
+                except TypeError:
+                    ping()
+                return True
+            is_connected = getattr(conn, "is_connected", None)
+            return is_connected() if is_connected is not None else True
+        except Exception:
+            return False
+
+    def _start_reaper(self):
+        interval = max(1, min(self.idle_timeout, 60))
+
+        def reap():
+            while True:
+                time.sleep(interval)
+                if self._closed:
+                    return
+                self.evict_idle()
+
+        self._reaper = threading.Thread(target=reap, name="db-pool-reaper", daemon=True)
+        self._reaper.start()
+
+    def _close_quietly(self, conn):
+        self._statements.pop(id(conn), None)  # its prepared statements die with the session
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+# -------------------- PROCESS-WIDE REGISTRY --------------------
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _mysql_connect(config):
+    import mysql.connector
+    return mysql.connector.connect(**config)
+
+
+def get_pool(config, connect=None, **pool_options):
+    """
+    Return the shared pool for a DB_CONFIG dict, creating it on first use.
+
+    connect defaults to mysql.connector.connect(**config); pass another factory
+    (e.g. a SQLite stand-in) to pool something else.
+    """
+    key = tuple(sorted(config.items()))
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            factory = connect or (lambda: _mysql_connect(config))
+            pool = ConnectionPool(factory, **pool_options)
+            _pools[key] = pool
+        return pool
+
+
+def close_all_pools():
+    """Close every pool created through get_pool()."""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close_all()
+
+
+# -------------------- MULTI-ROW INSERT IDS --------------------
+_id_steps = weakref.WeakKeyDictionary()   # driver connection -> @@auto_increment_increment
+
+
+def consecutive_insert_ids(conn):
+    """
+    True when a multi-row INSERT ... VALUES numbers its rows lastrowid, lastrowid + 1, ...
+
+    InnoDB does so for such "simple inserts" in every innodb_autoinc_lock_mode, but
+    only while auto_increment_increment is 1 (replication setups often raise it).
+    Checked once per underlying connection.
+    """
+    raw = conn.raw if isinstance(conn, PooledConnection) else conn
+    try:
+        return _id_steps[raw] == 1
+    except (KeyError, TypeError):
+        pass
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT @@auto_increment_increment")
+        step = int(cur.fetchone()[0])
+    finally:
+        cur.close()
+    try:
+        _id_steps[raw] = step
+    except TypeError:
+        pass  # not weak-referenceable: ask again next time
+    return step == 1
@@ -1,13 +1,26 @@
 import sys
-import mysql.connector
-from mysql.connector import Error
+import time
+_STARTUP_T0 = time.perf_counter()  # the start-up report times module imports from here
+
 from PyQt5.QtWidgets import (
     QApplication, QWidget, QLabel, QLineEdit, QTextEdit, QPushButton,
-    QVBoxLayout, QHBoxLayout, QFrame, QScrollArea, QMessageBox
+    QVBoxLayout, QHBoxLayout, QFrame, QMessageBox, QCheckBox
 )
-from PyQt5.QtCore import Qt
-from PyQt5.QtGui import QFont, QColor, QCursor
-from PyQt5.QtWidgets import QGraphicsDropShadowEffect
+from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtGui import QFont, QCursor
+
+from db_pool import get_pool, PoolExhaustedError
+from query_executor import QueryExecutor
+from startup import StartupProfiler
+from tracing import TRACER, configure_tracing
+from shadows import apply_shadow
+from history_view import HistoryView, PREVIEW_CHARS
+from history_cache import HistoryCache
+from fulltext import boolean_query, MIN_TERM_CHARS, SEARCH_LIMIT
+from uid_index import UidIndex, UidCompleter, select_uid_delta
+from theme import apply_theme, notification_tone, set_property, set_role
+from migrations import Migration, add_column, create_index, run_migrations
+from concurrency import INITIAL_VERSION, EditConflictError, require_applied
 
 #  DATABASE CONFIGURATION
 DB_CONFIG = {
@@ -18,15 +31,59 @@ DB_CONFIG = {
     "port": 3306
 }
 
+# History card columns (no date column in this schema; see history_view.py)
+HISTORY_FIELDS = {
+    "id": "Pr_ID",
+    "date": None,
+    "notes": "Condition_Notes",
+    "prescription": "Prescription",
+}
+
+# Search results also show whose record each card is
+SEARCH_FIELDS = dict(HISTORY_FIELDS, patient="Patient_UID")
+
+# History is paged newest-first; older pages load as the list scrolls down
+HISTORY_PAGE_SIZE = 30
+
+# Per-patient history cache (see history_cache.py)
+HISTORY_CACHE_SIZE = 64      # patients
+HISTORY_CACHE_TTL = 300      # seconds
+HISTORY_CACHE = HistoryCache("Pr_ID", max_entries=HISTORY_CACHE_SIZE, ttl=HISTORY_CACHE_TTL)
+
+# Find Patient typeahead over patient_portal (see uid_index.py): loaded once, then refreshed with deltas
+UID_INDEX = UidIndex()
+UID_INDEX_REFRESH = 60  # seconds between delta queries
+
+# Fast startup: show the window first; shadows and schema migrations run after
+# the first paint (see startup.py). The start-up time report is always printed.
+FAST_STARTUP = False
+STARTUP_REPORT_PATH = None  # e.g. "startup_times.jsonl" to track one JSON line per start
+
+# Look of the window: "light" or "dark" (see theme.py); theme.apply_theme() switches it at runtime
+THEME = "light"
+
+# Timing spans and slow-query log (see tracing.py)
+TRACING = False
+TRACE_FILE = None      # e.g. "portal_trace.jsonl": one JSON line per finished span
+METRICS_PORT = None    # e.g. 9464: Prometheus text on http://127.0.0.1:9464/metrics
+SLOW_QUERY_MS = 200
+
+# Shared connection pool (see db_pool.py)
+POOL_SIZE = 5
+POOL_IDLE_TIMEOUT = 300  # seconds
+
 def get_connection(parent_widget=None):
-    """Create and return a MySQL database connection. Shows a QMessageBox on failure."""
+    """Borrow a pooled MySQL connection (close() returns it). Shows a QMessageBox on failure."""
+    # Imported here rather than at module level so the driver loads on the first
+    # DB action (off the GUI thread in fast-startup mode), not during start-up
+    from mysql.connector import Error
+
     try:
-        conn = mysql.connector.connect(**DB_CONFIG)
-        if conn.is_connected():
-            return conn
-        else:
-            raise Error("Unable to establish DB connection.")
-    except Error as e:
+        # The pool pings and reconnects stale connections before handing them out.
+        with TRACER.span("db.get_connection"):
+            pool = get_pool(DB_CONFIG, pool_size=POOL_SIZE, idle_timeout=POOL_IDLE_TIMEOUT)
+            return pool.acquire()
+    except (Error, PoolExhaustedError) as e:
         msg = f"Database connection error:\n{e}"
         if parent_widget is not None:
             QMessageBox.critical(parent_widget, "Database Error", msg)
@@ -34,66 +91,264 @@ def get_connection(parent_widget=None):
             print(msg)
         return None
 
-def apply_shadow(widget, blur_radius=20, x_offset=0, y_offset=4, color=QColor(0, 0, 0, 60)):
-    """Apply drop shadow effect to a widget."""
-    shadow = QGraphicsDropShadowEffect()
-    shadow.setBlurRadius(blur_radius)
-    shadow.setOffset(x_offset, y_offset)
-    shadow.setColor(color)
-    widget.setGraphicsEffect(shadow)
+# SCHEMA MIGRATIONS
+# The prescription/patient_portal tables are owned by the patient side; the doctor
+# portal only adds the indexes its lookups need, and the Version column its edits
+# check against (a defaulted column, so the patient side's INSERTs are unaffected).
+# Applied once at startup.
+MIGRATIONS = [
+    Migration(1, "index patient_portal by Patient_UID", [
+        create_index("patient_portal", "idx_patient_portal_uid", ["Patient_UID"]),
+    ]),
+    Migration(2, "index prescription by patient, newest first", [
+        create_index("prescription", "idx_prescription_patient_pr",
+                     ["Patient_ID", "Pr_ID"], order={"Pr_ID": "DESC"}),
+    ]),
+    # ranked search over notes and prescriptions (see fulltext.py); kept current on every commit
+    Migration(3, "full-text index on prescription notes and prescription", [
+        create_index("prescription", "ft_prescription_text", ["Condition_Notes", "Prescription"], fulltext=True),
+    ]),
+    # optimistic concurrency: every UPDATE is a compare-and-set on Version (see concurrency.py)
+    Migration(4, "add prescription.Version", [
+        add_column("prescription", "Version", f"INT NOT NULL DEFAULT {INITIAL_VERSION}"),
+    ]),
+]
+
+def initialize_db():
+    """Apply pending schema migrations before the UI starts."""
+    conn = get_connection()
+    if not conn:
+        return
+    try:
+        applied = run_migrations(conn, MIGRATIONS, namespace="doctor_p2")
+        if applied:
+            print(f"Applied schema migrations: {applied}")
+    except Exception as e:
+        print(f"Error migrating database schema: {e}")
+    finally:
+        conn.close()
+
+# BACKGROUND DATABASE WORK
+# These run on QueryExecutor worker threads: raise on failure, never touch widgets.
+def _select_history_page(conn, uid, before, limit):
+    """
+    One keyset page of history previews for a Patient_UID, newest Pr_ID first.
+    (This schema has no created-at column, so Pr_ID alone is the keyset.)
+    Returns (records, has_more).
+    """
+    sql = """
+        SELECT prescription.Pr_ID, patient_portal.Patient_UID,
+               LEFT(prescription.Condition_Notes, %s) AS Condition_Notes,
+               LEFT(prescription.Prescription, %s) AS Prescription
+        FROM prescription
+        JOIN patient_portal ON prescription.Patient_ID = patient_portal.Patient_ID
+        WHERE patient_portal.Patient_UID = %s
+    """
+    params = [PREVIEW_CHARS, PREVIEW_CHARS, uid]
+    if before:
+        sql += " AND prescription.Pr_ID < %s"
+        params.append(before["Pr_ID"])
+    sql += " ORDER BY prescription.Pr_ID DESC LIMIT %s"
+    params.append(limit + 1)  # one extra row tells us whether an older page exists
+
+    cur = conn.prepared_cursor(dictionary=True)
+    try:
+        cur.execute(sql, params)
+        records = cur.fetchall()
+    finally:
+        cur.close()
+    return records[:limit], len(records) > limit
+
+def _select_prescription(conn, record_id):
+    cur = conn.prepared_cursor(dictionary=True)
+    try:
+        cur.execute("""
+            SELECT prescription.*, patient_portal.Patient_UID
+            FROM prescription
+            JOIN patient_portal ON prescription.Patient_ID = patient_portal.Patient_ID
+            WHERE prescription.Pr_ID = %s
+        """, (record_id,))
+        return cur.fetchone()
+    finally:
+        cur.close()
+
+def fetch_patient_history(uid):
+    """First history page plus the full latest record. Returns (records, has_more, latest)."""
+    conn = get_connection()
+    if not conn:
+        raise ConnectionError("Unable to establish DB connection.")
+    try:
+        records, has_more = _select_history_page(conn, uid, None, HISTORY_PAGE_SIZE)
+        latest = _select_prescription(conn, records[0]["Pr_ID"]) if records else None
+        HISTORY_CACHE.put(uid, records, has_more, latest)
+        return records, has_more, latest
+    finally:
+        conn.close()
+
+def fetch_history_page(uid, before):
+    """Older history page after the record `before`. Returns (records, has_more)."""
+    conn = get_connection()
+    if not conn:
+        raise ConnectionError("Unable to establish DB connection.")
+    try:
+        records, has_more = _select_history_page(conn, uid, before, HISTORY_PAGE_SIZE)
+        HISTORY_CACHE.extend(uid, before, records, has_more)
+        return records, has_more
+    finally:
+        conn.close()
+
+def fetch_prescription(record_id):
+    """Full record (untruncated notes and prescription) for editing."""
+    conn = get_connection()
+    if not conn:
+        raise ConnectionError("Unable to establish DB connection.")
+    try:
+        return _select_prescription(conn, record_id)
+    finally:
+        conn.close()
+
+def fetch_uid_delta(after_id):
+    """UIDs registered after row after_id (all of them for 0). Returns (uids, watermark)."""
+    conn = get_connection()
+    if not conn:
+        raise ConnectionError("Unable to establish DB connection.")
+    try:
+        return select_uid_delta(conn, "patient_portal", "Patient_ID", "Patient_UID", after_id)
+    finally:
+        conn.close()
+
+def search_prescriptions(text, uid=None, limit=SEARCH_LIMIT):
+    """
+    Ranked full-text search of notes and prescriptions for one Patient_UID, or for
+    every patient when uid is None. Best match first, newest Pr_ID first among equals.
+    """
+    query = boolean_query(text)
+    if not query:
+        return []
+    conn = get_connection()
+    if not conn:
+        raise ConnectionError("Unable to establish DB connection.")
+    sql = """
+        SELECT prescription.Pr_ID, patient_portal.Patient_UID,
+               LEFT(prescription.Condition_Notes, %s) AS Condition_Notes,
+               LEFT(prescription.Prescription, %s) AS Prescription,
+               MATCH (prescription.Condition_Notes, prescription.Prescription)
+                   AGAINST (%s IN BOOLEAN MODE) AS Score
+        FROM prescription
+        JOIN patient_portal ON prescription.Patient_ID = patient_portal.Patient_ID
+        WHERE MATCH (prescription.Condition_Notes, prescription.Prescription)
+              AGAINST (%s IN BOOLEAN MODE)
+    """
+    params = [PREVIEW_CHARS, PREVIEW_CHARS, query, query]
+    if uid:
+        sql += " AND patient_portal.Patient_UID = %s"
+        params.append(uid)
+    sql += " ORDER BY Score DESC, prescription.Pr_ID DESC LIMIT %s"
+    params.append(limit)
+    cur = None
+    try:
+        cur = conn.prepared_cursor(dictionary=True)
+        cur.execute(sql, params)
+        return cur.fetchall()
+    finally:
+        if cur:
+            cur.close()
+        conn.close()
+
+def save_prescription_record(uid, notes, presc, edit_id=None, version=None):
+    """
+    UPDATE prescription edit_id, or INSERT a new one for the patient with this UID.
+    Returns the saved record for the history list (the row read back after an INSERT,
+    the changed columns after an UPDATE), or None when no patient has that UID.
+    An UPDATE only applies if the row is still at version; otherwise EditConflictError.
+    """
+    conn = get_connection()
+    if not conn:
+        raise ConnectionError("Unable to establish DB connection.")
+    cur = None
+    try:
+        cur = conn.prepared_cursor()
+
+        # If editing existing prescription -> UPDATE
+        if edit_id:
+            cur.execute("""
+                UPDATE prescription
+                SET Condition_Notes = %s, Prescription = %s, Version = Version + 1
+                WHERE Pr_ID = %s AND Version = %s
+            """, (notes, presc, edit_id, version))
+            require_applied(conn, cur, edit_id, lambda: _select_prescription(conn, edit_id))
+            conn.commit()
+            # Write-through: patch the cached history instead of re-fetching it
+            record = {"Pr_ID": edit_id, "Condition_Notes": notes, "Prescription": presc, "Version": version + 1}
+            HISTORY_CACHE.record_updated(record)
+            return record
+
+        # INSERT path: first verify patient exists and get numeric Patient_ID
+        cur.execute("SELECT Patient_ID FROM patient_portal WHERE Patient_UID = %s", (uid,))
+        patient_row = cur.fetchone()
+        if not patient_row:
+            return None
+        patient_id = patient_row[0] if isinstance(patient_row, tuple) else patient_row
+
+        # Insert new prescription
+        cur.execute("""
+            INSERT INTO prescription (Patient_ID, Condition_Notes, Prescription)
+            VALUES (%s, %s, %s)
+        """, (patient_id, notes, presc))
+        conn.commit()
+        record_id = cur.lastrowid
+        try:
+            record = _select_prescription(conn, record_id)
+            HISTORY_CACHE.record_inserted(uid, record)
+        except Exception:
+            HISTORY_CACHE.invalidate(uid)  # the row is committed; the next load just re-fetches
+            record = {"Pr_ID": record_id, "Patient_UID": uid, "Condition_Notes": notes, "Prescription": presc}
+        return record
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        if cur:
+            cur.close()
+        conn.close()
 
 def style_button(btn, primary=False):
-    """Apply consistent interactive styles to a button. primary=True gives stronger color."""
-    # Use Qt-supported stylesheet properties (:hover, :pressed)
-    if primary:
-        # Strong primary button (e.g., Load, Save)
-        btn.setStyleSheet("""
-            QPushButton {
-                background-color: #2b78f6;
-                color: white;
-                border: 1px solid #1f5fd6;
-                border-radius: 8px;
-                padding: 8px 12px;
-                font-weight: 600;
-            }
-            QPushButton:hover { background-color: #1a63d9; }
-            QPushButton:pressed { background-color: #144fb8; }
-            QPushButton:focus { outline: none; }
-        """)
-    else:
-        # Secondary / neutral buttons (e.g., Back, Edit, Logout)
-        btn.setStyleSheet("""
-            QPushButton {
-                background-color: #f5f6f7;
-                color: #222;
-                border: 1px solid #ccc;
-                border-radius: 8px;
-                padding: 6px 10px;
-                font-weight: 600;
-            }
-            QPushButton:hover { background-color: #ececec; }
-            QPushButton:pressed { background-color: #e0e0e0; }
-            QPushButton:focus { outline: none; }
-        """)
+    """Give a button the theme's primary (stronger color) or secondary look. See theme.py."""
+    # The rules (incl. :hover / :pressed) live in the application stylesheet
+    set_role(btn, "primary" if primary else "secondary")
     # pointer cursor for clarity
     btn.setCursor(QCursor(Qt.PointingHandCursor))
 
 class DoctorPortalUI(QWidget):
-    def __init__(self):
+    def __init__(self, startup=None):
         super().__init__()
         self.setWindowTitle("Imhotep — Doctor's Portal")
         self.setMinimumSize(980, 700)
-        self.setStyleSheet("background-color:#eef1f4;")
+        self.setObjectName("portal")
+        apply_theme(THEME)  # one application stylesheet; widgets below only set names/roles
 
         # State Variables 
         self.current_patient_uid = None
+        self.showing_search_results = False
         self.registered_doctor_name = None
         self.last_condition = ""
         self.last_prescription = ""
         self.current_edit_prescription_id = None
+        self.current_edit_version = None  # Version the edit was loaded at (optimistic concurrency)
+
+        self.startup = startup  # StartupProfiler, when launched through main()
+
+        # Background DB work — one worker per pooled connection
+        self.query_executor = QueryExecutor(self, max_threads=POOL_SIZE)
 
         self.init_ui()
 
+        # Keep the UID typeahead fresh with small delta queries
+        self.uid_index_timer = QTimer(self)
+        self.uid_index_timer.timeout.connect(self.refresh_uid_index)
+        self.uid_index_timer.start(UID_INDEX_REFRESH * 1000)
+        QTimer.singleShot(0, self.refresh_uid_index)
+
     def init_ui(self):
         main_layout = QVBoxLayout()
         main_layout.setContentsMargins(28, 20, 28, 18)
@@ -130,13 +385,13 @@ class DoctorPortalUI(QWidget):
         # Subtitle under title (centered)
         subtitle = QLabel("Doctor's Portal")
         subtitle.setAlignment(Qt.AlignCenter)
-        subtitle.setStyleSheet("color: #666; font-size: 14px;")
+        subtitle.setObjectName("subtitle")
         main_layout.addWidget(subtitle)
 
         # Main container (unchanged visually)
         container = QFrame()
-        container.setStyleSheet("background-color:white; border-radius:12px;")
-        apply_shadow(container, blur_radius=30, y_offset=6)
+        container.setObjectName("container")
+        self._apply_shadow(container, blur_radius=30, y_offset=6)
         container_layout = QVBoxLayout()
         container_layout.setContentsMargins(26, 22, 26, 22)
         container_layout.setSpacing(12)
@@ -147,8 +402,8 @@ class DoctorPortalUI(QWidget):
 
         # LEFT PANEL
         left_card = QFrame()
-        left_card.setStyleSheet("background: #fbfbfb; border-radius: 10px;")
-        apply_shadow(left_card, blur_radius=18, y_offset=4)
+        left_card.setProperty("card", "panel")
+        self._apply_shadow(left_card, blur_radius=18, y_offset=4)
         left_v = QVBoxLayout(left_card)
         left_v.setContentsMargins(18, 16, 18, 16)
         left_v.setSpacing(12)
@@ -156,11 +411,13 @@ class DoctorPortalUI(QWidget):
         self.uid_input = QLineEdit()
         self.uid_input.setPlaceholderText("Enter Patient UID")
         self.uid_input.setFixedHeight(36)
-        self.uid_input.setStyleSheet("border:1px solid #e1e1e1; border-radius:6px; padding-left:8px;")
         left_v.addWidget(self.uid_input)
+        # Typeahead over known UIDs; picking one loads the patient
+        self.uid_completer = UidCompleter(self.uid_input, UID_INDEX)
+        self.uid_completer.uidChosen.connect(lambda uid: self.on_load_patient())
 
         self.notification_label = QLabel("")
-        self.notification_label.setStyleSheet("color: #888; font-size: 11px;")
+        self.notification_label.setObjectName("notification")
         left_v.addWidget(self.notification_label)
 
         self.load_btn = QPushButton("Load Patient")
@@ -169,30 +426,39 @@ class DoctorPortalUI(QWidget):
         self.load_btn.clicked.connect(self.on_load_patient)
         left_v.addWidget(self.load_btn)
 
-        left_v.addWidget(QLabel("Patient History", font=QFont("Helvetica", 12, QFont.Bold)))
-        self.history_scroll = QScrollArea()
-        self.history_scroll.setWidgetResizable(True)
-        self.history_scroll.setStyleSheet("border:1px solid #e9e9e9; border-radius:8px; background:#fff;")
-        self.history_scroll.setFixedHeight(220)
-        self.history_content = QWidget()
-        self.history_layout = QVBoxLayout(self.history_content)
-        self.history_layout.setContentsMargins(10, 10, 10, 10)
-        self.history_layout.setSpacing(10)
-        self.history_scroll.setWidget(self.history_content)
-        left_v.addWidget(self.history_scroll)
+        # full-text search: Enter to search, clear it to return to the history
+        search_row = QHBoxLayout()
+        self.search_input = QLineEdit()
+        self.search_input.setPlaceholderText("Search notes & prescriptions, e.g. amoxicillin")
+        self.search_input.setFixedHeight(32)
+        self.search_input.returnPressed.connect(self.on_search)
+        search_row.addWidget(self.search_input, 1)
+        self.search_all_check = QCheckBox("All patients")
+        search_row.addWidget(self.search_all_check)
+        left_v.addLayout(search_row)
+
+        self.hist_label = QLabel("Patient History", font=QFont("Helvetica", 12, QFont.Bold))
+        left_v.addWidget(self.hist_label)
+        # virtualized history list: cards are painted by a delegate, only for visible rows
+        self.history_view = HistoryView(HISTORY_FIELDS, primary_button=False)
+        self.history_view.setObjectName("historyView")
+        self.history_view.setFixedHeight(220)
+        self.history_view.editRequested.connect(self._on_edit_history_record)
+        self.history_view.history_model.fetch_more_handler = self._load_older_history
+        left_v.addWidget(self.history_view)
         left_v.addStretch(1)
 
         # RIGHT PANEL
         right_card = QFrame()
-        right_card.setStyleSheet("background: #fbfbfb; border-radius: 10px;")
-        apply_shadow(right_card, blur_radius=18, y_offset=4)
+        right_card.setProperty("card", "panel")
+        self._apply_shadow(right_card, blur_radius=18, y_offset=4)
         right_v = QVBoxLayout(right_card)
         right_v.setContentsMargins(18, 16, 18, 16)
         right_v.setSpacing(12)
         right_v.addWidget(QLabel("Current Condition & Prescription", font=QFont("Helvetica", 12, QFont.Bold)))
 
         bordered_frame = QFrame()
-        bordered_frame.setStyleSheet("border: 1px solid #ccc; border-radius: 8px; background: #fff;")
+        bordered_frame.setObjectName("editorFrame")
         bordered_layout = QVBoxLayout(bordered_frame)
         bordered_layout.setContentsMargins(10, 10, 10, 10)
         bordered_layout.setSpacing(8)
@@ -203,7 +469,7 @@ class DoctorPortalUI(QWidget):
         divider = QFrame()
         divider.setFrameShape(QFrame.HLine)
         divider.setFrameShadow(QFrame.Sunken)
-        divider.setStyleSheet("color: #ccc; margin-top:6px; margin-bottom:6px;")
+        divider.setObjectName("divider")
         bordered_layout.addWidget(divider)
         self.prescription_edit = QTextEdit()
         self.prescription_edit.setPlaceholderText("Prescription details...")
@@ -233,107 +499,183 @@ class DoctorPortalUI(QWidget):
         main_layout.addWidget(container)
         self.setLayout(main_layout)
 
+    def _apply_shadow(self, widget, **kwargs):
+        """Shadows are cosmetic: in fast-startup mode they are applied after the first paint."""
+        if FAST_STARTUP and self.startup is not None:
+            self.startup.defer(apply_shadow, widget, **kwargs)
+        else:
+            apply_shadow(widget, **kwargs)
+
+    def initialize_db_in_background(self):
+        """Fast startup: run schema migrations on a worker thread; Load/Save wait until they finish."""
+        self.load_btn.setEnabled(False)
+        self.save_btn.setEnabled(False)
+        self.show_notification("Connecting to the database…", "#888")
+        self.query_executor.submit(
+            initialize_db,
+            on_result=lambda _: self._on_db_initialized(),
+            on_error=lambda error: self._on_db_initialized(error), channel="startup"
+        )
+
+    def _on_db_initialized(self, error=None):
+        if error is not None:
+            print(f"Error initializing database: {error}")
+        self.load_btn.setEnabled(True)
+        self.save_btn.setEnabled(True)
+        self.show_notification("")
+
     # ---------- LOGIC ----------
     def show_notification(self, text, color="#888"):
         self.notification_label.setText(text)
-        self.notification_label.setStyleSheet(f"color: {color}; font-size: 11px;")
-
-    def _create_history_card(self, rec):
-        card = QFrame()
-        card.setStyleSheet("border: 1px solid #ddd; border-radius: 8px; background: #fff;")
-        vbox = QVBoxLayout(card)
-        vbox.setContentsMargins(10, 10, 10, 10)
-        vbox.setSpacing(6)
-
-        pid = rec.get("Pr_ID", "")
-        note = rec.get("Condition_Notes") or ""
-        presc_full = rec.get("Prescription") or ""
-        info = QLabel(f"<b>ID:</b> {pid}<br><b>Notes:</b> {note[:120]}<br><b>Prescription:</b> {presc_full[:120]}")
-        info.setWordWrap(True)
-        vbox.addWidget(info)
-
-        # Edit button: uses secondary style but clear hover/pressed feedback
-        edit_btn = QPushButton("✏ Edit")
-        edit_btn.setFixedWidth(72)
-        style_button(edit_btn, primary=False)
-        edit_btn.clicked.connect(lambda _, r=rec: self._on_edit_history_record(r))
-        vbox.addWidget(edit_btn, alignment=Qt.AlignRight)
-        return card
-
-    def _clear_layout(self, layout):
-        """Safely remove widgets from a layout."""
-        if layout is None:
-            return
-        while layout.count():
-            item = layout.takeAt(0)
-            widget = item.widget()
-            if widget is not None:
-                widget.deleteLater()
-
-    def populate_history(self, records):
-        self._clear_layout(self.history_layout)
-        if not records:
-            no_data = QLabel("No patient data found.")
-            no_data.setStyleSheet("color:#888;")
-            self.history_layout.addWidget(no_data)
-            self.history_layout.addStretch()
-            return
-        for rec in records:
-            self.history_layout.addWidget(self._create_history_card(rec))
-        self.history_layout.addStretch()
+        set_property(self.notification_label, "tone", notification_tone(color))
+
+    def populate_history(self, records, has_more=False):
+        self.hist_label.setText("Patient History")
+        self.showing_search_results = False
+        with TRACER.span("ui.populate_history", rows=len(records or [])):
+            self.history_view.set_records(records, has_more)
+
+    def _load_older_history(self, last_record):
+        """Fetch the next (older) history page once the list scrolls near its end."""
+        self.query_executor.submit(
+            fetch_history_page, self.current_patient_uid, last_record,
+            on_result=lambda page: self.history_view.append_records(*page),
+            on_error=self._on_history_page_failed, channel="history_page"
+        )
+
+    def _on_history_page_failed(self, error):
+        self.history_view.history_model.fetch_failed()
+        print(f"Error loading older history: {error}")
 
     def _on_edit_history_record(self, rec):
+        """History cards only carry previews — fetch the full record before editing."""
+        self.query_executor.submit(
+            fetch_prescription, rec.get("Pr_ID"),
+            on_result=self._begin_edit, on_error=self._on_load_failed, channel="edit"
+        )
+
+    def _begin_edit(self, rec):
+        if not rec:
+            self.show_notification("That record no longer exists.", "#e05a4f")
+            return
         self.current_edit_prescription_id = rec.get("Pr_ID")
+        self.current_edit_version = rec.get("Version")
         self.uid_input.setText(rec.get("Patient_UID") or "")
         self.notes_edit.setPlainText(rec.get("Condition_Notes") or "")
         self.prescription_edit.setPlainText(rec.get("Prescription") or "")
         self.show_notification(f"Loaded record ID {self.current_edit_prescription_id} for editing.", "#20b54b")
 
     def on_load_patient(self):
-        """Load patient history using Patient_UID (not numeric Patient_ID)."""
+        """Load patient history using Patient_UID (not numeric Patient_ID), off the GUI thread."""
         self.current_edit_prescription_id = None
+        self.current_edit_version = None
         uid = self.uid_input.text().strip()
         if not uid:
             self.show_notification("Please enter Patient UID.", "#e05a4f")
             return
 
-        conn = get_connection(parent_widget=self)
-        if not conn:
+        self.current_patient_uid = uid
+        self.query_executor.cancel("load")
+        self.query_executor.cancel("history_page")
+        self.query_executor.cancel("search")
+
+        cached = HISTORY_CACHE.get(uid)
+        if cached is not None:
+            self._on_patient_loaded(cached.as_result())
             return
-        cur = None
-        try:
-            cur = conn.cursor(dictionary=True)
-            cur.execute("""
-                SELECT prescription.*, patient_portal.Patient_UID
-                FROM prescription
-                JOIN patient_portal ON prescription.Patient_ID = patient_portal.Patient_ID
-                WHERE patient_portal.Patient_UID = %s
-                ORDER BY prescription.Pr_ID DESC
-            """, (uid,))
-            records = cur.fetchall()
-            self.populate_history(records)
-            if records:
-                latest = records[0]
-                self.notes_edit.setPlainText(latest.get("Condition_Notes") or "")
-                self.prescription_edit.setPlainText(latest.get("Prescription") or "")
-                self.show_notification("Loaded latest record.", "#666")
-            else:
-                self.notes_edit.clear()
-                self.prescription_edit.clear()
-                self.show_notification("No patient data found.", "#666")
-        except Exception as e:
-            QMessageBox.critical(self, "Load Error", f"Error loading patient data:\n{e}")
-            print(f"Error loading patient: {e}")
-        finally:
-            if cur:
-                cur.close()
-            conn.close()
+
+        self.show_notification("Loading patient…", "#888")
+        # channel="load": a newer Load cancels the result of one still running
+        self.query_executor.submit(
+            fetch_patient_history, uid,
+            on_result=self._on_patient_loaded, on_error=self._on_load_failed, channel="load"
+        )
+
+    def _on_patient_loaded(self, result):
+        records, has_more, latest = result
+        self.populate_history(records, has_more)
+        if latest:
+            self.notes_edit.setPlainText(latest.get("Condition_Notes") or "")
+            self.prescription_edit.setPlainText(latest.get("Prescription") or "")
+            self.show_notification("Loaded latest record.", "#666")
+        else:
+            self.notes_edit.clear()
+            self.prescription_edit.clear()
+            self.show_notification("No patient data found.", "#666")
+
+    def _on_load_failed(self, error):
+        self.show_notification("", "#888")
+        QMessageBox.critical(self, "Load Error", f"Error loading patient data:\n{error}")
+        print(f"Error loading patient: {error}")
+
+    def refresh_uid_index(self):
+        """Fold UIDs saved since the last refresh into the typeahead (the first call loads them all)."""
+        if self.query_executor.is_pending("uid_index"):
+            return
+        self.query_executor.submit(
+            fetch_uid_delta, UID_INDEX.watermark,
+            on_result=lambda delta: UID_INDEX.merge(*delta),
+            on_error=lambda error: print(f"Could not refresh the patient UID index: {error}"),
+            channel="uid_index"
+        )
+
+    def on_search(self):
+        """Search the loaded patient's records (or everyone's) and list the best matches."""
+        text = self.search_input.text().strip()
+        if not text:
+            self.query_executor.cancel("search")
+            self._restore_history()
+            return
+        if not boolean_query(text):
+            self.show_notification(f"Search words need at least {MIN_TERM_CHARS} letters.", "#e05a4f")
+            return
+        # without a loaded patient the search covers every patient
+        uid = None if self.search_all_check.isChecked() else self.current_patient_uid
+        self.query_executor.cancel("load")
+        self.query_executor.cancel("history_page")
+        self.show_notification("Searching…", "#888")
+        self.query_executor.submit(
+            search_prescriptions, text, uid,
+            on_result=lambda records: self._on_search_done(text, uid, records),
+            on_error=self._on_search_failed, channel="search"
+        )
+
+    def _on_search_done(self, text, uid, records):
+        self.hist_label.setText("Search Results")
+        self.showing_search_results = True
+        self.history_view.set_records(records, empty_text="No matching prescriptions.", fields=SEARCH_FIELDS)
+        scope = f"patient {uid}" if uid else "all patients"
+        self.show_notification(f"{len(records)} match(es) for \"{text}\" in {scope}.", "#666")
+
+    def _restore_history(self):
+        """Back from search results to the current patient's history, leaving the editors alone."""
+        uid = self.current_patient_uid
+        if not uid:
+            self.populate_history([])
+            return
+        cached = HISTORY_CACHE.get(uid)
+        if cached is not None:
+            records, has_more, _ = cached.as_result()
+            self.populate_history(records, has_more)
+            return
+        self.query_executor.submit(
+            fetch_patient_history, uid,
+            on_result=lambda result: self.populate_history(result[0], result[1]),
+            on_error=self._on_load_failed, channel="load"
+        )
+
+    def _on_search_failed(self, error):
+        self.show_notification("", "#888")
+        QMessageBox.critical(self, "Search Error", f"Error searching prescriptions:\n{error}")
+        print(f"Error searching prescriptions: {error}")
 
     def on_save_prescription(self):
         """Insert or update prescription depending on whether an edit id is set."""
         uid = self.uid_input.text().strip()
         notes = self.notes_edit.toPlainText().strip()
         presc = self.prescription_edit.toPlainText().strip()
+        edit_id = self.current_edit_prescription_id
+        edit_version = self.current_edit_version
 
         if not uid:
             self.show_notification("Please enter Patient UID.", "#e05a4f")
@@ -343,51 +685,56 @@ class DoctorPortalUI(QWidget):
             self.show_notification("Notes or prescription must not be empty.", "#e05a4f")
             return
 
-        conn = get_connection(parent_widget=self)
-        if not conn:
-            return
-
-        cur = None
-        try:
-            cur = conn.cursor()
-
-            # If editing existing prescription -> UPDATE
-            if self.current_edit_prescription_id:
-                cur.execute("""
-                    UPDATE prescription
-                    SET Condition_Notes = %s, Prescription = %s
-                    WHERE Pr_ID = %s
-                """, (notes, presc, self.current_edit_prescription_id))
-                conn.commit()
-                self.show_notification("Prescription updated successfully.", "#20b54b")
-                self.current_edit_prescription_id = None
-                self.on_load_patient()
-                return
-
-            # INSERT path: first verify patient exists and get numeric Patient_ID
-            cur.execute("SELECT Patient_ID FROM patient_portal WHERE Patient_UID = %s", (uid,))
-            patient_row = cur.fetchone()
-            if not patient_row:
-                self.show_notification("Invalid Patient UID — patient not found.", "#e05a4f")
-                return
-            patient_id = patient_row[0] if isinstance(patient_row, tuple) else patient_row
-
-            # Insert new prescription
-            cur.execute("""
-                INSERT INTO prescription (Patient_ID, Condition_Notes, Prescription)
-                VALUES (%s, %s, %s)
-            """, (patient_id, notes, presc))
-            conn.commit()
+        self.save_btn.setEnabled(False)
+        self.query_executor.submit(
+            save_prescription_record, uid, notes, presc, edit_id, edit_version,
+            on_result=lambda record: self._on_prescription_saved(uid, edit_id, record),
+            on_error=self._on_save_failed
+        )
+
+    def _on_prescription_saved(self, uid, edit_id, record):
+        """Patch the saved record into the history list in place instead of reloading the patient."""
+        self.save_btn.setEnabled(True)
+        if edit_id:
+            self.current_edit_prescription_id = None
+            self.current_edit_version = None
+            self.history_view.update_record(record)
+            self.show_notification("Prescription updated successfully.", "#20b54b")
+        elif record is None:
+            self.show_notification("Invalid Patient UID — patient not found.", "#e05a4f")
+        else:
+            if uid != self.current_patient_uid:
+                self.on_load_patient()  # the list shows another patient: switch to this one
+            elif not self.showing_search_results:
+                self.history_view.prepend_record(record)
             self.show_notification("Prescription saved successfully.", "#20b54b")
-            self.on_load_patient()
-        except Exception as e:
-            conn.rollback()
-            QMessageBox.critical(self, "Save Error", f"Error saving prescription:\n{e}")
-            print(f"Error saving prescription: {e}")
-        finally:
-            if cur:
-                cur.close()
-            conn.close()
+
+    def _on_edit_conflict(self, error):
+        """Someone saved this record first: keep the doctor's text, show the other change in the list."""
+        current = error.current
+        if current is None:
+            self.current_edit_prescription_id = None
+            self.current_edit_version = None
+            self.show_notification(
+                f"Record {error.record_id} was deleted meanwhile — save again to store this as a new prescription.",
+                "#e05a4f"
+            )
+            return
+        self.current_edit_version = current.get("Version")  # saving again now overwrites knowingly
+        HISTORY_CACHE.record_updated(current)
+        self.history_view.update_record(current)
+        self.show_notification(
+            f"Record {error.record_id} was changed by someone else while you were editing (see the list). "
+            "Save again to replace it with your text.", "#e05a4f"
+        )
+
+    def _on_save_failed(self, error):
+        self.save_btn.setEnabled(True)
+        if isinstance(error, EditConflictError):
+            self._on_edit_conflict(error)
+            return
+        QMessageBox.critical(self, "Save Error", f"Error saving prescription:\n{error}")
+        print(f"Error saving prescription: {error}")
 
     def on_logout(self): 
         self.close()
@@ -396,8 +743,20 @@ class DoctorPortalUI(QWidget):
 
 # ENTRY POINT
 def main():
+    startup = StartupProfiler(_STARTUP_T0, report_path=STARTUP_REPORT_PATH)
+    startup.mark("imports")
+    if TRACING:
+        configure_tracing(trace_file=TRACE_FILE, metrics_port=METRICS_PORT, slow_query_ms=SLOW_QUERY_MS)
+    if not FAST_STARTUP:
+        initialize_db()  # Run pending schema migrations before launching UI
+        startup.mark("migrations")
     app = QApplication(sys.argv)
-    window = DoctorPortalUI()
+    startup.mark("qapplication")
+    window = DoctorPortalUI(startup)
+    startup.mark("init_ui")
+    if FAST_STARTUP:
+        startup.defer(window.initialize_db_in_background)
+    startup.watch_first_paint(window)
     window.show()
     sys.exit(app.exec_())
 
@@ -1,45 +1,617 @@
 import sys
-import mysql.connector
-from mysql.connector import Error
+import time
+_STARTUP_T0 = time.perf_counter()  # the start-up report times module imports from here
+
 from PyQt5.QtWidgets import (
     QApplication, QWidget, QLabel, QLineEdit, QTextEdit, QPushButton,
-    QVBoxLayout, QHBoxLayout, QFrame, QScrollArea
+    QVBoxLayout, QHBoxLayout, QFrame, QCheckBox
 )
-from PyQt5.QtCore import Qt
-from PyQt5.QtGui import QFont, QColor
-from PyQt5.QtWidgets import QGraphicsDropShadowEffect
+from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtGui import QFont
+
+from db_pool import get_pool, PoolExhaustedError
+from query_executor import QueryExecutor
+from startup import StartupProfiler
+from tracing import TRACER, configure_tracing
+from shadows import apply_shadow
+from history_view import HistoryView, PREVIEW_CHARS
+from history_cache import HistoryCache
+from write_queue import CommitOutcomeUnknownError, WriteBehindQueue
+from local_store import LocalStore, SyncWorker, LOCAL_KEY
+from fulltext import boolean_query, MIN_TERM_CHARS, SEARCH_LIMIT
+from uid_index import UidIndex, UidCompleter, select_uid_delta
+from theme import apply_theme, notification_tone, set_property, set_role
+from migrations import Migration, add_column, create_index, create_trigger, drop_trigger, run_migrations, set_row_format
+from change_feed import Broker, ChangeTableFeed, prune_changes
+from concurrency import INITIAL_VERSION, EditConflictError, require_applied
+from portal_config import DB_CONFIGS, ITEM_TABLES
+from prescription_items import backfill_items, item_rows, insert_items, replace_items, \
+    strip_signature, strip_signatures
 
 
 #  DATABASE CONFIGURATION 
 
-DB_CONFIG = {
-    "host": "127.0.0.1",
-    "user": "root",
-    "password": "",
-    "database": "doctor",
-    "port": 3306
+# Kept in portal_config.py, which the Qt-free tools (pharmacy_queue.py, bulk_io.py) share
+DB_CONFIG = DB_CONFIGS["doctor_portal"]
+
+# History card columns for this schema (see history_view.py)
+HISTORY_FIELDS = {
+    "id": "prescription_id",
+    "date": "created_at",
+    "notes": "condition_notes",
+    "prescription": "prescription",
 }
 
+# Search results also show whose record each card is
+SEARCH_FIELDS = dict(HISTORY_FIELDS, patient="patient_uid")
+
+# History is paged newest-first; older pages load as the list scrolls down
+HISTORY_PAGE_SIZE = 30
+
+# Per-patient history cache (see history_cache.py)
+HISTORY_CACHE_SIZE = 64      # patients
+HISTORY_CACHE_TTL = 300      # seconds
+HISTORY_CACHE = HistoryCache("prescription_id", max_entries=HISTORY_CACHE_SIZE, ttl=HISTORY_CACHE_TTL)
+
+# Find Patient typeahead (see uid_index.py): loaded once, then refreshed with deltas
+UID_INDEX = UidIndex()
+UID_INDEX_REFRESH = 60  # seconds between delta queries
+
+# Optional write-behind queue: group new prescriptions into multi-row INSERTs
+# with a single COMMIT (see write_queue.py). Updates are always written directly.
+WRITE_BEHIND = False
+WRITE_BEHIND_MAX_BATCH = 20
+WRITE_BEHIND_MAX_DELAY = 0.25  # seconds
+
+# Optional offline-first mode: every save goes to a local SQLite store first and
+# a background worker replays it to MySQL (see local_store.py). Loads are served
+# from the local replica and refreshed from the server in the background.
+OFFLINE_FIRST = False
+LOCAL_STORE_PATH = "doctor_portal_local.db"
+SYNC_INTERVAL = 15  # seconds between background sync passes
+HISTORY_STREAM_CHUNK = 500  # rows per fetch when pulling a patient's history into the local replica
+
+# Optional change feed (see change_feed.py): triggers log every prescription INSERT/UPDATE,
+# and an open portal patches the affected card instead of waiting for the next Load Patient.
+CHANGE_FEED = False
+CHANGE_FEED_INTERVAL = 1.0  # seconds between reads of the change table
+CHANGE_BROKER = Broker()    # publish ChangeEvents here directly to drive the portal without MySQL
+
+
+# Fast startup: show the window first; shadows and schema migrations run after
+# the first paint (see startup.py). The start-up time report is always printed.
+FAST_STARTUP = False
+STARTUP_REPORT_PATH = None  # e.g. "startup_times.jsonl" to track one JSON line per start
+
+# Optional InnoDB table compression for the notes/prescription text. Pages stay
+# compressed on disk and in the buffer pool and are inflated only when read; queries,
+# LEFT() previews and the full-text index work unchanged. Switching it on rebuilds the
+# table once, at the next start. Off by default: only the compression ratio has been
+# estimated so far. Run benchmarks/storage_compression.py against MySQL first to measure
+# table size, buffer-pool hit rate and history-query latency with and without it.
+COMPRESSED_STORAGE = False
+COMPRESSED_KEY_BLOCK_SIZE = 8  # KB per compressed page (InnoDB pages are 16 KB)
+
+# Look of the window: "light" or "dark" (see theme.py); theme.apply_theme() switches it at runtime
+THEME = "light"
+
+# Timing spans and slow-query log (see tracing.py)
+TRACING = False
+TRACE_FILE = None      # e.g. "portal_trace.jsonl": one JSON line per finished span
+METRICS_PORT = None    # e.g. 9464: Prometheus text on http://127.0.0.1:9464/metrics
+SLOW_QUERY_MS = 200
+
+# Shared connection pool (see db_pool.py)
+POOL_SIZE = 5
+POOL_IDLE_TIMEOUT = 300  # seconds
+
 
 def get_connection():
-    """Create and return a MySQL database connection."""
+    """Borrow a MySQL connection from the shared pool. Calling close() returns it to the pool."""
+    # Imported here rather than at module level so the driver loads on the first
+    # DB action (off the GUI thread in fast-startup mode), not during start-up
+    from mysql.connector import Error
+
     try:
-        conn = mysql.connector.connect(**DB_CONFIG)
-        return conn
-    except Error as e:
+        with TRACER.span("db.get_connection"):
+            pool = get_pool(DB_CONFIG, pool_size=POOL_SIZE, idle_timeout=POOL_IDLE_TIMEOUT)
+            return pool.acquire()
+    except (Error, PoolExhaustedError) as e:
         print(f"DB Connection Error: {e}")
         return None
 
 
-# UI STYLE UTILITIES 
+# SCHEMA MIGRATIONS
+# Applied once at startup by initialize_db(); versions are recorded in schema_migrations.
+
+# One row per line of a prescription, written in the same transaction (see prescription_items.py)
+ITEM_TABLE = ITEM_TABLES["doctor_portal"]
+
+MIGRATIONS = [
+    Migration(1, "create prescriptions table", [
+        """CREATE TABLE IF NOT EXISTS prescriptions (
+            prescription_id INT AUTO_INCREMENT PRIMARY KEY,
+            patient_uid VARCHAR(50),
+            condition_notes TEXT,
+            prescription TEXT,
+            doctor_name VARCHAR(100),
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )""",
+    ]),
+    # Older databases predate created_at (previously added on the fly during a save)
+    Migration(2, "add prescriptions.created_at", [
+        add_column("prescriptions", "created_at", "DATETIME DEFAULT CURRENT_TIMESTAMP"),
+    ]),
+    # Serves the keyset-paged history query without a full table scan or filesort
+    Migration(3, "index prescriptions by patient and date", [
+        create_index("prescriptions", "idx_prescriptions_patient_created",
+                     ["patient_uid", "created_at", "prescription_id"],
+                     order={"created_at": "DESC", "prescription_id": "DESC"}),
+    ]),
+    # Lets the offline-first sync worker replay a saved row any number of times
+    Migration(4, "add prescriptions.idempotency_key", [
+        add_column("prescriptions", "idempotency_key", "CHAR(36) NULL"),
+        create_index("prescriptions", "uq_prescriptions_idempotency_key", ["idempotency_key"], unique=True),
+    ]),
+    # Ranked search over notes and prescriptions (see fulltext.py). InnoDB keeps the
+    # index current as each save commits; building it rebuilds the table once.
+    Migration(5, "full-text index on prescriptions notes and prescription", [
+        create_index("prescriptions", "ft_prescriptions_text", ["condition_notes", "prescription"], fulltext=True),
+    ]),
+    # The doctor's name is its own column; stop carrying it as a signature in the text
+    Migration(6, "strip doctor signatures from prescriptions", [
+        strip_signatures("prescriptions", "prescription", "doctor_name"),
+    ]),
+    Migration(7, "create prescription_items table", [
+        """CREATE TABLE IF NOT EXISTS prescription_items (
+            prescription_id INT NOT NULL,
+            line_no SMALLINT NOT NULL,
+            drug VARCHAR(200) NOT NULL,
+            dose VARCHAR(64),
+            frequency VARCHAR(64),
+            duration VARCHAR(64),
+            PRIMARY KEY (prescription_id, line_no),
+            INDEX idx_prescription_items_drug (drug),
+            CONSTRAINT fk_prescription_items_prescription FOREIGN KEY (prescription_id)
+                REFERENCES prescriptions (prescription_id) ON DELETE CASCADE
+        )""",
+        backfill_items("prescriptions", "prescription_id", "prescription", ITEM_TABLE),
+    ]),
+    # Optimistic concurrency: every UPDATE is a compare-and-set on the version (see concurrency.py)
+    Migration(8, "add prescriptions.version", [
+        add_column("prescriptions", "version", f"INT NOT NULL DEFAULT {INITIAL_VERSION}"),
+    ]),
+    # Change feed: the log table. Its triggers are settings that follow CHANGE_FEED
+    Migration(9, "create prescription_changes table for the change feed", [
+        """CREATE TABLE IF NOT EXISTS prescription_changes (
+            change_id BIGINT AUTO_INCREMENT PRIMARY KEY,
+            patient_uid VARCHAR(50),
+            prescription_id INT NOT NULL,
+            op VARCHAR(10) NOT NULL,
+            changed_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            INDEX idx_prescription_changes_changed (changed_at)
+        )""",
+    ]),
+]
+
+
+# Every writer's INSERT/UPDATE is logged, whether or not it knows about the feed. Only
+# present while CHANGE_FEED is on, so installs without a feed do not log a row per save.
+CHANGE_TRIGGERS = [
+    create_trigger("trg_prescriptions_log_insert", "prescriptions", "INSERT",
+                   "INSERT INTO prescription_changes (patient_uid, prescription_id, op) "
+                   "VALUES (NEW.patient_uid, NEW.prescription_id, 'insert')"),
+    create_trigger("trg_prescriptions_log_update", "prescriptions", "UPDATE",
+                   "INSERT INTO prescription_changes (patient_uid, prescription_id, op) "
+                   "VALUES (NEW.patient_uid, NEW.prescription_id, 'update')"),
+]
+DROP_CHANGE_TRIGGERS = [
+    drop_trigger("trg_prescriptions_log_insert"),
+    drop_trigger("trg_prescriptions_log_update"),
+]
+
+
+def initialize_db():
+    """Bring the database schema up to date before the UI starts."""
+    conn = get_connection()
+    if not conn:
+        return
+
+    try:
+        settings = []
+        if COMPRESSED_STORAGE:
+            settings.append(set_row_format("prescriptions", "COMPRESSED", COMPRESSED_KEY_BLOCK_SIZE))
+        settings.extend(CHANGE_TRIGGERS if CHANGE_FEED else DROP_CHANGE_TRIGGERS)
+        # Also clears rows left by a feed that has since been turned off
+        settings.append(prune_changes("prescription_changes", "changed_at"))
+        applied = run_migrations(conn, MIGRATIONS, namespace="doctor_portal", settings=settings)
+        if applied:
+            print(f"Applied schema migrations: {applied}")
+    except Exception as e:
+        print(f"Error migrating database schema: {e}")
+    finally:
+        conn.close()
+
+
+# BACKGROUND DATABASE WORK
+# These run on QueryExecutor worker threads and must not touch any widget.
+
+def _select_history_page(conn, uid, before, limit):
+    """
+    One keyset page of history previews, newest first, ordered by (created_at, prescription_id).
+    before is the last record already shown (None for the first page). Returns (records, has_more).
+    """
+    sql = """
+        SELECT prescription_id, patient_uid, created_at,
+               LEFT(condition_notes, %s) AS condition_notes,
+               LEFT(prescription, %s) AS prescription
+        FROM prescriptions
+        WHERE patient_uid = %s
+    """
+    params = [PREVIEW_CHARS, PREVIEW_CHARS, uid]
+    if before:
+        sql += " AND (created_at < %s OR (created_at = %s AND prescription_id < %s))"
+        params += [before["created_at"], before["created_at"], before["prescription_id"]]
+    sql += " ORDER BY created_at DESC, prescription_id DESC LIMIT %s"
+    params.append(limit + 1)  # one extra row tells us whether an older page exists
+
+    cur = conn.prepared_cursor(dictionary=True)
+    cur.execute(sql, params)
+    records = cur.fetchall()
+    cur.close()
+    return records[:limit], len(records) > limit
+
+
+def _select_prescription(conn, record_id):
+    cur = conn.prepared_cursor(dictionary=True)
+    cur.execute("SELECT * FROM prescriptions WHERE prescription_id = %s", (record_id,))
+    rec = cur.fetchone()
+    cur.close()
+    return rec
+
+
+def fetch_patient_history(uid):
+    """First history page for a patient plus the full latest record. Returns (records, has_more, latest)."""
+    conn = get_connection()
+    if not conn:
+        raise ConnectionError("Could not connect to the database.")
+
+    try:
+        records, has_more = _select_history_page(conn, uid, None, HISTORY_PAGE_SIZE)
+        latest = _select_prescription(conn, records[0]["prescription_id"]) if records else None
+        HISTORY_CACHE.put(uid, records, has_more, latest)
+        return records, has_more, latest
+    finally:
+        conn.close()
+
+
+def fetch_history_page(uid, before):
+    """Older history page after the record `before`. Returns (records, has_more)."""
+    conn = get_connection()
+    if not conn:
+        raise ConnectionError("Could not connect to the database.")
+
+    try:
+        records, has_more = _select_history_page(conn, uid, before, HISTORY_PAGE_SIZE)
+        HISTORY_CACHE.extend(uid, before, records, has_more)
+        return records, has_more
+    finally:
+        conn.close()
+
+
+def fetch_prescription(record_id):
+    """Full record (untruncated notes and prescription) for editing."""
+    conn = get_connection()
+    if not conn:
+        raise ConnectionError("Could not connect to the database.")
+
+    try:
+        return _select_prescription(conn, record_id)
+    finally:
+        conn.close()
+
+
+def fetch_changed_prescription(uid, record_id, op):
+    """
+    Change-feed follow-up: read a row saved elsewhere and patch it into the history
+    cache (or, offline-first, the local replica). Returns it, or None when it is gone.
+    """
+    record = fetch_prescription(record_id)
+    if record is None:
+        return None
+    if OFFLINE_FIRST:
+        get_local_store().merge_remote(uid, [record], idempotency_field="idempotency_key")
+    elif not HISTORY_CACHE.record_updated(record) and op == "insert":
+        HISTORY_CACHE.record_inserted(uid, record)
+    return record
+
+
+def fetch_uid_delta(after_id):
+    """UIDs with prescriptions saved after row after_id (all of them for 0). Returns (uids, watermark)."""
+    conn = get_connection()
+    if not conn:
+        raise ConnectionError("Could not connect to the database.")
+    try:
+        return select_uid_delta(conn, "prescriptions", "prescription_id", "patient_uid", after_id)
+    finally:
+        conn.close()
+
+
+def search_prescriptions(text, uid=None, limit=SEARCH_LIMIT):
+    """
+    Ranked full-text search of notes and prescriptions for one patient, or for every
+    patient when uid is None. Best match first, newest first among equal matches.
+    """
+    query = boolean_query(text)
+    if not query:
+        return []
+
+    conn = get_connection()
+    if not conn:
+        raise ConnectionError("Could not connect to the database.")
+
+    sql = """
+        SELECT prescription_id, patient_uid, created_at,
+               LEFT(condition_notes, %s) AS condition_notes,
+               LEFT(prescription, %s) AS prescription,
+               MATCH (condition_notes, prescription) AGAINST (%s IN BOOLEAN MODE) AS score
+        FROM prescriptions
+        WHERE MATCH (condition_notes, prescription) AGAINST (%s IN BOOLEAN MODE)
+    """
+    params = [PREVIEW_CHARS, PREVIEW_CHARS, query, query]
+    if uid:
+        sql += " AND patient_uid = %s"
+        params.append(uid)
+    sql += " ORDER BY score DESC, created_at DESC, prescription_id DESC LIMIT %s"
+    params.append(limit)
+
+    try:
+        cur = conn.prepared_cursor(dictionary=True)
+        cur.execute(sql, params)
+        records = cur.fetchall()
+        cur.close()
+        return records
+    finally:
+        conn.close()
+
+
+def save_prescription_record(uid, notes, presc, doctor_name, edit_id=None, version=None):
+    """
+    Update prescription edit_id, or insert a new one, together with its line items.
+    Returns the saved record for the history list: the row read back after an INSERT,
+    the changed columns after an UPDATE.
+
+    An update only applies if the row is still at version (the one the edit was loaded
+    at); otherwise EditConflictError carries the row as someone else saved it.
+    """
+    conn = get_connection()
+    if not conn:
+        raise ConnectionError("Could not connect to the database.")
+
+    try:
+        cur = conn.prepared_cursor()
+
+        if edit_id:
 
-def apply_shadow(widget, blur_radius=20, x_offset=0, y_offset=4, color=QColor(0, 0, 0, 60)):
-    """Apply drop shadow effect to a widget."""
-    shadow = QGraphicsDropShadowEffect()
-    shadow.setBlurRadius(blur_radius)
-    shadow.setOffset(x_offset, y_offset)
-    shadow.setColor(color)
-    widget.setGraphicsEffect(shadow)
+            # Update existing record 
+
+            cur.execute("""
+                UPDATE prescriptions
+                SET condition_notes = %s, prescription = %s, doctor_name = %s, version = version + 1
+                WHERE prescription_id = %s AND version = %s
+            """, (notes, presc, doctor_name, edit_id, version))
+            require_applied(conn, cur, edit_id, lambda: _select_prescription(conn, edit_id))
+            record_id = edit_id
+
+        else:
+
+            #  Insert new record 
+
+            cur.execute("""
+                INSERT INTO prescriptions (patient_uid, condition_notes, prescription, doctor_name)
+                VALUES (%s, %s, %s, %s)
+            """, (uid, notes, presc, doctor_name))
+            record_id = cur.lastrowid
+
+        # A plain cursor: item INSERTs vary in length and would crowd the statement cache
+        items_cur = conn.cursor()
+        replace_items(items_cur, ITEM_TABLE, record_id, presc, existing=bool(edit_id))
+        items_cur.close()
+
+        conn.commit()
+        cur.close()
+
+        # Write-through: patch the cached history instead of re-fetching it
+        if edit_id:
+            record = {
+                "prescription_id": edit_id, "condition_notes": notes,
+                "prescription": presc, "doctor_name": doctor_name, "version": version + 1,
+            }
+            HISTORY_CACHE.record_updated(record)
+        else:
+            # Read back by primary key to pick up the server-assigned created_at
+            try:
+                record = _select_prescription(conn, record_id)
+                HISTORY_CACHE.record_inserted(uid, record)
+            except Exception:
+                HISTORY_CACHE.invalidate(uid)  # the row is committed; the next load just re-fetches
+                record = {"prescription_id": record_id, "patient_uid": uid, "condition_notes": notes,
+                          "prescription": presc, "doctor_name": doctor_name}
+        return record
+    finally:
+        conn.close()
+
+
+def _insert_queued_items(cur, rows, ids):
+    """Write-behind hook: itemize a batch inside the transaction that inserts it."""
+    insert_items(cur, ITEM_TABLE, [item for row, record_id in zip(rows, ids)
+                                   for item in item_rows(record_id, row[2])])
+
+
+def _cache_inserted_rows(conn, rows, ids):
+    """Write-behind hook: read a committed batch back with one range query into the history cache."""
+    cur = conn.cursor(dictionary=True)
+    cur.execute(
+        "SELECT * FROM prescriptions WHERE prescription_id BETWEEN %s AND %s ORDER BY prescription_id", (ids[0], ids[-1])
+    )
+    for rec in cur.fetchall():
+        HISTORY_CACHE.record_inserted(rec["patient_uid"], rec)
+    cur.close()
+
+
+_write_queue = None
+
+
+def get_write_queue():
+    """Process-wide write-behind queue for new prescriptions, created on first use."""
+    global _write_queue
+    if _write_queue is None:
+        _write_queue = WriteBehindQueue(
+            get_connection, "prescriptions", ["patient_uid", "condition_notes", "prescription", "doctor_name"],
+            max_batch=WRITE_BEHIND_MAX_BATCH, max_delay=WRITE_BEHIND_MAX_DELAY,
+            before_commit=_insert_queued_items, after_commit=_cache_inserted_rows
+        )
+    return _write_queue
+
+
+# OFFLINE-FIRST LOCAL STORE
+
+def _push_local_row(conn, op, record, key):
+    """
+    SyncWorker hook: replay one locally saved row. Re-running it is harmless —
+    an INSERT that already reached the server matches its idempotency_key and
+    just updates that row. If the text changed (an edit made offline meanwhile)
+    the version is bumped too, so other clients' compare-and-set notices. An edit
+    made against an older version raises EditConflictError. Returns
+    (prescription_id, server copy of the row).
+    """
+    presc = strip_signature(record["prescription"])  # rows saved locally before signatures went away
+    cur = conn.cursor()
+    try:
+        if op == "update":
+            cur.execute("""
+                UPDATE prescriptions
+                SET condition_notes = %s, prescription = %s, doctor_name = %s, version = version + 1
+                WHERE prescription_id = %s AND version = %s
+            """, (record["condition_notes"], presc, record["doctor_name"],
+                  record["prescription_id"], record.get("version")))
+            record_id = record["prescription_id"]
+            require_applied(conn, cur, record_id, lambda: _select_prescription(conn, record_id))
+        else:
+            cur.execute("""
+                INSERT INTO prescriptions
+                    (patient_uid, condition_notes, prescription, doctor_name, idempotency_key)
+                VALUES (%s, %s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE
+                    prescription_id = LAST_INSERT_ID(prescription_id),
+                    version = IF(condition_notes <=> VALUES(condition_notes)
+                                 AND prescription <=> VALUES(prescription)
+                                 AND doctor_name <=> VALUES(doctor_name), version, version + 1),
+                    condition_notes = VALUES(condition_notes),
+                    prescription = VALUES(prescription),
+                    doctor_name = VALUES(doctor_name)
+            """, (record["patient_uid"], record["condition_notes"], presc,
+                  record["doctor_name"], key))
+            record_id = cur.lastrowid
+        replace_items(cur, ITEM_TABLE, record_id, presc)
+        conn.commit()
+    finally:
+        cur.close()
+    HISTORY_CACHE.invalidate(record["patient_uid"])
+    return record_id, _select_prescription(conn, record_id)
+
+
+def refresh_local_history(uid, on_chunk=None):
+    """
+    Pull the patient's rows created since the last pull into the local replica.
+    Returns how many local rows changed. The watermark is created_at, so edits
+    made elsewhere to older rows are picked up only on a full re-pull.
+
+    Rows stream newest first through an unbuffered cursor, HISTORY_STREAM_CHUNK
+    plain tuples at a time, and each chunk is merged as it arrives; on_chunk(pulled)
+    runs (on this worker thread) after each one, so a first load can show the
+    newest cards long before a long history has fully arrived.
+    """
+    store = get_local_store()
+    conn = get_connection()
+    if not conn:
+        raise ConnectionError("Could not connect to the database.")
+
+    changed = pulled = 0
+    newest = None
+    try:
+        watermark = store.watermark(uid)
+        sql = "SELECT * FROM prescriptions WHERE patient_uid = %s"
+        params = [uid]
+        if watermark:
+            # >= : a row committed later within the watermark's second must not be missed
+            sql += " AND created_at >= %s"
+            params.append(watermark)
+        sql += " ORDER BY created_at DESC, prescription_id DESC"
+        cur = conn.cursor(buffered=False)
+        try:
+            cur.execute(sql, params)
+            columns = [d[0] for d in cur.description]
+            created = columns.index("created_at")
+            while True:
+                rows = cur.fetchmany(HISTORY_STREAM_CHUNK)
+                if not rows:
+                    break
+                if newest is None:
+                    newest = rows[0][created]
+                changed += store.merge_remote(uid, rows, idempotency_field="idempotency_key", columns=columns)
+                pulled += len(rows)
+                if on_chunk:
+                    on_chunk(pulled)
+        finally:
+            cur.close()
+    except Exception:
+        conn.discard()  # an abandoned unbuffered result leaves the connection unusable
+        raise
+    finally:
+        conn.close()
+
+    # Only once everything older is merged: an interrupted pull simply starts over
+    if newest is not None:
+        store.set_watermark(uid, newest)
+    return changed
+
+
+_local_store = None
+_sync_worker = None
+
+
+def get_local_store():
+    """Process-wide local store; the first call also starts the background sync worker."""
+    global _local_store, _sync_worker
+    if _local_store is None:
+        _local_store = LocalStore(LOCAL_STORE_PATH, "prescription_id",
+                                  sort_key=lambda rec: str(rec.get("created_at") or ""), version_key="version")
+        _sync_worker = SyncWorker(_local_store, get_connection, _push_local_row, interval=SYNC_INTERVAL)
+        _sync_worker.start()
+    return _local_store
+
+
+def get_sync_worker():
+    get_local_store()
+    return _sync_worker
+
+
+# CHANGE FEED
+
+_change_feed = None
+
+
+def start_change_feed():
+    """Tail prescription_changes into CHANGE_BROKER; one thread per process, started once."""
+    global _change_feed
+    if _change_feed is None:
+        _change_feed = ChangeTableFeed(
+            get_connection, CHANGE_BROKER, "prescription_changes",
+            ["change_id", "patient_uid", "prescription_id", "op"], "changed_at", interval=CHANGE_FEED_INTERVAL
+        )
+        _change_feed.start()
+    return _change_feed
 
 
 # MAIN UI CLASS 
@@ -47,21 +619,49 @@ def apply_shadow(widget, blur_radius=20, x_offset=0, y_offset=4, color=QColor(0,
 class DoctorPortalUI(QWidget):
     """Doctor Portal — Main application window for managing patient prescriptions."""
 
-    def __init__(self):
+    def __init__(self, startup=None):
         super().__init__()
         self.setWindowTitle("Imhotep — Doctor's Portal")
         self.setMinimumSize(980, 700)
-        self.setStyleSheet("background-color:#eef1f4;")
+        self.setObjectName("portal")
+        apply_theme(THEME)  # one application stylesheet; widgets below only set names/roles
 
         # State Variables 
         self.current_patient_uid = None
+        self.showing_search_results = False
         self.registered_doctor_name = None
         self.last_condition = ""
         self.last_prescription = ""
         self.current_edit_prescription_id = None  # Holds prescription_id for edit mode
+        self.current_edit_version = None          # Row version the edit was loaded at (optimistic concurrency)
+        self.current_edit_local_key = None        # Offline-first: local store key of the edited record
+        self.history_streamed_uid = None          # Offline-first: first cards already shown while the pull streams
+
+        self.startup = startup  # StartupProfiler, when launched through main()
+
+        # Background DB work — one worker per pooled connection
+        self.query_executor = QueryExecutor(self, max_threads=POOL_SIZE)
+
+        if OFFLINE_FIRST:
+            # Runs on the sync thread; post back to the GUI thread
+            get_sync_worker().on_synced = lambda keys: self.query_executor.post(self._on_local_synced)
+            get_sync_worker().on_conflict = lambda keys: self.query_executor.post(self._on_local_conflicts, keys)
+
+        # Runs on the feed thread; post back to the GUI thread
+        self.change_subscription = CHANGE_BROKER.subscribe(
+            lambda event: self.query_executor.post(self._on_remote_change, event)
+        )
+        if CHANGE_FEED and not FAST_STARTUP:
+            start_change_feed()  # fast startup: once the migrations have created the change table
 
         self.init_ui()
 
+        # Keep the UID typeahead fresh with small delta queries
+        self.uid_index_timer = QTimer(self)
+        self.uid_index_timer.timeout.connect(self.refresh_uid_index)
+        self.uid_index_timer.start(UID_INDEX_REFRESH * 1000)
+        QTimer.singleShot(0, self.refresh_uid_index)
+
     
     # INITIAL UI SETUP
     
@@ -79,15 +679,15 @@ class DoctorPortalUI(QWidget):
 
         subtitle = QLabel("Doctor's Portal")
         subtitle.setAlignment(Qt.AlignCenter)
-        subtitle.setStyleSheet("color: #666; font-size: 14px;")
+        subtitle.setObjectName("subtitle")
 
         main_layout.addWidget(title_label)
         main_layout.addWidget(subtitle)
 
         # Main Container
         container = QFrame()
-        container.setStyleSheet("background-color:white; border-radius:12px;")
-        apply_shadow(container, blur_radius=30, y_offset=6)
+        container.setObjectName("container")
+        self._apply_shadow(container, blur_radius=30, y_offset=6)
 
         container_layout = QVBoxLayout()
         container_layout.setContentsMargins(26, 22, 26, 22)
@@ -110,15 +710,7 @@ class DoctorPortalUI(QWidget):
 
         placeholder_btn = QPushButton("Generated UI Placeholder")
         placeholder_btn.setEnabled(False)
-        placeholder_btn.setStyleSheet("""
-            QPushButton {
-                border: 1px solid #bbb;
-                border-radius: 6px;
-                padding: 6px 10px;
-                background: #f5f6f7;
-                color: #333;
-            }
-        """)
+        set_role(placeholder_btn, "placeholder")
         placeholder_btn.setMaximumWidth(220)
         left_layout.addWidget(placeholder_btn)
         left_layout.addStretch()
@@ -130,19 +722,7 @@ class DoctorPortalUI(QWidget):
         # Back Button 
         back_btn = QPushButton("← Back")
         back_btn.setFixedWidth(100)
-        back_btn.setStyleSheet("""
-            QPushButton {
-                background-color: #f0f0f0;
-                color: #333;
-                border: 1px solid #ccc;
-                border-radius: 6px;
-                padding: 6px 10px;
-                font-weight: bold;
-            }
-            QPushButton:hover {
-                background-color: #e6e6e6;
-            }
-        """)
+        set_role(back_btn, "secondary")
         back_btn.clicked.connect(self.on_back)
 
         top_h.addStretch()
@@ -159,8 +739,8 @@ class DoctorPortalUI(QWidget):
         # LEFT PANEL — PATIENT SEARCH & HISTORY
        
         left_card = QFrame()
-        left_card.setStyleSheet("background: #fbfbfb; border-radius: 10px;")
-        apply_shadow(left_card, blur_radius=18, y_offset=4)
+        left_card.setProperty("card", "panel")
+        self._apply_shadow(left_card, blur_radius=18, y_offset=4)
 
         left_v = QVBoxLayout(left_card)
         left_v.setContentsMargins(18, 16, 18, 16)
@@ -173,51 +753,53 @@ class DoctorPortalUI(QWidget):
         self.uid_input = QLineEdit()
         self.uid_input.setPlaceholderText("Enter Patient UID")
         self.uid_input.setFixedHeight(36)
-        self.uid_input.setStyleSheet("border:1px solid #e1e1e1; border-radius:6px; padding-left:8px;")
         left_v.addWidget(self.uid_input)
+        # Typeahead over known UIDs; picking one loads the patient
+        self.uid_completer = UidCompleter(self.uid_input, UID_INDEX)
+        self.uid_completer.uidChosen.connect(lambda uid: self.on_load_patient())
 
         self.notification_label = QLabel("")
-        self.notification_label.setStyleSheet("color: #888; font-size: 11px;")
+        self.notification_label.setObjectName("notification")
         left_v.addWidget(self.notification_label)
 
         self.load_btn = QPushButton("Load Patient")
         self.load_btn.setFixedHeight(40)
-        self.load_btn.setStyleSheet("""
-            QPushButton {
-                background-color: #2b78f6;
-                color: white;
-                border-radius: 6px;
-                font-weight: bold;
-            }
-        """)
+        set_role(self.load_btn, "primary")
         self.load_btn.clicked.connect(self.on_load_patient)
         left_v.addWidget(self.load_btn)
 
-        hist_label = QLabel("Patient History")
-        hist_label.setFont(QFont("Helvetica", 12, QFont.Bold))
-        left_v.addWidget(hist_label)
-
-        #  History Scroll 
-        self.history_scroll = QScrollArea()
-        self.history_scroll.setWidgetResizable(True)
-        self.history_scroll.setStyleSheet("border:1px solid #e9e9e9; border-radius:8px; background:#fff;")
-        self.history_scroll.setFixedHeight(220)
-
-        self.history_content = QWidget()
-        self.history_layout = QVBoxLayout(self.history_content)
-        self.history_layout.setContentsMargins(10, 10, 10, 10)
-        self.history_layout.setSpacing(10)
-        self.history_scroll.setWidget(self.history_content)
-
-        left_v.addWidget(self.history_scroll)
+        #  Full-text search (Enter to search; clear it to return to the history)
+        search_row = QHBoxLayout()
+        self.search_input = QLineEdit()
+        self.search_input.setPlaceholderText("Search notes & prescriptions, e.g. amoxicillin")
+        self.search_input.setFixedHeight(32)
+        self.search_input.returnPressed.connect(self.on_search)
+        search_row.addWidget(self.search_input, 1)
+
+        self.search_all_check = QCheckBox("All patients")
+        search_row.addWidget(self.search_all_check)
+        left_v.addLayout(search_row)
+
+        self.hist_label = QLabel("Patient History")
+        self.hist_label.setFont(QFont("Helvetica", 12, QFont.Bold))
+        left_v.addWidget(self.hist_label)
+
+        #  History List (virtualized — only visible cards are painted)
+        self.history_view = HistoryView(HISTORY_FIELDS)
+        self.history_view.setObjectName("historyView")
+        self.history_view.setFixedHeight(220)
+        self.history_view.editRequested.connect(self._on_edit_history_record)
+        self.history_view.history_model.fetch_more_handler = self._load_older_history
+
+        left_v.addWidget(self.history_view)
         left_v.addStretch(1)
 
         
         # RIGHT PANEL — CONDITION & PRESCRIPTION
        
         right_card = QFrame()
-        right_card.setStyleSheet("background: #fbfbfb; border-radius: 10px;")
-        apply_shadow(right_card, blur_radius=18, y_offset=4)
+        right_card.setProperty("card", "panel")
+        self._apply_shadow(right_card, blur_radius=18, y_offset=4)
 
         right_v = QVBoxLayout(right_card)
         right_v.setContentsMargins(18, 16, 18, 16)
@@ -229,13 +811,7 @@ class DoctorPortalUI(QWidget):
 
         #  Notes & Prescription Frame 
         bordered_frame = QFrame()
-        bordered_frame.setStyleSheet("""
-            QFrame {
-                border: 1px solid #ccc;
-                border-radius: 8px;
-                background: #fff;
-            }
-        """)
+        bordered_frame.setObjectName("editorFrame")
         bordered_layout = QVBoxLayout(bordered_frame)
         bordered_layout.setContentsMargins(10, 10, 10, 10)
         bordered_layout.setSpacing(8)
@@ -249,7 +825,7 @@ class DoctorPortalUI(QWidget):
         divider = QFrame()
         divider.setFrameShape(QFrame.HLine)
         divider.setFrameShadow(QFrame.Sunken)
-        divider.setStyleSheet("color: #ccc; margin-top:6px; margin-bottom:6px;")
+        divider.setObjectName("divider")
         bordered_layout.addWidget(divider)
 
         # Prescription
@@ -263,14 +839,7 @@ class DoctorPortalUI(QWidget):
         # Save Button 
         self.save_btn = QPushButton("Generate Prescription  Save")
         self.save_btn.setFixedHeight(44)
-        self.save_btn.setStyleSheet("""
-            QPushButton {
-                background-color: #20b54b;
-                color: white;
-                border-radius: 8px;
-                font-weight: bold;
-            }
-        """)
+        set_role(self.save_btn, "success")
         self.save_btn.clicked.connect(self.on_save_prescription)
         right_v.addWidget(self.save_btn)
 
@@ -281,18 +850,7 @@ class DoctorPortalUI(QWidget):
 
         self.logout_btn = QPushButton("Log Out")
         self.logout_btn.setFixedSize(100, 36)
-        self.logout_btn.setStyleSheet("""
-            QPushButton {
-                background-color: #e05a4f;
-                color: white;
-                border-radius: 6px;
-                font-weight: bold;
-                padding: 6px 12px;
-            }
-            QPushButton:hover {
-                background-color: #c94b41;
-            }
-        """)
+        set_role(self.logout_btn, "danger")
         self.logout_btn.clicked.connect(self.on_logout)
         logout_row.addWidget(self.logout_btn)
         right_v.addLayout(logout_row)
@@ -306,6 +864,33 @@ class DoctorPortalUI(QWidget):
         main_layout.addWidget(container)
         self.setLayout(main_layout)
 
+    def _apply_shadow(self, widget, **kwargs):
+        """Shadows are cosmetic: in fast-startup mode they are applied after the first paint."""
+        if FAST_STARTUP and self.startup is not None:
+            self.startup.defer(apply_shadow, widget, **kwargs)
+        else:
+            apply_shadow(widget, **kwargs)
+
+    def initialize_db_in_background(self):
+        """Fast startup: run schema migrations on a worker thread; Load/Save wait until they finish."""
+        self.load_btn.setEnabled(False)
+        self.save_btn.setEnabled(False)
+        self.show_notification("Connecting to the database…", "#888")
+        self.query_executor.submit(
+            initialize_db,
+            on_result=lambda _: self._on_db_initialized(),
+            on_error=lambda error: self._on_db_initialized(error), channel="startup"
+        )
+
+    def _on_db_initialized(self, error=None):
+        if error is not None:
+            print(f"Error initializing database: {error}")
+        self.load_btn.setEnabled(True)
+        self.save_btn.setEnabled(True)
+        self.show_notification("")
+        if CHANGE_FEED:
+            start_change_feed()
+
     
     #  LOGIC & ACTIONS 
     
@@ -313,151 +898,243 @@ class DoctorPortalUI(QWidget):
     def show_notification(self, text, color="#888"):
         """Display notification text with color."""
         self.notification_label.setText(text)
-        self.notification_label.setStyleSheet(f"color: {color}; font-size: 11px;")
-
-    def _create_history_card(self, rec):
-        """Create a small card widget showing past prescription info."""
-        card = QFrame()
-        card.setStyleSheet("border: 1px solid #ddd; border-radius: 8px; background: #fff;")
-
-        vbox = QVBoxLayout(card)
-        vbox.setContentsMargins(10, 10, 10, 10)
-        vbox.setSpacing(6)
-
-        pid = rec.get("prescription_id", "")
-        date = rec.get("created_at", "")
-        note = (rec.get("condition_notes") or "")
-        presc_full = (rec.get("prescription") or "")
-
-        note_preview = note[:120]
-        presc_preview = presc_full[:120]
-
-        info = QLabel(
-            f"<b>ID:</b> {pid} | <b>Date:</b> {date}<br>"
-            f"<b>Notes:</b> {note_preview}<br>"
-            f"<b>Prescription:</b> {presc_preview}"
+        set_property(self.notification_label, "tone", notification_tone(color))
+
+    def populate_history(self, records, has_more=False):
+        """Show the first page of records in the history list."""
+        self.hist_label.setText("Patient History")
+        self.showing_search_results = False
+        with TRACER.span("ui.populate_history", rows=len(records or [])):
+            self.history_view.set_records(records, has_more)
+
+    def _load_older_history(self, last_record):
+        """Fetch the next (older) history page once the list scrolls near its end."""
+        self.query_executor.submit(
+            fetch_history_page, self.current_patient_uid, last_record,
+            on_result=lambda page: self.history_view.append_records(*page),
+            on_error=self._on_history_page_failed, channel="history_page"
         )
-        info.setWordWrap(True)
-        vbox.addWidget(info)
-
-        # Edit Button
-        edit_btn = QPushButton("✏ Edit")
-        edit_btn.setFixedWidth(68)
-        edit_btn.setStyleSheet("""
-            QPushButton {
-                background-color: #2b78f6;
-                color: white;
-                border-radius: 6px;
-                padding: 4px 6px;
-                font-size: 11px;
-            }
-            QPushButton:hover {
-                background-color: #1f5fd6;
-            }
-        """)
-        edit_btn.clicked.connect(lambda _, r=rec: self._on_edit_history_record(r))
-        vbox.addWidget(edit_btn, alignment=Qt.AlignRight)
-
-        return card
-
-    def populate_history(self, records):
-        """Fill history scroll area with record cards."""
-        for i in reversed(range(self.history_layout.count())):
-            widget = self.history_layout.itemAt(i).widget()
-            if widget:
-                widget.deleteLater()
-
-        if not records:
-            no_data = QLabel("No patient data found.")
-            no_data.setStyleSheet("color:#888;")
-            self.history_layout.addWidget(no_data)
-            return
-
-        for rec in records:
-            card = self._create_history_card(rec)
-            self.history_layout.addWidget(card)
 
-        self.history_layout.addStretch()
+    def _on_history_page_failed(self, error):
+        self.history_view.history_model.fetch_failed()
+        print(f"Error loading older history: {error}")
 
     #  Record Editing 
 
     def _on_edit_history_record(self, rec):
+        """Fetch the full record behind a history card, then load it into edit mode."""
+        if LOCAL_KEY in rec:
+            # Offline-first records come from the local store and are already complete
+            self._begin_edit(get_local_store().get(rec[LOCAL_KEY]))
+            return
+        self.query_executor.submit(
+            fetch_prescription, rec.get("prescription_id"),
+            on_result=self._begin_edit, on_error=self._on_load_failed, channel="edit"
+        )
+
+    def _begin_edit(self, rec):
         """Load selected record into edit mode."""
+        if not rec:
+            self.show_notification("That record no longer exists.", "#c00")
+            return
         try:
             self.current_edit_prescription_id = rec.get("prescription_id")
+            self.current_edit_version = rec.get("version")
+            self.current_edit_local_key = rec.get(LOCAL_KEY)
             self.uid_input.setText(rec.get("patient_uid") or "")
-            presc = rec.get("prescription") or ""
-            presc_stripped = self._strip_doctor_signature(presc)
             self.notes_edit.setPlainText(rec.get("condition_notes") or "")
-            self.prescription_edit.setPlainText(presc_stripped)
+            self.prescription_edit.setPlainText(rec.get("prescription") or "")
             self.show_notification(
-                f"Loaded record ID {self.current_edit_prescription_id} for editing.",
+                f"Loaded record ID {self.current_edit_prescription_id or '(not yet synced)'} for editing.",
                 "#20b54b"
             )
         except Exception as e:
             print("Error loading record for edit:", e)
 
-    def _strip_doctor_signature(self, presc_text):
-        """Remove doctor signature from prescription text if present."""
-        if not presc_text:
-            return presc_text
-        idx = presc_text.rfind("\n\n—")
-        if idx != -1:
-            return presc_text[:idx].rstrip()
-        return presc_text
-
     #  Load Patient 
 
     def on_load_patient(self):
-        """Load patient data and populate history."""
+        """Load patient data and populate history. The query runs off the GUI thread."""
         self.current_edit_prescription_id = None
+        self.current_edit_version = None
+        self.current_edit_local_key = None
+        self.history_streamed_uid = None
         uid = self.uid_input.text().strip()
 
         if not uid:
             return
 
-        conn = get_connection()
-        if not conn:
+        self.current_patient_uid = uid
+        self.query_executor.cancel("load")
+        self.query_executor.cancel("history_page")
+        self.query_executor.cancel("search")
+
+        if OFFLINE_FIRST:
+            self._load_from_local_store(uid)
             return
 
-        try:
-            cur = conn.cursor(dictionary=True)
-            cur.execute(
-                "SELECT * FROM prescriptions WHERE patient_uid = %s ORDER BY created_at DESC", (uid,)
+        cached = HISTORY_CACHE.get(uid)
+        if cached is not None:
+            self._on_patient_loaded(cached.as_result())
+            return
+
+        self.show_notification("Loading patient…", "#888")
+        # Submitting on the "load" channel drops the result of any Load still in flight.
+        self.query_executor.submit(
+            fetch_patient_history, uid,
+            on_result=self._on_patient_loaded, on_error=self._on_load_failed, channel="load"
+        )
+
+    def _on_patient_loaded(self, result):
+        """Render history fetched by fetch_patient_history (runs on the GUI thread)."""
+        records, has_more, latest = result
+        self.populate_history(records, has_more)
+
+        if latest:
+            self.last_condition = latest.get("condition_notes") or ""
+            self.last_prescription = latest.get("prescription") or ""
+            self.notes_edit.setPlainText(self.last_condition)
+            self.prescription_edit.setPlainText(self.last_prescription)
+            self.show_notification(
+                "Loaded latest record (not in edit-mode). Click Edit on a card to edit.", "#666"
             )
-            records = cur.fetchall()
-            cur.close()
-            conn.close()
+        else:
+            self.last_condition = ""
+            self.last_prescription = ""
+            self.notes_edit.clear()
+            self.prescription_edit.clear()
+            self.show_notification("No patient data found — ready to create new.", "#666")
+
+    def _on_load_failed(self, error):
+        print(f"Error loading patient: {error}")
+        self.show_notification("Could not load patient — check the database connection.", "#c00")
+
+    def _load_from_local_store(self, uid):
+        """Offline-first: render the local replica at once, then pull newer rows in the background."""
+        records = get_local_store().history(uid)
+        if records:
+            self._on_patient_loaded((records, False, records[0]))
+        else:
+            self.show_notification("Loading patient…", "#888")
+        # Nothing local yet: show the newest cards as soon as the first chunk is stored
+        on_chunk = None if records else (
+            lambda pulled: self.query_executor.post(self._on_local_history_chunk, uid, pulled))
+        self.query_executor.submit(
+            refresh_local_history, uid, on_chunk,
+            on_result=lambda changed: self._on_local_history_refreshed(uid, changed, not records),
+            on_error=lambda error: self._on_local_refresh_failed(uid, error, not records),
+            channel="load"
+        )
 
+    def _on_local_history_chunk(self, uid, pulled):
+        """First load from the server: render the newest chunk, then just count the rest."""
+        if uid != self.current_patient_uid:
+            return
+        if self.history_streamed_uid != uid:
+            self.history_streamed_uid = uid
+            records = get_local_store().history(uid)
+            self._on_patient_loaded((records, False, records[0] if records else None))
+        self.show_notification(f"Loading history… {pulled:,} records so far", "#888")
+
+    def _on_local_history_refreshed(self, uid, changed, first_load):
+        if uid != self.current_patient_uid:
+            return
+        records = get_local_store().history(uid)
+        if first_load and self.history_streamed_uid != uid:
+            self._on_patient_loaded((records, False, records[0] if records else None))
+        elif changed:
+            # Refresh only the list: the doctor may already be typing
             self.populate_history(records)
+            if first_load:
+                self.show_notification(f"Loaded {len(records):,} records. Click Edit on a card to edit.", "#666")
+
+    def _on_local_refresh_failed(self, uid, error, first_load):
+        print(f"Working offline — could not refresh patient {uid}: {error}")
+        if first_load and self.history_streamed_uid == uid:
+            self.show_notification("Offline — only part of this patient's history was loaded.", "#c00")
+        elif first_load and uid == self.current_patient_uid:
+            self._on_patient_loaded(([], False, None))
+            self.show_notification("Offline — no local history for this patient yet.", "#c00")
+
+    #  Patient UID Typeahead 
+
+    def refresh_uid_index(self):
+        """Fold UIDs saved since the last refresh into the typeahead (the first call loads them all)."""
+        if self.query_executor.is_pending("uid_index"):
+            return
+        self.query_executor.submit(
+            fetch_uid_delta, UID_INDEX.watermark,
+            on_result=lambda delta: UID_INDEX.merge(*delta),
+            on_error=lambda error: print(f"Could not refresh the patient UID index: {error}"),
+            channel="uid_index"
+        )
 
-            if records:
-                latest = records[0]
-                self.last_condition = latest.get("condition_notes") or ""
-                self.last_prescription = self._strip_doctor_signature(latest.get("prescription") or "")
-                self.notes_edit.setPlainText(self.last_condition)
-                self.prescription_edit.setPlainText(self.last_prescription)
-                self.show_notification(
-                    "Loaded latest record (not in edit-mode). Click Edit on a card to edit.", "#666"
-                )
-            else:
-                self.last_condition = ""
-                self.last_prescription = ""
-                self.notes_edit.clear()
-                self.prescription_edit.clear()
-                self.show_notification("No patient data found — ready to create new.", "#666")
+    #  Search 
 
-        except Exception as e:
-            print(f"Error loading patient: {e}")
+    def on_search(self):
+        """Search the loaded patient's records (or everyone's) and list the best matches."""
+        text = self.search_input.text().strip()
+        if not text:
+            self.query_executor.cancel("search")
+            self._restore_history()
+            return
+        if not boolean_query(text):
+            self.show_notification(f"Search words need at least {MIN_TERM_CHARS} letters.", "#c00")
+            return
+
+        # Without a loaded patient the search covers every patient
+        uid = None if self.search_all_check.isChecked() else self.current_patient_uid
+        self.query_executor.cancel("load")
+        self.query_executor.cancel("history_page")
+        self.show_notification("Searching…", "#888")
+        self.query_executor.submit(
+            search_prescriptions, text, uid,
+            on_result=lambda records: self._on_search_done(text, uid, records),
+            on_error=self._on_search_failed, channel="search"
+        )
+
+    def _on_search_done(self, text, uid, records):
+        self.hist_label.setText("Search Results")
+        self.showing_search_results = True
+        self.history_view.set_records(records, empty_text="No matching prescriptions.", fields=SEARCH_FIELDS)
+        scope = f"patient {uid}" if uid else "all patients"
+        self.show_notification(f"{len(records)} match(es) for \"{text}\" in {scope}.", "#666")
+
+    def _restore_history(self):
+        """Back from search results to the current patient's history, leaving the editors alone."""
+        uid = self.current_patient_uid
+        if not uid:
+            self.populate_history([])
+            return
+        if OFFLINE_FIRST:
+            self.populate_history(get_local_store().history(uid))
+            return
+        cached = HISTORY_CACHE.get(uid)
+        if cached is not None:
+            records, has_more, _ = cached.as_result()
+            self.populate_history(records, has_more)
+            return
+        self.query_executor.submit(
+            fetch_patient_history, uid,
+            on_result=lambda result: self.populate_history(result[0], result[1]),
+            on_error=self._on_load_failed, channel="load"
+        )
+
+    def _on_search_failed(self, error):
+        print(f"Error searching prescriptions: {error}")
+        self.show_notification("Search failed — check the database connection.", "#c00")
 
     #  Save Prescription 
 
     def on_save_prescription(self):
-        """Save or update prescription record in database."""
+        """Save or update prescription record in database. The write runs off the GUI thread."""
         uid = self.uid_input.text().strip()
         notes = self.notes_edit.toPlainText().strip()
         presc = self.prescription_edit.toPlainText().strip()
         doctor_name = self.doctor_name_label.text().strip() or "Unknown"
+        edit_id = self.current_edit_prescription_id
+        edit_version = self.current_edit_version
+        edit_key = self.current_edit_local_key
 
         if not uid:
             self.show_notification("Enter a patient UID.", "#c00")
@@ -467,69 +1144,185 @@ class DoctorPortalUI(QWidget):
             self.show_notification("Please enter notes or prescription.", "#c00")
             return
 
-        conn = get_connection()
-        if not conn:
+        if not edit_id and not edit_key and notes == self.last_condition and presc == self.last_prescription and self.last_condition != "":
+            self.show_notification("No new changes — prescription not saved.", "#c00")
             return
 
-        try:
-            cur = conn.cursor()
+        if OFFLINE_FIRST:
+            self._save_to_local_store(uid, notes, presc, doctor_name, edit_key)
+            return
 
-            if self.current_edit_prescription_id:
+        if WRITE_BEHIND and not edit_id:
+            self._queue_prescription(uid, notes, presc, doctor_name)
+            return
 
-                # Update existing record 
+        self.save_btn.setEnabled(False)
+        self.query_executor.submit(
+            save_prescription_record, uid, notes, presc, doctor_name, edit_id, edit_version,
+            on_result=lambda record: self._on_prescription_saved(uid, edit_id, record, notes, presc),
+            on_error=self._on_save_failed
+        )
 
-                final_presc = presc + f"\n\n— {doctor_name}"
-                cur.execute("""
-                    UPDATE prescriptions
-                    SET condition_notes = %s, prescription = %s, doctor_name = %s
-                    WHERE prescription_id = %s
-                """, (notes, final_presc, doctor_name, self.current_edit_prescription_id))
-                conn.commit()
+    def _on_prescription_saved(self, uid, edit_id, record, notes, presc):
+        """Patch the saved record into the history list in place instead of reloading the patient."""
+        self.save_btn.setEnabled(True)
+        self.last_condition = notes
+        self.last_prescription = presc
+        if edit_id:
+            self.current_edit_prescription_id = None
+            self.current_edit_version = None
+            self.history_view.update_record(record)
+            self.show_notification("Record updated successfully.", "#20b54b")
+            return
 
-                self.show_notification("Record updated successfully.", "#20b54b")
-                self.current_edit_prescription_id = None
-                self.on_load_patient()
+        UID_INDEX.add(uid)
+        if uid != self.current_patient_uid:
+            self.on_load_patient()  # the list shows another patient: switch to this one
+        elif not self.showing_search_results:
+            self.history_view.prepend_record(record)
+        self.show_notification("Prescription saved successfully.", "#20b54b")
+
+    def _queue_prescription(self, uid, notes, presc, doctor_name):
+        """Hand a new prescription to the write-behind queue; the outcome arrives per record."""
+        self.last_condition = notes
+        self.last_prescription = presc
+        self.show_notification("Prescription queued — saving…", "#888")
+        get_write_queue().submit(
+            (uid, notes, presc, doctor_name),
+            # Runs on the flush thread; post back to the GUI thread
+            callback=lambda record_id, error: self.query_executor.post(
+                self._on_queued_insert_done, uid, record_id, error
+            )
+        )
 
+    def _on_queued_insert_done(self, uid, record_id, error):
+        if isinstance(error, CommitOutcomeUnknownError):
+            print(f"Queued prescription for {uid}: {error}")
+            self.show_notification(f"Prescription for patient {uid} may not have been saved. "
+                                   f"Reload the patient to check before saving it again.", "#c00")
+            return
+        if error is not None:
+            print(f"Error saving queued prescription for {uid}: {error}")
+            self.show_notification(f"Could not save prescription for patient {uid}.", "#c00")
+            return
+        self.show_notification(f"Prescription {record_id} saved successfully.", "#20b54b")
+        UID_INDEX.add(uid)
+        # Patch only the list: the doctor may already be typing the next prescription.
+        if uid == self.current_patient_uid and not self.showing_search_results:
+            cached = HISTORY_CACHE.get(uid)
+            records = cached.records if cached is not None else []
+            record = next((rec for rec in records if rec["prescription_id"] == record_id), None)
+            if record is not None:
+                self.history_view.prepend_record(record)
             else:
+                # Not cached (expired, evicted, or write-through failed): read it back by id
+                self.query_executor.submit(
+                    fetch_prescription, record_id,
+                    on_result=lambda rec: self._prepend_saved_record(uid, rec),
+                    on_error=lambda e: print(f"Error fetching saved prescription {record_id}: {e}")
+                )
 
-                #  Insert new record 
-
-                if notes == self.last_condition and presc == self.last_prescription and self.last_condition != "":
-                    self.show_notification("No new changes — prescription not saved.", "#c00")
-                else:
-                    final_presc = presc + f"\n\n— {doctor_name}"
-
-                    try:
-                        cur.execute("""
-                            INSERT INTO prescriptions (patient_uid, condition_notes, prescription, doctor_name)
-                            VALUES (%s, %s, %s, %s)
-                        """, (uid, notes, final_presc, doctor_name))
-                    except mysql.connector.errors.ProgrammingError:
-                        # Auto add missing created_at column
-                        try:
-                            cur.execute("""
-                                ALTER TABLE prescriptions
-                                ADD COLUMN created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-                            """)
-                        except Exception:
-                            pass
-
-                        cur.execute("""
-                            INSERT INTO prescriptions (patient_uid, condition_notes, prescription, doctor_name)
-                            VALUES (%s, %s, %s, %s)
-                        """, (uid, notes, final_presc, doctor_name))
-
-                    conn.commit()
-                    self.show_notification("Prescription saved successfully.", "#20b54b")
-                    self.on_load_patient()
-                    self.last_condition = notes
-                    self.last_prescription = presc
-
-            cur.close()
-            conn.close()
+    def _prepend_saved_record(self, uid, record):
+        if record is not None and uid == self.current_patient_uid and not self.showing_search_results:
+            self.history_view.prepend_record(record)
 
+    def _save_to_local_store(self, uid, notes, presc, doctor_name, edit_key):
+        """Offline-first save: commit locally (no network involved) and let the sync worker push it."""
+        store = get_local_store()
+        fields = {"condition_notes": notes, "prescription": presc, "doctor_name": doctor_name}
+        try:
+            if edit_key:
+                store.update(edit_key, fields)
+            else:
+                store.insert(uid, dict(fields, patient_uid=uid))
+                UID_INDEX.add(uid)
         except Exception as e:
-            print(f"Error saving/updating record: {e}")
+            print(f"Error saving to the local store: {e}")
+            self.show_notification("Could not save prescription locally.", "#c00")
+            return
+        get_sync_worker().poke()
+
+        # The local reload is synchronous, so notify afterwards or it would be overwritten
+        self.on_load_patient()
+        if edit_key:
+            self.show_notification("Record updated — syncing in the background.", "#20b54b")
+        else:
+            self.show_notification("Prescription saved — syncing in the background.", "#20b54b")
+            self.last_condition = notes
+            self.last_prescription = presc
+
+    def _on_local_synced(self):
+        """The sync worker pushed local rows; refresh the list so they show their server IDs."""
+        if self.current_patient_uid:
+            self.populate_history(get_local_store().history(self.current_patient_uid))
+
+    def _on_local_conflicts(self, keys):
+        """Offline edits the server refused because another doctor saved those records first."""
+        self.show_notification(
+            f"{len(keys)} offline edit(s) clashed with changes saved by another doctor. "
+            "Your text is kept here; open and save it again to replace theirs.", "#c00"
+        )
+
+    def _on_edit_conflict(self, error):
+        """Someone saved this record first: keep the doctor's text, show the other change in the list."""
+        current = error.current
+        if current is None:
+            self.current_edit_prescription_id = None
+            self.current_edit_version = None
+            self.show_notification(
+                f"Record {error.record_id} was deleted meanwhile — save again to store this as a new prescription.",
+                "#c00"
+            )
+            return
+        # Saving again now overwrites the other change knowingly
+        self.current_edit_version = current.get("version")
+        HISTORY_CACHE.record_updated(current)
+        self.history_view.update_record(current)
+        self.show_notification(
+            f"Record {error.record_id} was changed by {current.get('doctor_name') or 'another doctor'} "
+            "while you were editing (see the list). Save again to replace it with your text.", "#c00"
+        )
+
+    #  Change Feed 
+
+    def _on_remote_change(self, event):
+        """A prescription was saved somewhere (possibly here): patch it in without re-querying the patient."""
+        if event.op == "insert":
+            UID_INDEX.add(event.patient_uid)
+        if event.patient_uid != self.current_patient_uid:
+            HISTORY_CACHE.invalidate(event.patient_uid)  # refetched if that patient is opened
+            return
+        self.query_executor.submit(
+            fetch_changed_prescription, event.patient_uid, event.prescription_id, event.op,
+            on_result=lambda record: self._apply_remote_change(event, record),
+            on_error=lambda error: print(f"Error fetching changed prescription: {error}")
+        )
+
+    def _apply_remote_change(self, event, record):
+        if record is None or event.patient_uid != self.current_patient_uid:
+            return
+        if OFFLINE_FIRST:
+            self.populate_history(get_local_store().history(event.patient_uid))
+        elif not self.showing_search_results:
+            if event.op == "insert":
+                # The model, not the view: no scrolling away from what the doctor is reading
+                self.history_view.history_model.prepend_record(record)
+            else:
+                self.history_view.update_record(record)
+        if (event.prescription_id == self.current_edit_prescription_id
+                and record.get("version") != self.current_edit_version):
+            self.show_notification(
+                f"Record {event.prescription_id} was just changed by {record.get('doctor_name') or 'another doctor'}"
+                " while you are editing it; saving will report the conflict.", "#c00"
+            )
+
+    def _on_save_failed(self, error):
+        self.save_btn.setEnabled(True)
+        if isinstance(error, EditConflictError):
+            self._on_edit_conflict(error)
+            return
+        print(f"Error saving/updating record: {error}")
+        self.show_notification("Could not save — check the database connection.", "#c00")
 
     # -------------------- Other Actions --------------------
 
@@ -541,6 +1334,15 @@ class DoctorPortalUI(QWidget):
         """Handle back navigation."""
         self.close()
 
+    def closeEvent(self, event):
+        """Make sure queued prescriptions reach the database before the window goes away."""
+        if _write_queue is not None:
+            _write_queue.flush(timeout=10)
+        if _sync_worker is not None:
+            _sync_worker.stop()  # unsynced rows stay in the local store for the next start
+        CHANGE_BROKER.unsubscribe(self.change_subscription)
+        super().closeEvent(event)
+
 
 
 # MERGE / EXTENSION SUPPORT 
@@ -564,8 +1366,20 @@ def merge_with_external_module(external_module_function):
 # ENTRY POINT 
 
 def main():
+    startup = StartupProfiler(_STARTUP_T0, report_path=STARTUP_REPORT_PATH)
+    startup.mark("imports")
+    if TRACING:
+        configure_tracing(trace_file=TRACE_FILE, metrics_port=METRICS_PORT, slow_query_ms=SLOW_QUERY_MS)
+    if not FAST_STARTUP:
+        initialize_db()  # Run pending schema migrations before launching UI
+        startup.mark("migrations")
     app = QApplication(sys.argv)
-    window = DoctorPortalUI()
+    startup.mark("qapplication")
+    window = DoctorPortalUI(startup)
+    startup.mark("init_ui")
+    if FAST_STARTUP:
+        startup.defer(window.initialize_db_in_background)
+    startup.watch_first_paint(window)
     window.show()
     sys.exit(app.exec_())
 
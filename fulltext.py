@@ -0,0 +1,38 @@
+"""
+Full-text search helpers shared by the Doctor Portal variants.
+
+Each variant keeps a MySQL FULLTEXT index over its condition-notes and
+prescription columns (added by a schema migration). InnoDB updates that index
+as each save commits, so a prescription is searchable right after it is saved
+without any reindexing step. The variants run their own ranked
+MATCH ... AGAINST query; this module turns what the doctor typed into a safe
+BOOLEAN MODE search string.
+"""
+import re
+
+MIN_TERM_CHARS = 3     # innodb_ft_min_token_size: shorter words are not in the index
+MAX_TERMS = 8
+SEARCH_LIMIT = 50      # ranked results shown per search
+
+# InnoDB's default stopwords are not indexed, so requiring one would match nothing
+INNODB_STOPWORDS = frozenset("""
+    a about an are as at be by com de en for from how i in is it la of on or that
+    the this to was what when where who will with und www
+""".split())
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def boolean_query(text):
+    """
+    "amoxi 500mg" -> "+amoxi* +500mg*": every word must match, as a prefix, so a
+    partly typed drug name still finds it. Operators the doctor typed are dropped
+    rather than passed through, and stopwords are skipped. Returns "" when nothing
+    is left to search for.
+    """
+    terms = []
+    for word in _WORD.findall(text or ""):
+        word = word.lower()
+        if len(word) >= MIN_TERM_CHARS and word not in INNODB_STOPWORDS and word not in terms:
+            terms.append(word)
+    return " ".join(f"+{term}*" for term in terms[:MAX_TERMS])
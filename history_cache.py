@@ -0,0 +1,127 @@
+"""
+In-process LRU cache of patient histories, keyed by patient UID.
+
+Entries hold what the history list has loaded so far (the preview pages, the
+keyset "has more" flag and the full latest record). Saves write the committed
+row straight into the cached list, so reloading a patient after a save — or
+flipping back to a recently viewed patient — needs no MySQL round-trip.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_MAX_ENTRIES = 64
+DEFAULT_TTL = 300  # seconds; bounds how stale another doctor's changes can look
+
+
+class HistoryEntry:
+    """Snapshot of one patient's cached history."""
+
+    __slots__ = ("records", "has_more", "latest", "stored_at")
+
+    def __init__(self, records, has_more, latest, stored_at):
+        self.records = records
+        self.has_more = has_more
+        self.latest = latest
+        self.stored_at = stored_at
+
+    def as_result(self):
+        """Same shape as fetch_patient_history(): (records, has_more, latest)."""
+        return list(self.records), self.has_more, self.latest
+
+
+class HistoryCache:
+    """
+    Thread-safe LRU + TTL cache. id_key is the variant's primary-key column
+    (e.g. "prescription_id" or "Pr_ID").
+    """
+
+    def __init__(self, id_key, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL):
+        self.id_key = id_key
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # -------------------- READ --------------------
+    def get(self, uid):
+        """Return a HistoryEntry copy for uid, or None on a miss or expired entry."""
+        with self._lock:
+            entry = self._entries.get(uid)
+            if entry is not None and self.ttl and time.monotonic() - entry.stored_at > self.ttl:
+                del self._entries[uid]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(uid)
+            self.hits += 1
+            return HistoryEntry(list(entry.records), entry.has_more, entry.latest, entry.stored_at)
+
+    # -------------------- FILL --------------------
+    def put(self, uid, records, has_more, latest):
+        """Store a freshly fetched first page."""
+        with self._lock:
+            self._entries[uid] = HistoryEntry(list(records), has_more, latest, time.monotonic())
+            self._entries.move_to_end(uid)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def extend(self, uid, before, records, has_more):
+        """Append an older page, but only if it continues exactly where the cached list ends."""
+        with self._lock:
+            entry = self._entries.get(uid)
+            if entry is None or not entry.records or before is None:
+                return
+            if entry.records[-1][self.id_key] != before[self.id_key]:
+                return
+            entry.records.extend(records)
+            entry.has_more = has_more
+
+    # -------------------- WRITE-THROUGH --------------------
+    def record_inserted(self, uid, record):
+        """Prepend a just-inserted row to uid's cached history (no-op when uid is not cached)."""
+        with self._lock:
+            entry = self._entries.get(uid)
+            if entry is None:
+                return False
+            entry.records.insert(0, record)
+            entry.latest = record
+            return True
+
+    def record_updated(self, record):
+        """Merge a just-updated row into whichever cached history holds it."""
+        record_id = record[self.id_key]
+        with self._lock:
+            for entry in self._entries.values():
+                for i, rec in enumerate(entry.records):
+                    if rec[self.id_key] == record_id:
+                        entry.records[i] = dict(rec, **record)
+                        if entry.latest is not None and entry.latest.get(self.id_key) == record_id:
+                            entry.latest = dict(entry.latest, **record)
+                        return True
+            return False
+
+    def invalidate(self, uid=None):
+        """Drop one patient's history, or everything when uid is None."""
+        with self._lock:
+            if uid is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(uid, None)
+
+    # -------------------- STATS --------------------
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,344 @@
+"""
+Virtualized patient-history list for the Doctor Portal.
+
+Instead of one QFrame + QLabel + QPushButton per prescription, the history is a
+QListView over a plain list of records. HistoryCardDelegate paints each card
+(and its Edit button) on demand, so only the rows currently scrolled into view
+cost anything, no matter how long a patient's history is. The delegate keeps
+the laid-out text of recently painted cards, so scrolling back and forth or
+flipping between patients re-binds a card instead of re-measuring it.
+"""
+from collections import OrderedDict
+
+from PyQt5.QtCore import Qt, QAbstractListModel, QModelIndex, QRect, QRectF, QSize, QEvent, pyqtSignal
+from PyQt5.QtGui import QFont, QFontMetrics, QPainter, QPen
+from PyQt5.QtWidgets import QListView, QStyledItemDelegate, QStyle, QAbstractItemView
+
+import theme
+from tracing import TRACER
+
+RecordRole = Qt.UserRole + 1
+
+PREVIEW_CHARS = 120
+MAX_CACHED_CARDS = 512   # laid-out cards kept by the delegate (a few screens' worth per patient)
+
+
+class HistoryListModel(QAbstractListModel):
+    """
+    List model over prescription records (dicts as returned by the portal queries).
+
+    fields maps the card slots to the variant's column names, e.g.
+    {"id": "Pr_ID", "date": "Created_At", "notes": "Condition_Notes", "prescription": "Prescription"}.
+    A slot mapped to None is not shown. Search results may map an extra "patient"
+    slot, which adds the patient's UID to each card header.
+
+    Older pages are pulled in through Qt's canFetchMore()/fetchMore(): when the
+    view scrolls near the end, fetch_more_handler(last_record) is called and the
+    caller answers later with append_records() (or fetch_failed()).
+    """
+
+    def __init__(self, fields, parent=None):
+        super().__init__(parent)
+        self.base_fields = fields
+        self.fields = fields
+        self._records = []
+        self.has_more = False
+        self.fetch_more_handler = None
+        self._fetching = False
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._records)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or not 0 <= index.row() < len(self._records):
+            return None
+        rec = self._records[index.row()]
+        if role == RecordRole:
+            return rec
+        if role == Qt.DisplayRole:
+            return self.preview(rec, "notes")
+        return None
+
+    def set_records(self, records, has_more=False, fields=None):
+        """Replace the whole list (first page). fields overrides the slot mapping for this list only."""
+        self.beginResetModel()
+        self.fields = fields or self.base_fields
+        self._records = list(records or [])
+        self.has_more = has_more
+        self._fetching = False
+        self.endResetModel()
+
+    def append_records(self, records, has_more):
+        """Append an older page fetched through fetch_more_handler."""
+        self._fetching = False
+        self.has_more = has_more
+        if records:
+            first = len(self._records)
+            self.beginInsertRows(QModelIndex(), first, first + len(records) - 1)
+            self._records.extend(records)
+            self.endInsertRows()
+
+    def prepend_record(self, record):
+        """Add a just-saved record at the top (newest first) without resetting the list."""
+        if self.update_record(record):
+            return  # already listed, e.g. a reload raced the save
+        self.beginInsertRows(QModelIndex(), 0, 0)
+        self._records.insert(0, record)
+        self.endInsertRows()
+
+    def update_record(self, record):
+        """Merge a just-updated record into its row, matched by id. False when it is not listed."""
+        id_column = self.fields.get("id")
+        record_id = record.get(id_column)
+        for row, rec in enumerate(self._records):
+            if rec.get(id_column) == record_id:
+                self._records[row] = dict(rec, **record)
+                index = self.index(row)
+                self.dataChanged.emit(index, index)
+                return True
+        return False
+
+    def fetch_failed(self):
+        """Allow a new fetchMore() after a page request failed."""
+        self._fetching = False
+
+    def canFetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return False
+        return self.has_more and not self._fetching and self.fetch_more_handler is not None
+
+    def fetchMore(self, parent=QModelIndex()):
+        if not self.canFetchMore(parent):
+            return
+        self._fetching = True
+        self.fetch_more_handler(self._records[-1] if self._records else None)
+
+    def record(self, row):
+        return self._records[row]
+
+    def records(self):
+        return self._records
+
+    def value(self, rec, slot):
+        column = self.fields.get(slot)
+        if column is None:
+            return None
+        return rec.get(column)
+
+    def preview(self, rec, slot):
+        """First PREVIEW_CHARS characters of a text column, flattened to one line."""
+        text = self.value(rec, slot) or ""
+        return " ".join(str(text)[:PREVIEW_CHARS].split())
+
+
+class HistoryCardDelegate(QStyledItemDelegate):
+    """Paints one history card per row and turns clicks on its Edit button into editRequested."""
+
+    editRequested = pyqtSignal(QModelIndex)
+
+    PADDING = 10
+    LINE_SPACING = 4
+    BUTTON_SIZE = QSize(68, 24)
+
+    def __init__(self, parent=None, primary_button=True):
+        super().__init__(parent)
+        # Palette keys (see theme.py), looked up at paint time so a theme switch applies at once
+        if primary_button:
+            self.button_colors = ("primary", "primary_border", "on_primary")
+        else:
+            self.button_colors = ("secondary", "secondary_hover", "on_secondary")
+        self.text_font = QFont()
+        self.bold_font = QFont(self.text_font)
+        self.bold_font.setBold(True)
+        self.button_font = QFont(self.text_font)
+        self.button_font.setPixelSize(11)
+        # Measured once per delegate rather than on every paint
+        self.bold_metrics = QFontMetrics(self.bold_font)
+        self.text_metrics = QFontMetrics(self.text_font)
+        self.line_height = self.bold_metrics.height()
+
+        self._layouts = OrderedDict()   # id(record) -> (record, width, fields, lines), LRU order
+        self.layout_hits = 0
+        self.layout_misses = 0
+
+    # -------------------- GEOMETRY --------------------
+    def sizeHint(self, option, index):
+        lines = 3
+        height = (2 * self.PADDING + lines * self.line_height + lines * self.LINE_SPACING
+                  + self.BUTTON_SIZE.height())
+        return QSize(option.rect.width(), height)
+
+    def _card_rect(self, option):
+        return option.rect.adjusted(0, 0, -1, -1)
+
+    def button_rect(self, option):
+        card = self._card_rect(option)
+        return QRect(
+            card.right() - self.PADDING - self.BUTTON_SIZE.width(),
+            card.bottom() - self.PADDING - self.BUTTON_SIZE.height(),
+            self.BUTTON_SIZE.width(),
+            self.BUTTON_SIZE.height(),
+        )
+
+    # -------------------- PAINTING --------------------
+    def paint(self, painter, option, index):
+        model = index.model()
+        if not 0 <= index.row() < model.rowCount():
+            return
+        # Straight from the model: data(RecordRole) would hand back a converted copy
+        rec = model.record(index.row())
+
+        painter.save()
+        painter.setRenderHint(QPainter.Antialiasing, True)
+
+        card = self._card_rect(option)
+        selected = bool(option.state & QStyle.State_Selected)
+        painter.setPen(QPen(theme.color("card_border"), 1))
+        painter.setBrush(theme.color("card_selected" if selected else "surface"))
+        painter.drawRoundedRect(QRectF(card), 8, 8)
+
+        x = card.left() + self.PADDING
+        width = card.width() - 2 * self.PADDING
+        y = card.top() + self.PADDING
+        line_h = self.line_height
+
+        painter.setPen(theme.color("text"))
+        for line in self._card_lines(model, rec, width):
+            for bold, dx, text in line:
+                painter.setFont(self.bold_font if bold else self.text_font)
+                painter.drawText(QRect(x + dx, y, max(0, width - dx), line_h), Qt.AlignLeft | Qt.AlignVCenter, text)
+            y += line_h + self.LINE_SPACING
+
+        # Edit button
+        normal, hover, text_color = self.button_colors
+        btn = self.button_rect(option)
+        painter.setPen(Qt.NoPen)
+        painter.setBrush(theme.color(hover if option.state & QStyle.State_MouseOver else normal))
+        painter.drawRoundedRect(QRectF(btn), 6, 6)
+        painter.setPen(theme.color(text_color))
+        painter.setFont(self.button_font)
+        painter.drawText(btn, Qt.AlignCenter, "✏ Edit")
+
+        painter.restore()
+
+    def _card_lines(self, model, rec, width):
+        """
+        The card's text lines as (bold, x offset, text) runs, already elided to width.
+        Cached per record object: records are replaced rather than mutated when they
+        change (see HistoryListModel.update_record), so a cached layout is never stale.
+        """
+        key = id(rec)
+        entry = self._layouts.get(key)
+        if entry is not None and entry[0] is rec and entry[1] == width and entry[2] is model.fields:
+            self._layouts.move_to_end(key)
+            self.layout_hits += 1
+            return entry[3]
+
+        self.layout_misses += 1
+        header = [("ID:", str(model.value(rec, "id") or ""))]
+        if model.fields.get("date"):
+            header.append(("| Date:", str(model.value(rec, "date") or "")))
+        if model.fields.get("patient"):
+            header.append(("| Patient:", str(model.value(rec, "patient") or "")))
+        lines = [
+            self._layout_fields(width, header),
+            self._layout_fields(width, [("Notes:", model.preview(rec, "notes"))]),
+            self._layout_fields(width, [("Prescription:", model.preview(rec, "prescription"))]),
+        ]
+        self._layouts[key] = (rec, width, model.fields, lines)
+        if len(self._layouts) > MAX_CACHED_CARDS:
+            self._layouts.popitem(last=False)
+        return lines
+
+    def _layout_fields(self, width, pairs):
+        """Lay out "<b>label</b> value" pairs on one line, eliding whatever does not fit."""
+        runs = []
+        x = 0
+        for label, value in pairs:
+            if x >= width:
+                break
+            runs.append((True, x, label))
+            x += self.bold_metrics.horizontalAdvance(label + " ")
+            shown = self.text_metrics.elidedText(value, Qt.ElideRight, max(0, width - x))
+            runs.append((False, x, shown))
+            x += self.text_metrics.horizontalAdvance(shown + " ")
+        return runs
+
+    # -------------------- INTERACTION --------------------
+    def editorEvent(self, event, model, option, index):
+        if (event.type() == QEvent.MouseButtonRelease and event.button() == Qt.LeftButton
+                and self.button_rect(option).contains(event.pos())):
+            self.editRequested.emit(index)
+            return True
+        return super().editorEvent(event, model, option, index)
+
+
+class HistoryView(QListView):
+    """
+    Drop-in replacement for the old history QScrollArea.
+
+    Emits editRequested(record) when a card's Edit button is clicked, or when a
+    row is activated (double-click / Enter). Set history_model.fetch_more_handler
+    to page in older records as the list nears its bottom.
+    """
+
+    editRequested = pyqtSignal(object)
+
+    PREFETCH_ROWS = 3   # start fetching the next page this many cards before the end
+
+    def __init__(self, fields, parent=None, primary_button=True):
+        super().__init__(parent)
+        self.history_model = HistoryListModel(fields, self)
+        self.card_delegate = HistoryCardDelegate(self, primary_button=primary_button)
+        self.setModel(self.history_model)
+        self.setItemDelegate(self.card_delegate)
+
+        # Every card has the same height, which lets Qt skip measuring rows it never shows.
+        self.setUniformItemSizes(True)
+        self.setSpacing(5)
+        self.setVerticalScrollMode(QAbstractItemView.ScrollPerPixel)
+        self.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.setMouseTracking(True)
+
+        self.empty_text = ""
+        self.card_delegate.editRequested.connect(self._emit_edit)
+        self.activated.connect(self._emit_edit)
+        self.verticalScrollBar().valueChanged.connect(self._maybe_fetch_more)
+
+    def set_records(self, records, has_more=False, empty_text="No patient data found.", fields=None):
+        self.empty_text = empty_text
+        self.history_model.set_records(records, has_more, fields)
+        self.scrollToTop()
+        self.viewport().update()
+
+    def append_records(self, records, has_more):
+        self.history_model.append_records(records, has_more)
+
+    def prepend_record(self, record):
+        self.history_model.prepend_record(record)
+        self.scrollToTop()
+
+    def update_record(self, record):
+        return self.history_model.update_record(record)
+
+    def _maybe_fetch_more(self, value):
+        """Qt only calls fetchMore() at the very bottom; start a little earlier so the next page is ready."""
+        bar = self.verticalScrollBar()
+        row_height = self.sizeHintForRow(0) if self.history_model.rowCount() else 0
+        if bar.maximum() - value <= self.PREFETCH_ROWS * row_height:
+            self.history_model.fetchMore(QModelIndex())
+
+    def _emit_edit(self, index):
+        if index.isValid():
+            self.setCurrentIndex(index)
+            self.editRequested.emit(self.history_model.record(index.row()))
+
+    def paintEvent(self, event):
+        with TRACER.span("ui.history_paint", rows=self.history_model.rowCount()):
+            super().paintEvent(event)
+        if self.history_model.rowCount() == 0 and self.empty_text:
+            painter = QPainter(self.viewport())
+            painter.setPen(theme.color("muted"))
+            painter.drawText(self.viewport().rect().adjusted(10, 10, -10, -10),
+                             Qt.AlignLeft | Qt.AlignTop, self.empty_text)
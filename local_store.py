@@ -0,0 +1,365 @@
+"""
+Offline-first local store for the Doctor Portal.
+
+Every save lands in a local SQLite database (WAL mode) first and is replayed
+to MySQL by a background SyncWorker, so a dropped connection never loses a
+prescription. Loads are served from the local replica and refreshed
+incrementally from the server using per-patient watermarks.
+
+An edit the server refuses because someone else saved the row first (see
+concurrency.py) is not retried: it is kept, in sync_state 'conflict', until the
+doctor saves it again.
+
+The store is schema-agnostic: records are kept as JSON in the portal's own
+column names, and the portal supplies the push/pull functions that talk to
+its MySQL schema.
+"""
+import json
+import sqlite3
+import threading
+import uuid
+from collections import namedtuple
+from datetime import datetime
+
+from concurrency import EditConflictError
+
+DEFAULT_SYNC_INTERVAL = 15  # seconds between background sync passes
+PENDING_BATCH = 100         # pending rows read per page during a sync pass
+
+LOCAL_KEY = "_local_key"     # injected into records read from the store
+
+# generation counts local edits, so a push can tell whether the row changed while it was in flight
+PendingRow = namedtuple("PendingRow", ["local_id", "key", "op", "record", "generation"])
+
+_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS local_prescriptions (
+        local_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        idempotency_key TEXT NOT NULL UNIQUE,
+        patient_uid TEXT NOT NULL,
+        remote_id INTEGER UNIQUE,
+        sort_ts TEXT NOT NULL DEFAULT '',
+        op TEXT NOT NULL DEFAULT 'insert',
+        sync_state TEXT NOT NULL DEFAULT 'synced',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        last_error TEXT,
+        generation INTEGER NOT NULL DEFAULT 0,
+        record TEXT NOT NULL
+    )""",
+    """CREATE INDEX IF NOT EXISTS idx_local_patient
+        ON local_prescriptions (patient_uid, sort_ts DESC, remote_id DESC)""",
+    """CREATE INDEX IF NOT EXISTS idx_local_pending
+        ON local_prescriptions (sync_state, local_id)""",
+    """CREATE TABLE IF NOT EXISTS sync_watermarks (
+        patient_uid TEXT PRIMARY KEY,
+        watermark TEXT
+    )""",
+]
+
+
+def _now():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _dumps(record):
+    return json.dumps({k: v for k, v in record.items() if k != LOCAL_KEY}, default=str)
+
+
+class LocalStore:
+    """
+    SQLite write-ahead store + read replica.
+
+    id_key   -- record key holding the server's primary key (e.g. "Pr_ID")
+    sort_key -- function(record) -> sortable text for synced rows (e.g. created_at);
+                pending rows always sort first
+    version_key -- record key holding the row version edits are checked against, if any
+    """
+
+    def __init__(self, path, id_key, sort_key=None, version_key=None):
+        self.path = path
+        self.id_key = id_key
+        self.sort_key = sort_key or (lambda rec: "")
+        self.version_key = version_key
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        for sql in _SCHEMA:
+            self._db.execute(sql)
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(local_prescriptions)")}
+        if "generation" not in columns:  # stores created before edits were counted
+            self._db.execute("ALTER TABLE local_prescriptions ADD COLUMN generation INTEGER NOT NULL DEFAULT 0")
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    # -------------------- LOCAL WRITES --------------------
+    def insert(self, uid, record):
+        """Record a new prescription locally (pending sync). Returns its idempotency key."""
+        key = str(uuid.uuid4())
+        record = dict(record)
+        record[self.id_key] = None
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO local_prescriptions (idempotency_key, patient_uid, sort_ts, op, sync_state, record) "
+                "VALUES (?, ?, ?, 'insert', 'pending', ?)",
+                (key, uid, _now(), _dumps(record))
+            )
+        return key
+
+    def update(self, key, changes):
+        """Apply an edit locally. A row that was never synced stays a pending insert."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT record, sync_state, op FROM local_prescriptions WHERE idempotency_key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return False
+            record = dict(json.loads(row[0]), **changes)
+            op = "insert" if row[1] == "pending" and row[2] == "insert" else "update"
+            self._db.execute(
+                "UPDATE local_prescriptions SET record = ?, op = ?, sync_state = 'pending', attempts = 0, "
+                "generation = generation + 1 WHERE idempotency_key = ?",
+                (_dumps(record), op, key)
+            )
+        return True
+
+    # -------------------- REPLICA READS --------------------
+    def history(self, uid):
+        """Every locally known record for a patient, newest first, pending rows on top."""
+        with self._lock:
+            rows = self._db.execute("""
+                SELECT idempotency_key, record FROM local_prescriptions
+                WHERE patient_uid = ?
+                ORDER BY (remote_id IS NULL) DESC, sort_ts DESC, remote_id DESC, local_id DESC
+            """, (uid,)).fetchall()
+        return [self._decode(key, record) for key, record in rows]
+
+    def get(self, key):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT idempotency_key, record FROM local_prescriptions WHERE idempotency_key = ?", (key,)
+            ).fetchone()
+        return self._decode(*row) if row else None
+
+    def _decode(self, key, record):
+        rec = json.loads(record)
+        rec[LOCAL_KEY] = key
+        return rec
+
+    # -------------------- SYNC BOOKKEEPING --------------------
+    def pending(self, limit=PENDING_BATCH, after=0):
+        """Rows still to be replayed to the server, local_id > after: [PendingRow] oldest first."""
+        with self._lock:
+            rows = self._db.execute("""
+                SELECT local_id, idempotency_key, op, record, generation FROM local_prescriptions
+                WHERE sync_state = 'pending' AND local_id > ? ORDER BY local_id LIMIT ?
+            """, (after, limit)).fetchall()
+        return [PendingRow(local_id, key, op, json.loads(record), generation)
+                for local_id, key, op, record, generation in rows]
+
+    def pending_count(self):
+        with self._lock:
+            return self._db.execute(
+                "SELECT COUNT(*) FROM local_prescriptions WHERE sync_state = 'pending'"
+            ).fetchone()[0]
+
+    def mark_synced(self, key, remote_id, server_record=None, generation=None):
+        """
+        Attach the server id (and the server's copy of the row, when given) after a push
+        of the row as it was at generation. Returns False when the row was edited again
+        meanwhile: it then keeps the newer edit and stays pending, with the server id (and
+        version) attached so the next pass replays the edit onto the same row.
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT record, generation FROM local_prescriptions WHERE idempotency_key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return False
+            if generation is not None and row[1] != generation:
+                record = json.loads(row[0])
+                record[self.id_key] = remote_id
+                if server_record and self.version_key:
+                    record[self.version_key] = server_record.get(self.version_key)
+                self._db.execute(
+                    "UPDATE local_prescriptions SET remote_id = ?, last_error = NULL, record = ? "
+                    "WHERE idempotency_key = ?",
+                    (remote_id, _dumps(record), key)
+                )
+                return False
+            record = dict(json.loads(row[0]), **(server_record or {}))
+            record[self.id_key] = remote_id
+            self._db.execute("""
+                UPDATE local_prescriptions
+                SET remote_id = ?, sync_state = 'synced', last_error = NULL, record = ?, sort_ts = ?
+                WHERE idempotency_key = ?
+            """, (remote_id, _dumps(record), self.sort_key(record), key))
+            return True
+
+    def mark_failed(self, key, error):
+        with self._lock:
+            self._db.execute(
+                "UPDATE local_prescriptions SET attempts = attempts + 1, last_error = ? WHERE idempotency_key = ?",
+                (str(error), key)
+            )
+
+    def mark_conflict(self, key, error, current=None):
+        """
+        The server refused an edit made against an older version of the row. The
+        doctor's text is kept but no longer retried; it takes on the server's current
+        version, so saving it again overwrites the other change deliberately.
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT record FROM local_prescriptions WHERE idempotency_key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return
+            record = json.loads(row[0])
+            if current is not None and self.version_key:
+                record[self.version_key] = current.get(self.version_key)
+            self._db.execute("""
+                UPDATE local_prescriptions SET sync_state = 'conflict', last_error = ?, record = ?
+                WHERE idempotency_key = ?
+            """, (str(error), _dumps(record), key))
+
+    def merge_remote(self, uid, records, idempotency_field=None, columns=None):
+        """
+        Upsert rows pulled from the server. Rows with a local edit still pending
+        (or in conflict) are left alone so the doctor's unsynced change is not overwritten.
+        records are dicts, or plain tuples in `columns` order (rows streamed from
+        a cursor are only turned into a record while being stored).
+        Returns how many rows changed.
+        """
+        changed = 0
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                for rec in records:
+                    if columns is not None:
+                        rec = dict(zip(columns, rec))
+                    remote_id = rec[self.id_key]
+                    key = (rec.get(idempotency_field) if idempotency_field else None) or f"remote:{remote_id}"
+                    existing = self._db.execute("""
+                        SELECT idempotency_key, sync_state, record FROM local_prescriptions
+                        WHERE remote_id = ? OR idempotency_key = ?
+                    """, (remote_id, key)).fetchone()
+                    encoded = _dumps(rec)
+                    if existing is None:
+                        self._db.execute("""
+                            INSERT INTO local_prescriptions
+                                (idempotency_key, patient_uid, remote_id, sort_ts, sync_state, record)
+                            VALUES (?, ?, ?, ?, 'synced', ?)
+                        """, (key, uid, remote_id, self.sort_key(rec), encoded))
+                        changed += 1
+                    elif existing[1] not in ("pending", "conflict") and existing[2] != encoded:
+                        self._db.execute("""
+                            UPDATE local_prescriptions SET remote_id = ?, sort_ts = ?, record = ?
+                            WHERE idempotency_key = ?
+                        """, (remote_id, self.sort_key(rec), encoded, existing[0]))
+                        changed += 1
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+        return changed
+
+    def watermark(self, uid):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT watermark FROM sync_watermarks WHERE patient_uid = ?", (uid,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def set_watermark(self, uid, watermark):
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO sync_watermarks (patient_uid, watermark) VALUES (?, ?) "
+                "ON CONFLICT(patient_uid) DO UPDATE SET watermark = excluded.watermark",
+                (uid, None if watermark is None else str(watermark))
+            )
+
+
+class SyncWorker(threading.Thread):
+    """
+    Background thread replaying pending local rows to MySQL.
+
+    push(conn, op, record, key) -> (remote_id, server_record_or_None) performs one
+    idempotent INSERT/UPDATE, raising EditConflictError when an edit is outdated.
+    on_synced(keys) is called (on this thread) after a pass that synced anything,
+    on_conflict(keys) after one that hit conflicts.
+    """
+
+    def __init__(self, store, get_connection, push, interval=DEFAULT_SYNC_INTERVAL, on_synced=None,
+                 on_conflict=None):
+        super().__init__(name="local-sync", daemon=True)
+        self.store = store
+        self.get_connection = get_connection
+        self.push = push
+        self.interval = interval
+        self.on_synced = on_synced
+        self.on_conflict = on_conflict
+        self._wake = threading.Event()
+        self._stopped = False
+
+    def poke(self):
+        """Sync as soon as possible (e.g. right after a local save)."""
+        self._wake.set()
+
+    def stop(self):
+        self._stopped = True
+        self._wake.set()
+
+    def run(self):
+        while not self._stopped:
+            try:
+                self.sync_once()
+            except Exception as e:
+                print(f"Local sync pass failed: {e}")
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def sync_once(self):
+        """
+        Replay everything pending, PENDING_BATCH rows at a time. Returns the keys that
+        reached the server. A row edited again while its push was in flight is left
+        pending for the next pass.
+        """
+        synced, conflicts = [], []
+        conn = None
+        after = 0
+        try:
+            while True:
+                pending = self.store.pending(after=after)
+                if not pending:
+                    break
+                if conn is None:
+                    conn = self.get_connection()
+                    if not conn:
+                        return []  # still offline; rows stay pending for the next pass
+                for row in pending:
+                    try:
+                        remote_id, server_record = self.push(conn, row.op, row.record, row.key)
+                    except EditConflictError as e:
+                        self.store.mark_conflict(row.key, e, e.current)
+                        conflicts.append(row.key)
+                        continue
+                    except Exception as e:
+                        try:
+                            conn.rollback()
+                        except Exception:
+                            pass
+                        self.store.mark_failed(row.key, e)
+                        continue
+                    if self.store.mark_synced(row.key, remote_id, server_record, row.generation):
+                        synced.append(row.key)
+                after = pending[-1].local_id
+        finally:
+            if conn is not None:
+                conn.close()
+        if synced and self.on_synced is not None:
+            self.on_synced(synced)
+        if conflicts and self.on_conflict is not None:
+            self.on_conflict(conflicts)
+        return synced
@@ -0,0 +1,203 @@
+"""
+Versioned schema migrations for the Doctor Portal.
+
+Each portal declares an ordered MIGRATIONS list. run_migrations() applies the
+versions that are not yet recorded in the schema_migrations table, once, at
+startup — schema changes never happen in the middle of a save. Versions are
+recorded per namespace, so portals sharing a database keep separate histories.
+"""
+from collections import namedtuple
+
+MIGRATIONS_TABLE = "schema_migrations"
+MIGRATION_LOCK = "imhotep_schema_migrations"
+LOCK_TIMEOUT = 30  # seconds to wait for another portal that is migrating the same database
+
+# steps: SQL strings, or callables taking a cursor (for conditional DDL)
+Migration = namedtuple("Migration", ["version", "description", "steps"])
+
+
+class MigrationError(RuntimeError):
+    """Raised when a migration step fails; earlier versions stay applied."""
+
+
+# -------------------- IDEMPOTENT STEP HELPERS --------------------
+# MySQL DDL commits implicitly, so a migration interrupted half-way must be safe
+# to re-run. These helpers check information_schema before changing anything.
+
+def column_exists(cur, table, column):
+    cur.execute("""
+        SELECT COUNT(*) FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s
+    """, (table, column))
+    return cur.fetchone()[0] > 0
+
+
+def index_exists(cur, table, columns):
+    """True when some index on table starts with exactly these columns (in order)."""
+    cur.execute("""
+        SELECT INDEX_NAME, COLUMN_NAME FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+        ORDER BY INDEX_NAME, SEQ_IN_INDEX
+    """, (table,))
+    indexes = {}
+    for name, column in cur.fetchall():
+        indexes.setdefault(name, []).append(column.lower())
+    wanted = [c.lower() for c in columns]
+    return any(cols[:len(wanted)] == wanted for cols in indexes.values())
+
+
+def add_column(table, column, definition):
+    """Step: ALTER TABLE ... ADD COLUMN unless the column is already there."""
+    def step(cur):
+        if not column_exists(cur, table, column):
+            cur.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    step.__doc__ = f"add column {table}.{column}"
+    return step
+
+
+def create_index(table, name, columns, order=None, unique=False, fulltext=False):
+    """
+    Step: CREATE [UNIQUE | FULLTEXT] INDEX unless an index with the same leading columns exists.
+    order optionally maps a column to "DESC".
+    """
+    order = order or {}
+    kind = "FULLTEXT INDEX" if fulltext else "UNIQUE INDEX" if unique else "INDEX"
+
+    def step(cur):
+        if not index_exists(cur, table, columns):
+            parts = ", ".join(f"{c} {order[c]}" if c in order else c for c in columns)
+            cur.execute(f"CREATE {kind} {name} ON {table} ({parts})")
+    step.__doc__ = f"create index {name} on {table}"
+    return step
+
+
+def trigger_exists(cur, name):
+    cur.execute("""
+        SELECT COUNT(*) FROM information_schema.TRIGGERS
+        WHERE TRIGGER_SCHEMA = DATABASE() AND TRIGGER_NAME = %s
+    """, (name,))
+    return cur.fetchone()[0] > 0
+
+
+def create_trigger(name, table, event, body, timing="AFTER"):
+    """
+    Step: CREATE TRIGGER unless it exists. body is a single statement (no BEGIN ... END),
+    so no client-side DELIMITER is needed.
+    """
+    def step(cur):
+        if not trigger_exists(cur, name):
+            cur.execute(f"CREATE TRIGGER {name} {timing} {event} ON {table} FOR EACH ROW {body}")
+    step.__doc__ = f"create trigger {name} on {table}"
+    return step
+
+
+def drop_trigger(name):
+    """Step: DROP TRIGGER if it exists, e.g. when the setting that created it is turned off."""
+    def step(cur):
+        if trigger_exists(cur, name):
+            cur.execute(f"DROP TRIGGER IF EXISTS {name}")
+    step.__doc__ = f"drop trigger {name}"
+    return step
+
+
+def row_format(cur, table):
+    """(ROW_FORMAT, KEY_BLOCK_SIZE or None) of an InnoDB table, as the server reports them."""
+    cur.execute("""
+        SELECT ROW_FORMAT, CREATE_OPTIONS FROM information_schema.TABLES
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+    """, (table,))
+    row = cur.fetchone()
+    if row is None:
+        return None, None
+    options = dict(opt.split("=", 1) for opt in (row[1] or "").lower().split() if "=" in opt)
+    size = options.get("key_block_size")
+    return (row[0] or "").upper(), int(size) if size else None
+
+
+def set_row_format(table, fmt, key_block_size=None):
+    """
+    Step: ALTER TABLE ... ROW_FORMAT unless the table already has it. This rebuilds
+    the table, so it is only issued when something actually changes.
+    """
+    fmt = fmt.upper()
+
+    def step(cur):
+        current, size = row_format(cur, table)
+        if current == fmt and (key_block_size is None or size == key_block_size):
+            return
+        options = f"ROW_FORMAT={fmt}"
+        if key_block_size:
+            options += f" KEY_BLOCK_SIZE={key_block_size}"
+        elif fmt != "COMPRESSED" and size:
+            options += " KEY_BLOCK_SIZE=0"   # a leftover block size would keep the table compressed
+        cur.execute(f"ALTER TABLE {table} {options}")
+    step.__doc__ = f"set {table} row format to {fmt}"
+    return step
+
+
+# -------------------- RUNNER --------------------
+def applied_versions(cur, namespace):
+    cur.execute(f"SELECT version FROM {MIGRATIONS_TABLE} WHERE namespace = %s", (namespace,))
+    return {row[0] for row in cur.fetchall()}
+
+
+def run_migrations(conn, migrations, namespace, settings=()):
+    """
+    Apply pending migrations in version order. Returns the versions applied now.
+
+    settings are unversioned, idempotent steps run after them on every start
+    (e.g. an opt-in row format), so turning a portal setting on takes effect at
+    the next start.
+
+    A MySQL advisory lock (GET_LOCK) keeps two portals starting at the same
+    time from running the same migration twice.
+    """
+    cur = conn.cursor()
+    applied_now = []
+    cur.execute("SELECT GET_LOCK(%s, %s)", (MIGRATION_LOCK, LOCK_TIMEOUT))
+    if not cur.fetchone()[0]:
+        cur.close()
+        raise MigrationError("Timed out waiting for another portal to finish migrating.")
+    try:
+        cur.execute(f"""
+            CREATE TABLE IF NOT EXISTS {MIGRATIONS_TABLE} (
+                namespace VARCHAR(64) NOT NULL,
+                version INT NOT NULL,
+                description VARCHAR(255),
+                applied_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (namespace, version)
+            )
+        """)
+        done = applied_versions(cur, namespace)
+        for migration in sorted(migrations, key=lambda m: m.version):
+            if migration.version in done:
+                continue
+            try:
+                for step in migration.steps:
+                    if callable(step):
+                        step(cur)
+                    else:
+                        cur.execute(step)
+                cur.execute(
+                    f"INSERT INTO {MIGRATIONS_TABLE} (namespace, version, description) VALUES (%s, %s, %s)",
+                    (namespace, migration.version, migration.description)
+                )
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                raise MigrationError(
+                    f"Migration {migration.version} ({migration.description}) failed: {e}"
+                ) from e
+            applied_now.append(migration.version)
+        for step in settings:
+            try:
+                step(cur)
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                raise MigrationError(f"Schema setting ({step.__doc__}) failed: {e}") from e
+    finally:
+        cur.execute("SELECT RELEASE_LOCK(%s)", (MIGRATION_LOCK,))
+        cur.fetchone()
+        cur.close()
+    return applied_now
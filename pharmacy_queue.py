@@ -0,0 +1,326 @@
+"""
+Pharmacy dispensing queue: the pharmacy side of Imhotep.
+
+A trigger on each portal's prescription table copies every newly inserted
+prescription (id, patient uid, created_at) into an outbox table, the dispense
+queue. Rows written by bulk_io imports (@imhotep_bulk_import set on their
+session) are old records, not new prescriptions, and are skipped. Pharmacy
+workstations take work from the queue oldest first:
+
+    SELECT ... FROM dispense_queue WHERE status = 'pending'
+    ORDER BY created_at, queue_id LIMIT n FOR UPDATE SKIP LOCKED
+
+SKIP LOCKED (MySQL 8.0+) makes each workstation pass over the rows another one
+is claiming instead of waiting for its transaction, so any number of them can
+claim at once without handing out the same prescription twice. The claim
+transaction only marks the rows 'claimed' and commits; dispensing happens
+outside it, and complete() marks the rows 'dispensed'. A claim not completed
+within its lease (a workstation crashed) goes back to 'pending'.
+
+The (status, created_at, queue_id) index keeps the claim query a short range
+read at the head of the pending rows however many dispensed rows pile up
+behind them. Line items come from the item table (see prescription_items.py),
+so the pharmacy never parses prescription text.
+
+The service keeps its own schema (the queue table and its trigger) in its own
+migration namespace, applied by initialize_queue() when it starts, so it needs
+no Qt. Only prescriptions saved after that first start are queued.
+
+    python pharmacy_queue.py work --portal doctor_portal --workstation counter-1
+    python pharmacy_queue.py status --portal doctor_portal1
+
+benchmarks/dispense_load.py measures dispenses per second under a synthetic load.
+"""
+import argparse
+import socket
+import sys
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from db_pool import PoolExhaustedError, get_pool
+from migrations import Migration, MigrationError, create_trigger, run_migrations
+from portal_config import BULK_IMPORT_VARIABLE, DB_CONFIGS, ITEM_TABLES
+from prescription_items import PrescriptionItem
+
+POOL_SIZE = 2             # connections to the portal's database (its DB_CONFIGS entry)
+
+PENDING, CLAIMED, DISPENSED = "pending", "claimed", "dispensed"
+DEFAULT_BATCH = 1         # prescriptions claimed per transaction
+DEFAULT_LEASE = 600       # seconds a claim may stay open before it is handed out again
+CLAIM_ATTEMPTS = 3
+IDLE_POLL = 1.0           # seconds the work loop sleeps when the queue is empty
+
+# columns: queue id, prescription id, patient uid, created at, status, claimed by,
+# claimed at, dispensed at -- in that order
+QueueTable = namedtuple("QueueTable", ["table", "columns"])
+
+DispenseTask = namedtuple("DispenseTask", ["queue_id", "prescription_id", "patient_uid", "created_at", "items"])
+
+# source: the portal's prescription table, with its (id, patient uid, created at) columns
+QueueSpec = namedtuple("QueueSpec", ["source", "source_columns", "queue", "items"])
+
+QUEUES = {
+    "doctor_portal": QueueSpec(
+        "prescriptions", ["prescription_id", "patient_uid", "created_at"],
+        QueueTable("dispense_queue", ["queue_id", "prescription_id", "patient_uid", "created_at",
+                                      "status", "claimed_by", "claimed_at", "dispensed_at"]),
+        ITEM_TABLES["doctor_portal"],
+    ),
+    "doctor_portal1": QueueSpec(
+        "Prescription", ["Pr_ID", "Patient_UID", "Created_At"],
+        QueueTable("Dispense_Queue", ["Queue_ID", "Pr_ID", "Patient_UID", "Created_At",
+                                      "Status", "Claimed_By", "Claimed_At", "Dispensed_At"]),
+        ITEM_TABLES["doctor_portal1"],
+    ),
+}
+
+
+# -------------------- SCHEMA --------------------
+def queue_migrations(spec):
+    """Versioned migrations creating spec's queue table and the trigger that fills it."""
+    q, c = spec.queue.table, spec.queue.columns
+    source_id, source_uid, source_created = spec.source_columns
+    return [
+        Migration(1, f"create {q} outbox", [
+            f"""CREATE TABLE IF NOT EXISTS {q} (
+                {c[0]} BIGINT AUTO_INCREMENT PRIMARY KEY,
+                {c[1]} INT NOT NULL,
+                {c[2]} VARCHAR(50),
+                {c[3]} DATETIME NOT NULL,
+                {c[4]} VARCHAR(10) NOT NULL DEFAULT '{PENDING}',
+                {c[5]} VARCHAR(100),
+                {c[6]} DATETIME,
+                {c[7]} DATETIME,
+                UNIQUE KEY uq_{q.lower()}_prescription ({c[1]}),
+                INDEX idx_{q.lower()}_status_created ({c[4]}, {c[3]}, {c[0]})
+            )""",
+            create_trigger(f"trg_{spec.source.lower()}_queue_dispense", spec.source, "INSERT",
+                           f"INSERT INTO {q} ({c[1]}, {c[2]}, {c[3]}) "
+                           f"SELECT NEW.{source_id}, NEW.{source_uid}, COALESCE(NEW.{source_created}, NOW()) FROM DUAL "
+                           f"WHERE {BULK_IMPORT_VARIABLE} IS NULL"),
+        ]),
+    ]
+
+
+def initialize_queue(conn, portal):
+    """Apply the queue's pending migrations for portal's database. The portal must have run once."""
+    applied = run_migrations(conn, queue_migrations(QUEUES[portal]), namespace=f"pharmacy_queue:{portal}")
+    if applied:
+        print(f"Applied dispense queue migrations: {applied}")
+
+
+def connector(config):
+    """get_connection for config: a pooled connection, or None when the database is unreachable."""
+    def get_connection():
+        from mysql.connector import Error
+        try:
+            return get_pool(config, pool_size=POOL_SIZE).acquire()
+        except (Error, PoolExhaustedError) as e:
+            print(f"DB Connection Error: {e}", file=sys.stderr)
+            return None
+    return get_connection
+
+
+class DispenseQueue:
+    """
+    One pharmacy workstation's handle on a portal's dispense queue.
+
+    get_connection -- returns a pooled connection to the portal's database, or None when offline
+    item_table -- the portal's ItemTable (QueueSpec.items); claimed tasks then carry their line items
+    """
+
+    def __init__(self, get_connection, queue_table, workstation, item_table=None, lease=DEFAULT_LEASE):
+        self.get_connection = get_connection
+        self.queue_table = queue_table
+        self.workstation = workstation
+        self.item_table = item_table
+        self.lease = lease
+
+    def _connect(self):
+        conn = self.get_connection()
+        if not conn:
+            raise ConnectionError("Could not connect to the database.")
+        return conn
+
+    def claim(self, limit=DEFAULT_BATCH):
+        """Claim up to limit of the oldest pending prescriptions. Returns [DispenseTask], oldest first."""
+        q, c = self.queue_table.table, self.queue_table.columns
+        conn = self._connect()
+        try:
+            cur = conn.cursor()
+            try:
+                for _ in range(CLAIM_ATTEMPTS):
+                    cur.execute(f"""
+                        SELECT {c[0]}, {c[1]}, {c[2]}, {c[3]} FROM {q}
+                        WHERE {c[4]} = %s
+                        ORDER BY {c[3]}, {c[0]} LIMIT {int(limit)}
+                        FOR UPDATE SKIP LOCKED
+                    """, (PENDING,))
+                    rows = cur.fetchall()
+                    if not rows:
+                        conn.rollback()
+                        return []
+                    ids = [row[0] for row in rows]
+                    cur.execute(
+                        f"UPDATE {q} SET {c[4]} = %s, {c[5]} = %s, {c[6]} = %s "
+                        f"WHERE {c[4]} = %s AND {c[0]} IN ({', '.join(['%s'] * len(ids))})",
+                        [CLAIMED, self.workstation, datetime.now(), PENDING] + ids
+                    )
+                    # The row locks make a short count impossible on MySQL; a database
+                    # without them may have let another workstation in first, so start over.
+                    if cur.rowcount == len(ids):
+                        conn.commit()
+                        break
+                    conn.rollback()
+                else:
+                    return []
+                items = self._items(cur, [row[1] for row in rows])
+                conn.rollback()  # end the read snapshot before the connection goes back
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                cur.close()
+        finally:
+            conn.close()
+        return [DispenseTask(*row, items.get(row[1], [])) for row in rows]
+
+    def _items(self, cur, prescription_ids):
+        """{prescription id: [PrescriptionItem]} for the claimed prescriptions, in line order."""
+        if not self.item_table:
+            return {}
+        t, c = self.item_table.table, self.item_table.columns
+        cur.execute(
+            f"SELECT {', '.join(c)} FROM {t} WHERE {c[0]} IN ({', '.join(['%s'] * len(prescription_ids))}) "
+            f"ORDER BY {c[0]}, {c[1]}",
+            prescription_ids
+        )
+        items = {}
+        for row in cur.fetchall():
+            items.setdefault(row[0], []).append(PrescriptionItem(*row[2:]))
+        return items
+
+    def complete(self, queue_ids):
+        """
+        Mark this workstation's claims dispensed. Returns how many were; a claim whose
+        lease ran out and went to another workstation is not counted.
+        """
+        if not queue_ids:
+            return 0
+        q, c = self.queue_table.table, self.queue_table.columns
+        conn = self._connect()
+        try:
+            cur = conn.cursor()
+            cur.execute(
+                f"UPDATE {q} SET {c[4]} = %s, {c[7]} = %s "
+                f"WHERE {c[4]} = %s AND {c[5]} = %s AND {c[0]} IN ({', '.join(['%s'] * len(queue_ids))})",
+                [DISPENSED, datetime.now(), CLAIMED, self.workstation] + list(queue_ids)
+            )
+            done = cur.rowcount
+            conn.commit()
+            cur.close()
+            return done
+        finally:
+            conn.close()
+
+    def requeue_expired(self):
+        """Hand claims older than the lease back out. Returns how many went back to pending."""
+        q, c = self.queue_table.table, self.queue_table.columns
+        conn = self._connect()
+        try:
+            cur = conn.cursor()
+            cur.execute(
+                f"UPDATE {q} SET {c[4]} = %s, {c[5]} = NULL, {c[6]} = NULL WHERE {c[4]} = %s AND {c[6]} < %s",
+                (PENDING, CLAIMED, datetime.now() - timedelta(seconds=self.lease))
+            )
+            requeued = cur.rowcount
+            conn.commit()
+            cur.close()
+            return requeued
+        finally:
+            conn.close()
+
+    def status(self):
+        """{status: (count, oldest created_at)} over the whole queue."""
+        q, c = self.queue_table.table, self.queue_table.columns
+        conn = self._connect()
+        try:
+            cur = conn.cursor()
+            cur.execute(f"SELECT {c[4]}, COUNT(*), MIN({c[3]}) FROM {q} GROUP BY {c[4]}")
+            counts = {row[0]: (row[1], row[2]) for row in cur.fetchall()}
+            conn.rollback()
+            cur.close()
+            return counts
+        finally:
+            conn.close()
+
+
+def describe(task):
+    """One pick-list line per item, under a header for the prescription."""
+    lines = [f"Rx {task.prescription_id} for {task.patient_uid} (written {task.created_at})"]
+    for item in task.items:
+        lines.append("  " + ", ".join(part for part in item if part))
+    if not task.items:
+        lines.append("  (no line items)")
+    return "\n".join(lines)
+
+
+# -------------------- COMMAND LINE --------------------
+def work(queue, batch, once=False):
+    """Claim, print and mark dispensed until interrupted (or, with once, until the queue is empty)."""
+    dispensed = 0
+    queue.requeue_expired()
+    while True:
+        tasks = queue.claim(batch)
+        if not tasks:
+            if queue.requeue_expired():
+                continue
+            if once:
+                return dispensed
+            time.sleep(IDLE_POLL)
+            continue
+        for task in tasks:
+            print(describe(task))
+        dispensed += queue.complete([task.queue_id for task in tasks])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("action", choices=["work", "status"])
+    parser.add_argument("--portal", choices=["doctor_portal", "doctor_portal1"], default="doctor_portal",
+                        help="which portal's database to serve")
+    parser.add_argument("--workstation", default=socket.gethostname(), help="name recorded on each claim")
+    parser.add_argument("--batch", type=int, default=DEFAULT_BATCH, help="prescriptions claimed at a time")
+    parser.add_argument("--lease", type=int, default=DEFAULT_LEASE, help="seconds before an open claim is requeued")
+    parser.add_argument("--once", action="store_true", help="work: stop when the queue is empty")
+    args = parser.parse_args(argv)
+
+    spec = QUEUES[args.portal]
+    get_connection = connector(DB_CONFIGS[args.portal])
+    queue = DispenseQueue(get_connection, spec.queue, args.workstation, spec.items, lease=args.lease)
+    try:
+        conn = queue._connect()
+        try:
+            initialize_queue(conn, args.portal)
+        finally:
+            conn.close()
+        if args.action == "status":
+            counts = queue.status()
+            for state in (PENDING, CLAIMED, DISPENSED):
+                count, oldest = counts.get(state, (0, None))
+                print(f"{state:<10} {count:>8,}" + (f"   oldest {oldest}" if oldest and state != DISPENSED else ""))
+        else:
+            dispensed = work(queue, args.batch, args.once)
+            print(f"Dispensed {dispensed:,} prescriptions.")
+    except (ConnectionError, MigrationError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        print("\nStopped; unfinished claims are handed out again after the lease.", file=sys.stderr)
+        return 130
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,45 @@
+"""
+Per-portal settings shared by the Qt portals and the command-line tools.
+
+doctor_portal.py and doctor_portal1.py take their DB_CONFIG and ITEM_TABLE from
+here, and so do pharmacy_queue.py and bulk_io.py. Those two must run on machines
+without Qt, so they cannot import a portal module to read its settings. Keep
+this module free of Qt and database-driver imports.
+"""
+from prescription_items import ItemTable
+
+# Session variable set while bulk_io imports old records (1 while importing, else NULL).
+# Triggers read it to tell those rows from new prescriptions (see pharmacy_queue.py).
+BULK_IMPORT_VARIABLE = "@imhotep_bulk_import"
+
+# -------------------- DATABASE CONFIGURATION --------------------
+# doctor_portal1's connection settings
+DB_HOST = "localhost"
+DB_USER = "root"
+DB_PASS = ""  # Replace with your MySQL password
+DB_NAME = "imhotep"
+
+# Each portal's DB_CONFIG, by portal module name
+DB_CONFIGS = {
+    "doctor_portal": {
+        "host": "127.0.0.1",
+        "user": "root",
+        "password": "",
+        "database": "doctor",
+        "port": 3306
+    },
+    "doctor_portal1": {
+        "host": DB_HOST,
+        "user": DB_USER,
+        "password": DB_PASS,
+        "database": DB_NAME,
+        "port": 3306
+    },
+}
+
+# Each portal's line-item table (one row per prescription line, see prescription_items.py)
+ITEM_TABLES = {
+    "doctor_portal": ItemTable("prescription_items",
+                               ["prescription_id", "line_no", "drug", "dose", "frequency", "duration"]),
+    "doctor_portal1": ItemTable("Prescription_Item", ["Pr_ID", "Line_No", "Drug", "Dose", "Frequency", "Duration"]),
+}
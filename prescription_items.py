@@ -0,0 +1,184 @@
+"""
+Structured prescription line items.
+
+The prescription text stays exactly as the doctor typed it: it is what the
+editor shows and what the full-text index searches. Each non-empty line of it
+is also stored as one row of a child table (drug, dose, frequency, duration),
+so pharmacy-side queries can group by drug without parsing text:
+
+    SELECT drug, COUNT(*) FROM prescription_items GROUP BY drug
+
+Lines are parsed once, when a prescription is saved, and the items are written
+in the same transaction as the prescription itself. Loading never parses.
+
+Saves used to append a "\\n\\n— <doctor name>" signature to the text, which every
+load and edit then had to find and cut back out. The name is already its own
+column, so saves no longer write it and a migration removes it from old rows.
+"""
+import re
+from collections import namedtuple
+
+SIGNATURE_PREFIX = "\n\n— "
+INSERT_CHUNK = 500     # item rows per multi-row INSERT
+BACKFILL_CHUNK = 1000  # prescriptions read per pass when itemizing existing rows
+
+DRUG_CHARS = 200
+FIELD_CHARS = 64       # dose, frequency, duration
+
+# columns: parent id, line number, drug, dose, frequency, duration -- in that order
+ItemTable = namedtuple("ItemTable", ["table", "columns"])
+
+_BULLET = re.compile(r"^\s*(?:[-*•·]|\d+[.)])\s+")
+_DURATION = re.compile(r"\b(?:for\s+|x\s*)?(\d+\s*(?:days?|weeks?|months?|wks?|d))\b", re.I)
+_DOSE = re.compile(
+    r"\b\d+(?:[.,]\d+)?\s*(?:mg|mcg|µg|ug|g|ml|iu|units?|tabs?|tablets?|caps?|capsules?|"
+    r"drops?|puffs?|sachets?|%)(?![a-z])", re.I
+)
+_FREQUENCY = re.compile(
+    r"(?:\b(?:once|twice|thrice|(?:one|two|three|four|\d+)\s*(?:x|times))"
+    r"(?:\s+(?:a|per))?(?:\s+(?:day|daily|week|weekly|night))?\b"
+    r"|\b(?:every|q)\s*\d+\s*(?:h|hrs?|hours?)\b"
+    r"|\b\d-\d-\d(?:-\d)?\b"
+    r"|\b(?:od|bd|bid|tds|tid|qid|qds|prn|hs|stat|daily|nightly|at night|at bedtime|as needed)\b)",
+    re.I
+)
+_SEPARATORS = " \t,;:-–—/"
+
+
+class PrescriptionItem:
+    """One line of a prescription. Slotted: a backfill holds thousands at once."""
+
+    __slots__ = ("drug", "dose", "frequency", "duration")
+
+    def __init__(self, drug, dose=None, frequency=None, duration=None):
+        self.drug = drug
+        self.dose = dose
+        self.frequency = frequency
+        self.duration = duration
+
+    def __iter__(self):
+        return iter((self.drug, self.dose, self.frequency, self.duration))
+
+    def __eq__(self, other):
+        return isinstance(other, PrescriptionItem) and tuple(self) == tuple(other)
+
+    def __repr__(self):
+        return "PrescriptionItem(%r, %r, %r, %r)" % tuple(self)
+
+
+def strip_signature(text):
+    """Text without a trailing legacy "— <doctor name>" signature line."""
+    if not text:
+        return text
+    idx = text.rfind(SIGNATURE_PREFIX)
+    if idx != -1 and "\n" not in text[idx + len(SIGNATURE_PREFIX):]:
+        return text[:idx].rstrip()
+    return text
+
+
+def _take(pattern, line):
+    """(matched text or None, line with the match blanked out, match start or None)."""
+    m = pattern.search(line)
+    if not m:
+        return None, line, None
+    value = (m.group(1) if m.groups() else m.group(0)).strip()
+    return value, line[:m.start()] + " " * (m.end() - m.start()) + line[m.end():], m.start()
+
+
+def _clip(value, limit):
+    return value[:limit] if value else None
+
+
+def parse_line(line):
+    """PrescriptionItem for one line of text, or None for a blank or signature line."""
+    line = _BULLET.sub("", line).strip()
+    if not line or line.startswith(SIGNATURE_PREFIX.strip()):
+        return None
+    duration, rest, d_at = _take(_DURATION, line)
+    dose, rest, s_at = _take(_DOSE, rest)
+    frequency, rest, f_at = _take(_FREQUENCY, rest)
+    starts = [at for at in (d_at, s_at, f_at) if at is not None]
+    # The drug is whatever comes before the first recognised part ("Amoxicillin 500 mg ...");
+    # a line that starts with a dose keeps what is left once the parts are removed.
+    drug = line[:min(starts)].strip(_SEPARATORS) if starts else line
+    if not drug:
+        drug = " ".join(rest.split()).strip(_SEPARATORS) or line
+    return PrescriptionItem(_clip(drug, DRUG_CHARS), _clip(dose, FIELD_CHARS),
+                            _clip(frequency, FIELD_CHARS), _clip(duration, FIELD_CHARS))
+
+
+def parse_items(text):
+    """The line items of a prescription text, in order."""
+    items = []
+    for line in (text or "").splitlines():
+        item = parse_line(line)
+        if item is not None:
+            items.append(item)
+    return items
+
+
+def item_rows(prescription_id, text):
+    """Rows for the item table: (prescription_id, line_no, drug, dose, frequency, duration)."""
+    return [(prescription_id, n) + tuple(item) for n, item in enumerate(parse_items(text), 1)]
+
+
+# -------------------- WRITES --------------------
+# Callers pass the cursor of the transaction that saves the prescription itself.
+
+def insert_items(cur, item_table, rows):
+    """Insert item rows with multi-row INSERTs of up to INSERT_CHUNK rows."""
+    placeholders = "(" + ", ".join(["%s"] * len(item_table.columns)) + ")"
+    for start in range(0, len(rows), INSERT_CHUNK):
+        chunk = rows[start:start + INSERT_CHUNK]
+        cur.execute(
+            f"INSERT INTO {item_table.table} ({', '.join(item_table.columns)}) VALUES "
+            + ", ".join([placeholders] * len(chunk)),
+            [v for row in chunk for v in row]
+        )
+
+
+def replace_items(cur, item_table, prescription_id, text, existing=True):
+    """Re-itemize one prescription. existing=False skips the DELETE for a row just inserted."""
+    if existing:
+        cur.execute(f"DELETE FROM {item_table.table} WHERE {item_table.columns[0]} = %s", (prescription_id,))
+    insert_items(cur, item_table, item_rows(prescription_id, text))
+
+
+# -------------------- MIGRATION STEPS --------------------
+def strip_signatures(table, text_column, name_column):
+    """Step: cut the legacy "— <doctor name>" signature off every row in one UPDATE."""
+    def step(cur):
+        cur.execute(f"""
+            UPDATE {table}
+            SET {text_column} = LEFT({text_column}, CHAR_LENGTH({text_column}) - CHAR_LENGTH(%s) - CHAR_LENGTH({name_column}))
+            WHERE {name_column} IS NOT NULL
+              AND RIGHT({text_column}, CHAR_LENGTH(%s) + CHAR_LENGTH({name_column})) = CONCAT(%s, {name_column})
+        """, (SIGNATURE_PREFIX, SIGNATURE_PREFIX, SIGNATURE_PREFIX))
+    step.__doc__ = f"strip doctor signatures from {table}.{text_column}"
+    return step
+
+
+def backfill_items(table, id_column, text_column, item_table):
+    """Step: itemize every prescription that has no items yet, BACKFILL_CHUNK rows at a time."""
+    parent = item_table.columns[0]
+
+    def step(cur):
+        last_id = 0
+        while True:
+            cur.execute(f"""
+                SELECT p.{id_column}, p.{text_column} FROM {table} p
+                WHERE p.{id_column} > %s AND NOT EXISTS (
+                    SELECT 1 FROM {item_table.table} i WHERE i.{parent} = p.{id_column}
+                )
+                ORDER BY p.{id_column} LIMIT {BACKFILL_CHUNK}
+            """, (last_id,))
+            chunk = cur.fetchall()
+            if not chunk:
+                return
+            rows = []
+            for record_id, text in chunk:
+                rows.extend(item_rows(record_id, text))
+            insert_items(cur, item_table, rows)
+            last_id = chunk[-1][0]
+    step.__doc__ = f"itemize existing {table} rows into {item_table.table}"
+    return step
@@ -0,0 +1,133 @@
+"""
+Background query executor for the Doctor Portal.
+
+Database work runs on a QThreadPool so slow MySQL round-trips never block the
+GUI thread. Results are posted back through Qt signals, which Qt delivers on
+the thread that owns the executor (the GUI thread), so callbacks may touch
+widgets directly.
+"""
+import itertools
+
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+from tracing import TRACER
+
+
+class QueryTicket:
+    """Handle for a submitted query. Cancelled tickets never deliver their result."""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, channel=None):
+        self.id = next(self._ids)
+        self.channel = channel
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class _WorkerSignals(QObject):
+    """Signals emitted from worker threads; queued back to the GUI thread."""
+    finished = pyqtSignal(object, object, object)   # (ticket, callback, result)
+    failed = pyqtSignal(object, object, object)     # (ticket, callback, exception)
+    posted = pyqtSignal(object, object)             # (callback, args)
+
+
+class _QueryTask(QRunnable):
+    """Runs one query function on a pool thread."""
+
+    def __init__(self, signals, ticket, fn, args, kwargs, on_result, on_error):
+        super().__init__()
+        self.signals = signals
+        self.ticket = ticket
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.on_result = on_result
+        self.on_error = on_error
+
+    def run(self):
+        if self.ticket.cancelled:
+            return
+        try:
+            with TRACER.span("task." + getattr(self.fn, "__name__", "call")):
+                result = self.fn(*self.args, **self.kwargs)
+        except Exception as e:
+            self.signals.failed.emit(self.ticket, self.on_error, e)
+        else:
+            self.signals.finished.emit(self.ticket, self.on_result, result)
+
+
+class QueryExecutor(QObject):
+    """
+    Submit callables to a thread pool and receive their results on the GUI thread.
+
+    Submitting with a channel (e.g. "load") cancels whatever was previously
+    submitted on that channel, so only the newest request's result is delivered.
+    """
+
+    def __init__(self, parent=None, max_threads=None):
+        super().__init__(parent)
+        self.thread_pool = QThreadPool(self)
+        if max_threads:
+            self.thread_pool.setMaxThreadCount(max_threads)
+        self._latest = {}    # channel -> most recent ticket
+
+        self._signals = _WorkerSignals()
+        self._signals.finished.connect(self._deliver_result)
+        self._signals.failed.connect(self._deliver_error)
+        self._signals.posted.connect(lambda callback, args: callback(*args))
+
+    def submit(self, fn, *args, on_result=None, on_error=None, channel=None, **kwargs):
+        """Run fn(*args, **kwargs) off the GUI thread. Returns a QueryTicket."""
+        if channel is not None:
+            self.cancel(channel)
+        ticket = QueryTicket(channel)
+        task = _QueryTask(self._signals, ticket, fn, args, kwargs, on_result, on_error)
+        if channel is not None:
+            self._latest[channel] = ticket
+        self.thread_pool.start(task)
+        return ticket
+
+    def post(self, callback, *args):
+        """Run callback(*args) on the GUI thread. Safe to call from any thread."""
+        self._signals.posted.emit(callback, args)
+
+    def cancel(self, channel):
+        """
+        Cancel the pending query on a channel. A queued query is skipped; one
+        already executing runs to completion but its result is dropped.
+        """
+        ticket = self._latest.pop(channel, None)
+        if ticket is not None:
+            ticket.cancel()
+
+    def is_pending(self, channel):
+        return channel in self._latest
+
+    def wait_for_done(self, msecs=-1):
+        """Block until all submitted work has finished (used on shutdown and in benchmarks)."""
+        return self.thread_pool.waitForDone(msecs)
+
+    # -------------------- DELIVERY (GUI thread) --------------------
+    def _is_current(self, ticket):
+        if ticket.cancelled:
+            return False
+        if ticket.channel is not None:
+            if self._latest.get(ticket.channel) is not ticket:
+                return False
+            del self._latest[ticket.channel]
+        return True
+
+    def _deliver_result(self, ticket, callback, result):
+        if self._is_current(ticket) and callback is not None:
+            callback(result)
+
+    def _deliver_error(self, ticket, callback, error):
+        if not self._is_current(ticket):
+            return
+        if callback is not None:
+            callback(error)
+        else:
+            print(f"Background query failed: {error}")
@@ -0,0 +1,137 @@
+"""
+Cheap drop shadows for the Doctor Portal.
+
+QGraphicsDropShadowEffect re-renders its widget offscreen and blurs it on every
+repaint, so typing in a text box or scrolling the history list inside a card
+re-blurs the whole card. apply_shadow() here draws the same shadow from a
+pre-rendered 9-slice pixmap instead: a separate, mouse-transparent widget sits
+just under the target and only repaints when the target moves or resizes.
+
+The blurred corners are rendered once per (blur radius, color, corner radius)
+and the edges are stretched, so one cached pixmap fits every widget size and
+the offset is applied when drawing.
+"""
+from PyQt5.QtCore import Qt, QEvent, QRect, QRectF
+from PyQt5.QtGui import QColor, QImage, QPainter, QPixmap
+from PyQt5.QtWidgets import QWidget, QGraphicsScene, QGraphicsPixmapItem, QGraphicsBlurEffect
+
+CORNER_RADIUS = 10  # matches the cards' stylesheet border-radius closely enough once blurred
+
+_pixmap_cache = {}
+
+
+def shadow_pixmap(blur_radius, color, corner_radius=CORNER_RADIUS):
+    """
+    The 9-slice source: a blurred rounded rect. Each corner slice spans the blur
+    falloff on both sides of the edge plus the corner radius (see slice_margin),
+    so the stretched middle row and column are at full strength.
+    Rendered once per key, then cached.
+    """
+    key = (blur_radius, QColor(color).rgba(), corner_radius)
+    pixmap = _pixmap_cache.get(key)
+    if pixmap is not None:
+        return pixmap
+
+    core = 2 * (corner_radius + blur_radius) + 1   # one stretchable pixel between the corners
+    size = core + 2 * blur_radius
+
+    solid = QPixmap(core, core)
+    solid.fill(Qt.transparent)
+    painter = QPainter(solid)
+    painter.setRenderHint(QPainter.Antialiasing, True)
+    painter.setPen(Qt.NoPen)
+    painter.setBrush(QColor(color))
+    painter.drawRoundedRect(QRectF(0, 0, core, core), corner_radius, corner_radius)
+    painter.end()
+
+    # Same blur the drop shadow effect uses, applied once through a throwaway scene
+    scene = QGraphicsScene()
+    item = QGraphicsPixmapItem(solid)
+    blur = QGraphicsBlurEffect()
+    blur.setBlurRadius(blur_radius)
+    item.setGraphicsEffect(blur)
+    scene.addItem(item)
+
+    image = QImage(size, size, QImage.Format_ARGB32_Premultiplied)
+    image.fill(Qt.transparent)
+    painter = QPainter(image)
+    scene.render(painter, QRectF(0, 0, size, size), QRectF(-blur_radius, -blur_radius, size, size))
+    painter.end()
+
+    pixmap = QPixmap.fromImage(image)
+    _pixmap_cache[key] = pixmap
+    return pixmap
+
+
+def slice_margin(blur_radius, corner_radius=CORNER_RADIUS):
+    """Width of the fixed corner slices: blur falloff outside + inside the edge, plus the corner."""
+    return 2 * blur_radius + corner_radius
+
+
+def draw_nine_slice(painter, target, pixmap, margin):
+    """Draw pixmap into target, keeping margin-wide corners and stretching the edges and center."""
+    w, h = pixmap.width(), pixmap.height()
+    tx, ty, tw, th = target.x(), target.y(), target.width(), target.height()
+    inner_w, inner_h = max(0, tw - 2 * margin), max(0, th - 2 * margin)
+    src_mid_w, src_mid_h = w - 2 * margin, h - 2 * margin
+
+    cols = [(tx, margin, 0, margin), (tx + margin, inner_w, margin, src_mid_w),
+            (tx + margin + inner_w, margin, w - margin, margin)]
+    rows = [(ty, margin, 0, margin), (ty + margin, inner_h, margin, src_mid_h),
+            (ty + margin + inner_h, margin, h - margin, margin)]
+    for dy, dh, sy, sh in rows:
+        for dx, dw, sx, sw in cols:
+            if dw > 0 and dh > 0:
+                painter.drawPixmap(QRect(dx, dy, dw, dh), pixmap, QRect(sx, sy, sw, sh))
+
+
+class ShadowWidget(QWidget):
+    """Paints a cached shadow behind `target`, following its geometry, visibility and parent."""
+
+    def __init__(self, target, blur_radius, x_offset, y_offset, color):
+        super().__init__(target.parentWidget())
+        self.target = target
+        self.margin = slice_margin(blur_radius)
+        self.blur_radius = blur_radius
+        self.offset = (x_offset, y_offset)
+        self.pixmap = shadow_pixmap(blur_radius, color)
+        self.setAttribute(Qt.WA_TransparentForMouseEvents, True)
+        self.setFocusPolicy(Qt.NoFocus)
+        target.installEventFilter(self)
+        target.destroyed.connect(self.deleteLater)
+        self._follow()
+
+    def eventFilter(self, obj, event):
+        kind = event.type()
+        if kind == QEvent.ParentChange:
+            self.setParent(obj.parentWidget())
+            self._follow()
+        elif kind in (QEvent.Move, QEvent.Resize, QEvent.Show, QEvent.ZOrderChange):
+            self._follow()
+        elif kind == QEvent.Hide:
+            self.hide()
+        return False
+
+    def _follow(self):
+        target = self.target
+        if self.parentWidget() is None:
+            return
+        dx, dy = self.offset
+        r = self.blur_radius
+        self.setGeometry(target.geometry().adjusted(dx - r, dy - r, dx + r, dy + r))
+        self.stackUnder(target)
+        self.setVisible(not target.isHidden())
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        draw_nine_slice(painter, self.rect(), self.pixmap, self.margin)
+
+
+def apply_shadow(widget, blur_radius=20, x_offset=0, y_offset=4, color=QColor(0, 0, 0, 60)):
+    """Apply drop shadow effect to a widget."""
+    old = getattr(widget, "_shadow", None)
+    if old is not None:
+        widget.removeEventFilter(old)
+        old.deleteLater()
+    widget._shadow = ShadowWidget(widget, blur_radius, x_offset, y_offset, color)
+    return widget._shadow
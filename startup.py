@@ -0,0 +1,91 @@
+"""
+Start-up timing and deferred start-up work for the Doctor Portal.
+
+StartupProfiler times each start-up phase (module imports, QApplication,
+init_ui, first paint, ...) and prints a one-line report, optionally appending
+it as a JSON line to a file so cold-start times can be tracked over releases.
+Work the first frame does not need (drop shadows, schema migrations) can be
+queued with defer(); it runs once the window has painted.
+"""
+import json
+import time
+from datetime import datetime
+
+from PyQt5.QtCore import QObject, QEvent, QTimer
+
+FIRST_PAINT_TIMEOUT_MS = 2000  # run deferred work anyway if no paint arrives (e.g. started minimized)
+
+
+class StartupProfiler(QObject):
+    """
+    started_at  -- time.perf_counter() taken at the top of the entry module
+    report_path -- optional JSONL file that gets one entry per start
+    """
+
+    def __init__(self, started_at=None, report_path=None):
+        super().__init__()
+        self.started_at = time.perf_counter() if started_at is None else started_at
+        self.report_path = report_path
+        self.phases = []          # [(name, milliseconds)]
+        self._last = self.started_at
+        self._deferred = []
+        self._watched = None
+
+    def mark(self, phase):
+        """Close the current phase under `phase`."""
+        now = time.perf_counter()
+        self.phases.append((phase, (now - self._last) * 1000))
+        self._last = now
+
+    def total_ms(self):
+        return (self._last - self.started_at) * 1000
+
+    # -------------------- DEFERRED WORK --------------------
+    def defer(self, fn, *args, **kwargs):
+        """Queue fn to run on the GUI thread right after the first paint."""
+        self._deferred.append((fn, args, kwargs))
+
+    def watch_first_paint(self, widget):
+        """Call before widget.show(): the first Paint event ends the start-up path."""
+        self._watched = widget
+        widget.installEventFilter(self)
+        QTimer.singleShot(FIRST_PAINT_TIMEOUT_MS, self._first_paint_done)
+
+    def eventFilter(self, obj, event):
+        if obj is self._watched and event.type() == QEvent.Paint:
+            # The event arrives before the widget draws; let the paint finish first
+            QTimer.singleShot(0, self._first_paint_done)
+        return False
+
+    def _first_paint_done(self):
+        if self._watched is None:
+            return  # already handled (paint and timeout both fire)
+        self._watched.removeEventFilter(self)
+        self._watched = None
+        self.mark("first_paint")
+        first_frame_ms = self.total_ms()
+
+        deferred, self._deferred = self._deferred, []
+        for fn, args, kwargs in deferred:
+            try:
+                fn(*args, **kwargs)
+            except Exception as e:
+                print(f"Deferred start-up step failed: {e}")
+        if deferred:
+            self.mark("deferred")
+        self.report(first_frame_ms)
+
+    # -------------------- REPORT --------------------
+    def report(self, first_frame_ms=None):
+        phases = ", ".join(f"{name} {ms:.0f} ms" for name, ms in self.phases)
+        first_frame_ms = self.total_ms() if first_frame_ms is None else first_frame_ms
+        print(f"Startup: {phases} (first frame after {first_frame_ms:.0f} ms)")
+        if not self.report_path:
+            return
+        entry = {"at": datetime.now().isoformat(timespec="seconds"), "first_frame_ms": round(first_frame_ms, 1)}
+        entry.update((name, round(ms, 1)) for name, ms in self.phases)
+        try:
+            with open(self.report_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+        except OSError as e:
+            print(f"Could not write start-up report: {e}")
@@ -0,0 +1,184 @@
+"""
+Server-side prepared statements for the portals' fixed SQL.
+
+The history SELECT, the prescription INSERT / UPDATE and the patient lookup are
+the same handful of statements on every click, yet a plain cursor makes the
+server parse and plan each of them again. A StatementCache belongs to one pooled
+connection and keeps one prepared cursor per SQL text, so a statement is
+prepared once per connection and afterwards only executed with new parameters.
+
+Prepared statements live in the server session, so the cache is dropped when
+the pool reconnects a connection in place (its connection_id changes), and a
+statement the server no longer knows (error 1243) is prepared again and retried
+once. Drivers without prepared cursors fall back to plain ones.
+"""
+from tracing import TRACER, TracedCursor
+
+MAX_STATEMENTS = 32                # per connection; far below the server's max_prepared_stmt_count
+ER_UNKNOWN_STMT_HANDLER = 1243     # the server dropped the statement (e.g. after a reconnect)
+
+
+def _session_id(conn):
+    """Server thread id of the driver connection; changes when it reconnects."""
+    try:
+        return getattr(conn, "connection_id", None)
+    except Exception:
+        return None
+
+
+def _close_quietly(cur):
+    try:
+        cur.close()
+    except Exception:
+        pass
+
+
+class StatementCache:
+    """
+    Prepared cursors for one driver connection, keyed by SQL text. Not thread-safe:
+    like the connection itself, it is used by one borrower at a time.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.session = _session_id(conn)
+        self.supported = True
+        self.prepares = 0
+        self.hits = 0
+        self._cursors = {}   # sql -> (prepared cursor, sql); least recently used first
+
+    def lookup(self, sql):
+        """
+        (cursor, statement) for sql, preparing it on first use, or None when the
+        driver has no prepared cursors. The statement is the str object the cursor
+        was first run with: mysql.connector re-prepares unless it gets that same object.
+        """
+        if not self.supported:
+            return None
+        session = _session_id(self.conn)
+        if session != self.session:
+            self._cursors.clear()   # reconnected: the old session's statements are gone
+            self.session = session
+
+        entry = self._cursors.pop(sql, None)
+        if entry is not None:
+            self._cursors[sql] = entry
+            self.hits += 1
+            return entry
+
+        try:
+            cur = self.conn.cursor(prepared=True)
+        except (TypeError, NotImplementedError):
+            self.supported = False
+            return None
+        if len(self._cursors) >= MAX_STATEMENTS:
+            _close_quietly(self._cursors.pop(next(iter(self._cursors)))[0])
+        entry = self._cursors[sql] = (cur, sql)
+        self.prepares += 1
+        return entry
+
+    def forget(self, sql):
+        """Drop sql's cursor after an error so the next use prepares it afresh."""
+        entry = self._cursors.pop(sql, None)
+        if entry is not None:
+            _close_quietly(entry[0])
+
+    def stats(self):
+        return {"statements": len(self._cursors), "prepares": self.prepares, "hits": self.hits,
+                "supported": self.supported}
+
+
+class PreparedCursor:
+    """
+    Cursor-like front for a StatementCache, used like a plain cursor:
+
+        cur = conn.prepared_cursor(dictionary=True)
+        cur.execute(sql, params)
+        rows = cur.fetchall()
+        cur.close()      # keeps the statement prepared for the next call
+
+    Rows come back as tuples, or as dicts keyed by column name with dictionary=True.
+    """
+
+    def __init__(self, cache, dictionary=False):
+        self._cache = cache
+        self._dictionary = dictionary
+        self._cur = None
+        self._sql = None
+        self._owned = False      # plain fallback cursor, closed with this one
+        self._columns = None
+
+    def execute(self, sql, params=()):
+        self._release()
+        self._sql = sql
+        entry = self._cache.lookup(sql)
+        if entry is None:
+            self._use(self._cache.conn.cursor(), owned=True).execute(sql, params)
+            return
+        try:
+            self._use(entry[0]).execute(entry[1], params)
+        except Exception as e:
+            self._cache.forget(sql)
+            if getattr(e, "errno", None) != ER_UNKNOWN_STMT_HANDLER:
+                raise
+            entry = self._cache.lookup(sql)
+            self._use(entry[0]).execute(entry[1], params)
+
+    def _use(self, cur, owned=False):
+        self._owned = owned
+        self._columns = None
+        self._cur = TracedCursor(cur, owns_cursor=owned) if TRACER.enabled else cur
+        return self._cur
+
+    def _row(self, row):
+        if row is None or not self._dictionary:
+            return row
+        if self._columns is None:
+            self._columns = [d[0] for d in self._cur.description]
+        return dict(zip(self._columns, row))
+
+    def fetchone(self):
+        return self._row(self._cur.fetchone())
+
+    def fetchmany(self, size=1):
+        return [self._row(r) for r in self._cur.fetchmany(size)]
+
+    def fetchall(self):
+        return [self._row(r) for r in self._cur.fetchall()]
+
+    @property
+    def lastrowid(self):
+        return self._cur.lastrowid
+
+    @property
+    def rowcount(self):
+        return self._cur.rowcount
+
+    @property
+    def description(self):
+        return self._cur.description
+
+    def _release(self):
+        cur, self._cur = self._cur, None
+        if cur is None:
+            return
+        if self._owned:
+            cur.close()
+            return
+        # A prepared cursor is reused, so leave no unread rows on the connection
+        try:
+            if getattr(cur, "with_rows", False):
+                cur.fetchall()
+        except Exception:
+            self._cache.forget(self._sql)
+        if isinstance(cur, TracedCursor):
+            cur.close()
+
+    def close(self):
+        self._release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
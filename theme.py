@@ -0,0 +1,170 @@
+"""
+Application-wide look of the Doctor Portal.
+
+Every widget used to carry its own inline setStyleSheet() string, so Qt parsed
+one stylesheet per widget and re-polished each widget against it while the
+window was built. Here the whole theme is a single stylesheet, compiled once per
+theme and set on the QApplication. Widgets only say what they are:
+
+    container.setObjectName("container")       # one-off parts, by object name
+    save_btn.setProperty("role", "success")    # repeated kinds, by dynamic property
+
+so switching themes at runtime is one apply_theme() call rather than a pass over
+every widget. Colors the portals paint themselves (history cards, notification
+tones) come from the same palette through color().
+"""
+from functools import lru_cache
+from string import Template
+
+from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QColor
+from PyQt5.QtWidgets import QApplication
+
+DEFAULT_THEME = "light"
+
+THEMES = {
+    "light": {
+        "window": "#eef1f4", "surface": "#ffffff", "panel": "#fbfbfb",
+        "text": "#222222", "subtle": "#666666", "muted": "#888888",
+        "border": "#cccccc", "input_border": "#e1e1e1", "list_border": "#e9e9e9",
+        "card_border": "#dddddd", "card_selected": "#f3f7ff",
+        "primary": "#2b78f6", "primary_border": "#1f5fd6", "primary_hover": "#1a63d9",
+        "primary_pressed": "#144fb8", "on_primary": "#ffffff",
+        "secondary": "#f5f6f7", "secondary_hover": "#ececec", "secondary_pressed": "#e0e0e0",
+        "on_secondary": "#222222",
+        "success": "#20b54b", "success_hover": "#1c9f42",
+        "danger": "#e05a4f", "danger_hover": "#c94b41", "error": "#cc0000",
+    },
+    "dark": {
+        "window": "#1e2125", "surface": "#262a2f", "panel": "#2d3238",
+        "text": "#e6e6e6", "subtle": "#a8adb3", "muted": "#8a9096",
+        "border": "#454b52", "input_border": "#454b52", "list_border": "#3a4046",
+        "card_border": "#454b52", "card_selected": "#2f3b4d",
+        "primary": "#3b82f6", "primary_border": "#2f6fe0", "primary_hover": "#5593f7",
+        "primary_pressed": "#2563d4", "on_primary": "#ffffff",
+        "secondary": "#3a4046", "secondary_hover": "#454b52", "secondary_pressed": "#50575e",
+        "on_secondary": "#e6e6e6",
+        "success": "#22a94a", "success_hover": "#2bbf56",
+        "danger": "#d9534f", "danger_hover": "#e06a66", "error": "#ff6b6b",
+    },
+}
+
+# show_notification() colors -> the tone the stylesheet knows them by
+NOTIFICATION_TONES = {
+    "#888": "muted", "#666": "subtle", "#20b54b": "success", "#c00": "error", "#e05a4f": "error",
+}
+
+# Everything is scoped to the portal window (object name "portal"), so message
+# boxes and other top-level windows keep the platform look.
+QSS = Template("""
+QWidget#portal { background-color: $window; }
+QWidget#portal QLabel#subtitle { color: $subtle; font-size: 14px; }
+QWidget#portal QFrame#container { background-color: $surface; border-radius: 12px; }
+QWidget#portal QFrame[card="panel"] { background-color: $panel; border-radius: 10px; }
+QWidget#portal QLabel { color: $text; }
+
+QWidget#portal QLineEdit {
+    border: 1px solid $input_border; border-radius: 6px; padding-left: 8px;
+    background: $surface; color: $text;
+}
+QWidget#portal QCheckBox { color: $subtle; font-size: 11px; }
+
+QWidget#portal QLabel#notification { color: $muted; font-size: 11px; }
+QWidget#portal QLabel#notification[tone="subtle"] { color: $subtle; }
+QWidget#portal QLabel#notification[tone="success"] { color: $success; }
+QWidget#portal QLabel#notification[tone="error"] { color: $error; }
+
+QWidget#portal QListView#historyView {
+    border: 1px solid $list_border; border-radius: 8px; background: $surface;
+}
+
+QWidget#portal QFrame#editorFrame,
+QWidget#portal QFrame#editorFrame QTextEdit {
+    border: 1px solid $border; border-radius: 8px; background: $surface; color: $text;
+}
+QWidget#portal QFrame#divider { color: $border; margin-top: 6px; margin-bottom: 6px; }
+
+QWidget#portal QPushButton[role] {
+    border-radius: 8px; padding: 6px 10px; font-weight: 600;
+}
+QWidget#portal QPushButton[role]:focus { outline: none; }
+QWidget#portal QPushButton[role="primary"] {
+    background-color: $primary; color: $on_primary; border: 1px solid $primary_border; padding: 8px 12px;
+}
+QWidget#portal QPushButton[role="primary"]:hover { background-color: $primary_hover; }
+QWidget#portal QPushButton[role="primary"]:pressed { background-color: $primary_pressed; }
+QWidget#portal QPushButton[role="secondary"] {
+    background-color: $secondary; color: $on_secondary; border: 1px solid $border;
+}
+QWidget#portal QPushButton[role="secondary"]:hover { background-color: $secondary_hover; }
+QWidget#portal QPushButton[role="secondary"]:pressed { background-color: $secondary_pressed; }
+QWidget#portal QPushButton[role="success"] { background-color: $success; color: $on_primary; border: none; }
+QWidget#portal QPushButton[role="success"]:hover { background-color: $success_hover; }
+QWidget#portal QPushButton[role="danger"] { background-color: $danger; color: $on_primary; border: none; }
+QWidget#portal QPushButton[role="danger"]:hover { background-color: $danger_hover; }
+QWidget#portal QPushButton[role="placeholder"] {
+    background: $secondary; color: $subtle; border: 1px solid $border; border-radius: 6px; font-weight: normal;
+}
+""")
+
+_current = None
+
+
+@lru_cache(maxsize=None)
+def stylesheet(name=DEFAULT_THEME):
+    """The compiled application stylesheet for a theme."""
+    return QSS.substitute(THEMES[name])
+
+
+@lru_cache(maxsize=None)
+def _colors(name):
+    return {key: QColor(value) for key, value in THEMES[name].items()}
+
+
+def current_theme():
+    return _current or DEFAULT_THEME
+
+
+def color(key):
+    """QColor for a palette entry of the current theme (for code that paints itself)."""
+    return _colors(current_theme())[key]
+
+
+def apply_theme(name=DEFAULT_THEME, app=None):
+    """
+    Install a theme on the whole application. Qt re-polishes the widgets once;
+    nothing needs restyling by hand. Calling it again with the same theme is a no-op.
+    """
+    global _current
+    if name not in THEMES:
+        raise ValueError(f"Unknown theme {name!r}; choose from {', '.join(THEMES)}")
+    app = app or QApplication.instance()
+    if app is None or (name == _current and app.styleSheet()):
+        return
+    _current = name
+    app.setStyleSheet(stylesheet(name))
+    for widget in app.topLevelWidgets():
+        widget.update()   # self-painted parts (history cards) pick up the new palette
+
+
+def set_role(widget, role):
+    """Tag a widget with the stylesheet role it should be drawn as."""
+    set_property(widget, "role", role)
+
+
+def set_property(widget, name, value):
+    """
+    Change a dynamic property the stylesheet selects on. Qt does not re-evaluate
+    selectors by itself, so only this one widget is re-polished.
+    """
+    if widget.property(name) == value:
+        return
+    widget.setProperty(name, value)
+    if widget.testAttribute(Qt.WA_WState_Polished):
+        style = widget.style()
+        style.unpolish(widget)
+        style.polish(widget)
+
+
+def notification_tone(color_code):
+    return NOTIFICATION_TONES.get((color_code or "").lower(), "muted")
@@ -0,0 +1,295 @@
+"""
+Timing spans and slow-query tracing for the Doctor Portal.
+
+When "Load Patient is slow", the spans show where the time went: borrowing a
+connection (db.get_connection), each cur.execute (db.execute), fetching rows
+(db.fetch), the background task as a whole (task.<function>) and the GUI side
+(ui.populate_history, ui.history_paint). Queries slower than slow_query_ms are
+printed with their SQL and row count.
+
+Tracing is off by default and costs one attribute check per span when off.
+Finished spans can be appended to a JSON-lines trace file and/or aggregated
+into histograms served as Prometheus text on http://127.0.0.1:<port>/metrics.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_SLOW_QUERY_MS = 200
+SQL_PREVIEW_CHARS = 300
+
+# Histogram buckets, in seconds (Prometheus convention)
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "attrs", "start")
+
+    def __init__(self, tracer, name, attrs):
+        self.tracer = tracer
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        self.tracer.record(self.name, (time.perf_counter() - self.start) * 1000, self.attrs)
+        return False
+
+    def set(self, **attrs):
+        """Attach attributes discovered inside the span (e.g. a row count)."""
+        self.attrs.update(attrs)
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+_NO_SPAN = _NoSpan()
+
+
+class _Histogram:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.count += 1
+        self.total += seconds
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.counts[i] += 1
+
+
+class Tracer:
+    """Process-wide span recorder. Use the module-level TRACER."""
+
+    def __init__(self):
+        self.enabled = False
+        self.slow_query_ms = DEFAULT_SLOW_QUERY_MS
+        self.slow_queries = 0
+        self._histograms = {}
+        self._lock = threading.Lock()
+        self._trace_file = None
+        self._server = None
+
+    # -------------------- RECORDING --------------------
+    def span(self, name, **attrs):
+        """with TRACER.span("db.get_connection"): ... — a no-op while tracing is off."""
+        if not self.enabled:
+            return _NO_SPAN
+        return _Span(self, name, attrs)
+
+    def record(self, name, ms, attrs=None):
+        if not self.enabled:
+            return
+        with self._lock:
+            hist = self._histograms.get(name)
+            if hist is None:
+                hist = self._histograms[name] = _Histogram()
+            hist.observe(ms / 1000)
+            if self._trace_file is not None:
+                entry = {"ts": round(time.time(), 6), "span": name, "ms": round(ms, 3),
+                         "thread": threading.current_thread().name}
+                if attrs:
+                    entry.update(attrs)
+                self._trace_file.write(json.dumps(entry, default=str) + "\n")
+
+    def query_finished(self, sql, ms, rows):
+        """Called by TracedCursor once a statement's execute + fetches are done."""
+        if not self.enabled or ms < self.slow_query_ms:
+            return
+        with self._lock:
+            self.slow_queries += 1
+            if self._trace_file is not None:
+                self._trace_file.write(json.dumps({
+                    "ts": round(time.time(), 6), "event": "slow_query", "ms": round(ms, 3),
+                    "rows": rows, "sql": sql[:SQL_PREVIEW_CHARS],
+                }) + "\n")
+        print(f"Slow query ({ms:.0f} ms, {rows} rows): {sql[:SQL_PREVIEW_CHARS]}")
+
+    # -------------------- CONFIGURATION --------------------
+    def configure(self, enabled=True, trace_file=None, metrics_port=None, slow_query_ms=DEFAULT_SLOW_QUERY_MS):
+        self.slow_query_ms = slow_query_ms
+        self.enabled = enabled
+        if not enabled:
+            return
+        if trace_file:
+            with self._lock:
+                if self._trace_file is not None:
+                    self._trace_file.close()
+                self._trace_file = open(trace_file, "a", encoding="utf-8", buffering=1)
+        if metrics_port:
+            self.serve_metrics(metrics_port)
+
+    def close(self):
+        with self._lock:
+            if self._trace_file is not None:
+                self._trace_file.close()
+                self._trace_file = None
+        if self._server is not None:
+            self._server.shutdown()
+            self._server = None
+
+    # -------------------- EXPORT --------------------
+    def snapshot(self):
+        """{span: {"count", "total_ms", "mean_ms"}} — handy in a debugger or a test."""
+        with self._lock:
+            return {
+                name: {"count": h.count, "total_ms": round(h.total * 1000, 3),
+                       "mean_ms": round(h.total * 1000 / h.count, 3) if h.count else 0.0}
+                for name, h in self._histograms.items()
+            }
+
+    def prometheus_text(self):
+        lines = [
+            "# HELP imhotep_span_duration_seconds Duration of instrumented Doctor Portal operations.",
+            "# TYPE imhotep_span_duration_seconds histogram",
+        ]
+        with self._lock:
+            for name in sorted(self._histograms):
+                hist = self._histograms[name]
+                for bound, count in zip(BUCKETS, hist.counts):
+                    lines.append(f'imhotep_span_duration_seconds_bucket{{span="{name}",le="{bound}"}} {count}')
+                lines.append(f'imhotep_span_duration_seconds_bucket{{span="{name}",le="+Inf"}} {hist.count}')
+                lines.append(f'imhotep_span_duration_seconds_sum{{span="{name}"}} {hist.total:.6f}')
+                lines.append(f'imhotep_span_duration_seconds_count{{span="{name}"}} {hist.count}')
+            lines += [
+                "# HELP imhotep_slow_queries_total Statements slower than the slow-query threshold.",
+                "# TYPE imhotep_slow_queries_total counter",
+                f"imhotep_slow_queries_total {self.slow_queries}",
+            ]
+        return "\n".join(lines) + "\n"
+
+    def serve_metrics(self, port, host="127.0.0.1"):
+        """Serve prometheus_text() at http://host:port/metrics from a daemon thread (localhost only by default)."""
+        if self._server is not None:
+            return self._server
+        tracer = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = tracer.prometheus_text().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # keep scrapes out of the console
+
+        self._server = ThreadingHTTPServer((host, port), MetricsHandler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True).start()
+        print(f"Serving metrics on http://{host}:{self._server.server_address[1]}/metrics")
+        return self._server
+
+
+TRACER = Tracer()
+
+
+def configure_tracing(enabled=True, trace_file=None, metrics_port=None, slow_query_ms=DEFAULT_SLOW_QUERY_MS):
+    TRACER.configure(enabled, trace_file, metrics_port, slow_query_ms)
+
+
+class TracedCursor:
+    """
+    Cursor wrapper timing execute/fetch calls. Once a statement is finished (next
+    execute or close) its total time and row count go to the slow-query check.
+    With owns_cursor=False, close() leaves the wrapped cursor open (cached prepared cursors).
+    """
+
+    def __init__(self, cursor, tracer=TRACER, owns_cursor=True):
+        self._cursor = cursor
+        self._tracer = tracer
+        self._owns_cursor = owns_cursor
+        self._sql = None
+        self._query_ms = 0.0
+        self._rows = None
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def execute(self, sql, *args, **kwargs):
+        self._finish_query()
+        self._sql = " ".join(str(sql).split())
+        self._rows = None
+        start = time.perf_counter()
+        try:
+            return self._cursor.execute(sql, *args, **kwargs)
+        finally:
+            self._query_ms = (time.perf_counter() - start) * 1000
+            self._tracer.record("db.execute", self._query_ms, {"sql": self._sql[:SQL_PREVIEW_CHARS]})
+
+    def executemany(self, sql, seq_of_params, *args, **kwargs):
+        seq_of_params = list(seq_of_params)
+        self._finish_query()
+        self._sql = " ".join(str(sql).split())
+        self._rows = len(seq_of_params)
+        start = time.perf_counter()
+        try:
+            return self._cursor.executemany(sql, seq_of_params, *args, **kwargs)
+        finally:
+            self._query_ms = (time.perf_counter() - start) * 1000
+            self._tracer.record("db.execute", self._query_ms,
+                                {"sql": self._sql[:SQL_PREVIEW_CHARS], "rows": self._rows})
+
+    def _timed_fetch(self, fetch, *args):
+        start = time.perf_counter()
+        result = fetch(*args)
+        ms = (time.perf_counter() - start) * 1000
+        if isinstance(result, list):
+            rows = len(result)
+        else:
+            rows = 0 if result is None else 1
+        self._query_ms += ms
+        self._rows = (self._rows or 0) + rows
+        self._tracer.record("db.fetch", ms, {"rows": rows})
+        return result
+
+    def fetchone(self):
+        return self._timed_fetch(self._cursor.fetchone)
+
+    def fetchmany(self, *args):
+        return self._timed_fetch(self._cursor.fetchmany, *args)
+
+    def fetchall(self):
+        return self._timed_fetch(self._cursor.fetchall)
+
+    def close(self):
+        self._finish_query()
+        if self._owns_cursor:
+            return self._cursor.close()
+
+    def _finish_query(self):
+        if self._sql is None:
+            return
+        rows = self._rows
+        if rows is None:
+            rows = max(getattr(self._cursor, "rowcount", 0) or 0, 0)  # DML: affected rows
+        self._tracer.query_finished(self._sql, self._query_ms, rows)
+        self._sql = None
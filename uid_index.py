@@ -0,0 +1,131 @@
+"""
+Patient UID typeahead for the Find Patient box.
+
+UidIndex keeps every known UID in one sorted, case-folded array; the UIDs
+starting with a prefix are a contiguous slice found with two bisects, so a
+suggestion costs microseconds and never touches the database. The index is
+filled once at startup and then kept fresh with deltas: rows whose primary key
+is above the last watermark (select_uid_delta) plus the UIDs saved from this
+window (add).
+
+UidCompleter is the QCompleter on the line edit. It asks the index for
+suggestions on each edit instead of letting Qt filter a full model.
+"""
+from bisect import bisect_left, insort
+
+from PyQt5.QtCore import Qt, QStringListModel, pyqtSignal
+from PyQt5.QtWidgets import QCompleter
+
+from tracing import TRACER
+
+MAX_SUGGESTIONS = 10
+
+
+class UidIndex:
+    """Sorted, case-insensitive prefix index of patient UIDs. Used from the GUI thread only."""
+
+    def __init__(self):
+        self._keys = []          # casefolded UIDs, sorted
+        self._uids = {}          # casefolded -> UID as stored
+        self.watermark = 0       # highest row id already folded in
+        self.loaded = False
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, uid):
+        return uid.casefold() in self._uids
+
+    def merge(self, uids, watermark=None):
+        """Fold in a delta (or the initial load) from select_uid_delta()."""
+        new = {}
+        for uid in uids:
+            key = uid.casefold()
+            if key not in self._uids:
+                new[key] = uid
+        if len(new) > 32:
+            self._uids.update(new)
+            self._keys = sorted(self._uids)
+        else:
+            for key, uid in new.items():
+                self._uids[key] = uid
+                insort(self._keys, key)
+        if watermark is not None:
+            self.watermark = max(self.watermark, watermark)
+        self.loaded = True
+        return len(new)
+
+    def add(self, uid):
+        """Record a UID saved from this window without waiting for the next delta."""
+        if uid:
+            self.merge([uid])
+
+    def suggest(self, prefix, limit=MAX_SUGGESTIONS):
+        """Up to limit known UIDs starting with prefix (case-insensitive), in sorted order."""
+        key = prefix.casefold()
+        if not key:
+            return []
+        start = bisect_left(self._keys, key)
+        stop = bisect_left(self._keys, key + "\U0010ffff", start)
+        return [self._uids[k] for k in self._keys[start:min(stop, start + limit)]]
+
+
+def select_uid_delta(conn, table, id_column, uid_column, after_id=0):
+    """
+    Distinct UIDs of the rows in table with after_id < id <= current max id.
+    Returns (uids, new watermark). Runs on a worker thread with a pooled connection.
+
+    The upper bound is read first, so a row inserted meanwhile is left for the
+    next delta instead of being skipped.
+    """
+    cur = conn.prepared_cursor()
+    try:
+        cur.execute(f"SELECT MAX({id_column}) FROM {table}")
+        row = cur.fetchone()
+        high = row[0] if row and row[0] is not None else 0
+        if high <= after_id:
+            return [], after_id
+        cur.execute(
+            f"SELECT DISTINCT {uid_column} FROM {table} WHERE {id_column} > %s AND {id_column} <= %s",
+            (after_id, high)
+        )
+        return [r[0] for r in cur.fetchall() if r[0]], high
+    finally:
+        cur.close()
+
+
+class UidCompleter(QCompleter):
+    """
+    Typeahead for a QLineEdit backed by a UidIndex. Emits uidChosen(uid) when a
+    suggestion is picked from the popup.
+    """
+
+    uidChosen = pyqtSignal(str)
+
+    def __init__(self, line_edit, index, max_suggestions=MAX_SUGGESTIONS):
+        self._model = QStringListModel()
+        super().__init__(self._model, line_edit)
+        self.index = index
+        self.max_suggestions = max_suggestions
+        self.line_edit = line_edit
+        # The model already holds only the matches; Qt must not filter it again
+        self.setCompletionMode(QCompleter.UnfilteredPopupCompletion)
+        self.setCaseSensitivity(Qt.CaseInsensitive)
+        self.setMaxVisibleItems(max_suggestions)
+        line_edit.setCompleter(self)
+        line_edit.textEdited.connect(self._update)
+        self.activated[str].connect(self._chosen)
+
+    def _update(self, text):
+        text = text.strip()
+        with TRACER.span("ui.uid_suggest", prefix_len=len(text)):
+            matches = self.index.suggest(text, self.max_suggestions)
+            self._model.setStringList(matches)
+        if matches and matches != [text]:
+            self.complete()
+        else:
+            self.popup().hide()
+
+    def _chosen(self, uid):
+        self.line_edit.setText(uid)
+        self.uidChosen.emit(uid)
@@ -0,0 +1,222 @@
+"""
+Optional write-behind queue for prescription INSERTs.
+
+Saves are queued and flushed together as one multi-row
+INSERT ... VALUES (...), (...) followed by a single COMMIT, so a busy clinic
+pays one fsync per batch instead of one per prescription. A batch is flushed
+when it reaches max_batch rows or when its oldest row has waited max_delay
+seconds. Every queued row gets its own callback(record_id, error).
+
+The batch's ids are worked out from the first one, which needs the server to number
+a multi-row INSERT consecutively; where it does not, batches are written row by row.
+
+A batch is only retried row by row when it failed before its COMMIT. When the
+COMMIT itself fails, the rows may already be on the server (the reply was lost),
+so they are not written again: their callbacks get CommitOutcomeUnknownError.
+"""
+import threading
+import time
+
+from db_pool import consecutive_insert_ids
+
+DEFAULT_MAX_BATCH = 20
+DEFAULT_MAX_DELAY = 0.25  # seconds
+
+
+class CommitOutcomeUnknownError(RuntimeError):
+    """The COMMIT of queued rows failed; they may or may not have been written."""
+
+
+class WriteBehindQueue:
+    """
+    Group-commit queue for one table.
+
+    get_connection -- returns a (pooled) connection or None
+    table, columns -- target of the INSERT; every queued row is a tuple in column order
+    before_commit  -- optional hook(cur, rows, ids) run inside the batch's transaction,
+                      e.g. to write child rows that must commit together with it
+    after_commit   -- optional hook(conn, rows, ids) run on the flush thread after a
+                      successful commit, e.g. to read rows back into a cache
+    """
+
+    def __init__(self, get_connection, table, columns, max_batch=DEFAULT_MAX_BATCH,
+                 max_delay=DEFAULT_MAX_DELAY, before_commit=None, after_commit=None):
+        self.get_connection = get_connection
+        self.table = table
+        self.columns = list(columns)
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.before_commit = before_commit
+        self.after_commit = after_commit
+
+        self._pending = []        # (row, callback, queued_at)
+        self._cond = threading.Condition()
+        self._closed = False
+        self._flushing = False
+        self._force = False       # flush() asked for the queue to be drained now
+        self.batches = 0
+        self.rows_written = 0
+
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+
+    # -------------------- PUBLIC --------------------
+    def submit(self, row, callback=None):
+        """Queue one row. callback(record_id, error) runs on the flush thread."""
+        if len(row) != len(self.columns):
+            raise ValueError(f"Expected {len(self.columns)} values, got {len(row)}")
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Write queue is closed.")
+            self._pending.append((tuple(row), callback, time.monotonic()))
+            self._cond.notify()
+
+    def pending(self):
+        with self._cond:
+            return len(self._pending)
+
+    def flush(self, timeout=None):
+        """Ask for an immediate flush and wait until everything queued so far is written."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._pending or self._flushing:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._force = True
+                self._cond.notify_all()
+                self._cond.wait(remaining)
+        return True
+
+    def close(self, timeout=None):
+        """Flush what is queued and stop the flush thread."""
+        self.flush(timeout)
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+
+    # -------------------- FLUSH THREAD --------------------
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._closed and not self._pending:
+                        return
+                    if self._pending:
+                        oldest = self._pending[0][2]
+                        wait = self.max_delay - (time.monotonic() - oldest)
+                        if len(self._pending) >= self.max_batch or wait <= 0 or self._force or self._closed:
+                            break
+                        self._cond.wait(wait)
+                    else:
+                        self._cond.wait()
+                batch = self._pending[:self.max_batch]
+                del self._pending[:self.max_batch]
+                self._force = self._force and bool(self._pending)
+                self._flushing = True
+            try:
+                self._write_batch(batch)
+            except Exception as e:
+                self._finish(batch, None, e)
+            finally:
+                with self._cond:
+                    self._flushing = False
+                    self._cond.notify_all()
+
+    def _insert_sql(self, n_rows):
+        placeholders = "(" + ", ".join(["%s"] * len(self.columns)) + ")"
+        return (f"INSERT INTO {self.table} ({', '.join(self.columns)}) VALUES "
+                + ", ".join([placeholders] * n_rows))
+
+    def _write_batch(self, batch):
+        rows = [row for row, _, _ in batch]
+        conn = self.get_connection()
+        if not conn:
+            self._finish(batch, None, ConnectionError("Could not connect to the database."))
+            return
+        try:
+            if len(rows) > 1 and not consecutive_insert_ids(conn):
+                self._write_individually(conn, batch)
+                return
+            try:
+                ids = self._insert(conn, rows)
+            except CommitOutcomeUnknownError as e:
+                self._finish(batch, None, e)
+                return
+            except Exception:
+                try:
+                    conn.rollback()
+                except Exception:
+                    conn.discard()
+                    conn = self.get_connection()
+                    if not conn:
+                        self._finish(batch, None, ConnectionError("Could not reconnect to the database."))
+                        return
+                # One bad row must not sink the whole batch: fall back to row-by-row
+                # so every record gets its own success or failure.
+                self._write_individually(conn, batch)
+                return
+            self.batches += 1
+            self.rows_written += len(rows)
+            self._run_after_commit(conn, rows, ids)
+            self._finish(batch, ids, None)
+        finally:
+            if conn is not None:
+                conn.close()
+
+    def _insert(self, conn, rows):
+        """Multi-row INSERT + single COMMIT. Returns the new ids in row order."""
+        cur = conn.cursor()
+        try:
+            cur.execute(self._insert_sql(len(rows)), [v for row in rows for v in row])
+            # MySQL reports the first id of a multi-row INSERT; _write_batch has checked
+            # that the rest follow it (see db_pool.consecutive_insert_ids)
+            first_id = cur.lastrowid
+            ids = [first_id + i for i in range(len(rows))]
+            if self.before_commit is not None:
+                self.before_commit(cur, rows, ids)
+            try:
+                conn.commit()
+            except Exception as e:
+                raise CommitOutcomeUnknownError(f"Commit failed, rows may or may not be saved: {e}") from e
+        finally:
+            cur.close()
+        return ids
+
+    def _write_individually(self, conn, batch):
+        for entry in batch:
+            row = entry[0]
+            try:
+                ids = self._insert(conn, [row])
+            except CommitOutcomeUnknownError as e:
+                self._finish([entry], None, e)
+                continue
+            except Exception as e:
+                try:
+                    conn.rollback()
+                except Exception:
+                    pass
+                self._finish([entry], None, e)
+                continue
+            self.rows_written += 1
+            self._run_after_commit(conn, [row], ids)
+            self._finish([entry], ids, None)
+
+    def _run_after_commit(self, conn, rows, ids):
+        if self.after_commit is None:
+            return
+        try:
+            self.after_commit(conn, rows, ids)
+        except Exception as e:
+            print(f"Write-behind after_commit hook failed: {e}")
+
+    @staticmethod
+    def _finish(batch, ids, error):
+        for i, (_, callback, _) in enumerate(batch):
+            if callback is None:
+                continue
+            try:
+                callback(ids[i] if ids else None, error)
+            except Exception as e:
+                print(f"Write-behind callback failed: {e}")